@@ -4,6 +4,7 @@ from app.components.nutrient_calculator import (
     greedy_allocation,
 )
 from app.components.dri_loader import DRILoader
+from functools import lru_cache
 import math
 from typing import Dict, Any, List, Optional
 
@@ -20,6 +21,9 @@ class ComputationManager:
 
     def __init__(self, dri_table_path: str = "data/dri_table.csv"):
         self.dri = DRILoader(dri_table_path)
+        # Targets are built on first use per (age, sex); per instance, so the
+        # cache doesn't outlive this manager or its DRI table
+        self._micronutrient_targets_for = lru_cache(maxsize=256)(self._micronutrient_targets_for)
 
     # --------------------------------------------------------
     # 1️⃣ ENERGY + MACRONUTRIENT ESTIMATION
@@ -167,6 +171,14 @@ class ComputationManager:
     # 2️⃣ MICRONUTRIENT TARGETS (via DRILoader)
     # --------------------------------------------------------
     def get_micronutrient_targets(self, age: int, sex: str) -> Dict[str, Any]:
+        # fresh per-nutrient dicts: callers put them in payloads and may mutate them
+        return {nutrient: dict(details) for nutrient, details in self._micronutrient_targets_for(age, sex).items()}
+
+    def _micronutrient_targets_for(self, age: int, sex: str) -> Dict[str, Any]:
+        """Shared (read-only) micronutrient targets for (age, sex), memoized in __init__"""
+        return self._build_micronutrient_targets(age, sex)
+
+    def _build_micronutrient_targets(self, age: int, sex: str) -> Dict[str, Any]:
         dri_values = self.dri.get_all_dri_for_group(age, sex)
         micronutrients = {}
 
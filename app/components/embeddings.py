@@ -20,13 +20,19 @@ def get_embedding_model(
     or lack proper sentence-transformers configuration. The MiniLM models provide
     robust performance across medical and general domains.
     """
+    # GPUs amortize per-batch overhead over much larger batches than CPUs
+    encode_kwargs = {
+        "normalize_embeddings": True,
+        "batch_size": 256 if str(device).startswith("cuda") else 32,
+    }
+
     try:
         logger.info(f"Initializing embedding model: {model_name} on {device}")
 
         model = HuggingFaceEmbeddings(
             model_name=model_name,
             model_kwargs={"device": device},
-            encode_kwargs={"normalize_embeddings": True}
+            encode_kwargs=encode_kwargs
         )
 
         logger.info(f"✅ Embedding model loaded successfully: {model_name}")
@@ -45,7 +51,7 @@ def get_embedding_model(
                 model = HuggingFaceEmbeddings(
                     model_name=fallback_model,
                     model_kwargs={"device": device},
-                    encode_kwargs={"normalize_embeddings": True}
+                    encode_kwargs=encode_kwargs
                 )
                 logger.info(f"✅ Fallback model loaded: {fallback_model}")
                 return model
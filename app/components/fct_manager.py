@@ -19,14 +19,69 @@ Usage:
     )
 """
 
+import bisect
 import json
 import logging
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Tuple, Mapping
+import numpy as np
 from langchain.schema import Document
 
 logger = logging.getLogger(__name__)
 
+# Optional faster JSON parser for the country mapping
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Upper bound on concurrent per-nutrient FCT retrievals
+_MAX_RETRIEVAL_WORKERS = 8
+
+# Max (nutrient, fct_path, k) results kept in the per-manager retrieval cache
+_QUERY_CACHE_SIZE = 256
+
+# Serving-size buckets: upper bounds (grams, exclusive) and their labels.
+# The None label is the 200-400g range, rendered as a number of cups.
+_SERVING_BREAKS = (30, 100, 200, 400)
+_SERVING_LABELS = ("small portion", "1/2 cup approx", "1 cup approx", None, "large portion")
+
+# Diagnosis categories with food restrictions, listed in priority order
+# (PKU wins over CKD, CKD over ketogenic when a diagnosis mentions several)
+_DIAGNOSIS_CATEGORY_RE = re.compile(
+    r"(?P<pku>pku|phenylketonuria)|(?P<ckd>ckd|kidney)|(?P<keto>ketogenic|epilepsy)",
+    re.IGNORECASE
+)
+_DIAGNOSIS_CATEGORY_PRIORITY = ("pku", "ckd", "keto")
+
+# PKU: high-protein foods (esp. meat, dairy, legumes) are high in phenylalanine
+_HIGH_PHE_FOODS = ("meat", "chicken", "beef", "pork", "fish", "dairy", "milk",
+                   "cheese", "beans", "lentils", "peas", "soy", "egg")
+
+# Hardcoded common foods per nutrient, used when no FCT is available
+_GENERIC_FOODS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "protein": ("Beans", "Chicken breast", "Fish", "Eggs", "Lentils"),
+    "carbohydrate": ("Rice", "Ugali", "Sweet potato", "Cassava", "Bread"),
+    "fat": ("Avocado", "Nuts", "Olive oil", "Groundnuts", "Seeds"),
+    "fiber": ("Sukuma wiki (kale)", "Oranges", "Carrots", "Whole grains", "Beans"),
+    "calcium": ("Milk", "Yogurt", "Sardines", "Kale", "Sesame seeds"),
+    "iron": ("Red meat", "Spinach", "Beans", "Fortified cereals", "Liver"),
+    "vitamin_c": ("Oranges", "Mango", "Papaya", "Tomatoes", "Guava"),
+    "vitamin_a": ("Carrots", "Sweet potato", "Mango", "Spinach", "Pumpkin"),
+})
+
+# Generic (food, content per 100g) pairs used when an FCT query fails
+_GENERIC_FOODS_WITH_VALUES: Mapping[str, Tuple[Tuple[str, float], ...]] = MappingProxyType({
+    "protein": (("Beans", 21), ("Chicken", 31), ("Fish", 20), ("Eggs", 13), ("Lentils", 9)),
+    "calcium": (("Milk", 120), ("Yogurt", 110), ("Sardines", 380), ("Kale", 150), ("Sesame", 975)),
+    "iron": (("Liver", 6.5), ("Spinach", 2.7), ("Beans", 5.3), ("Red meat", 2.6)),
+})
+
 
 class FCTManager:
     """
@@ -35,6 +90,15 @@ class FCTManager:
     Handles Step 5 of therapy flow: Food source identification.
     """
 
+    __slots__ = (
+        "config_path",
+        "country_mapping",
+        "_country_index",
+        "_query_cache",
+        "_query_cache_lock",
+        "_corpus_version",
+    )
+
     def __init__(self, config_path: Optional[str] = None):
         """
         Initialize FCT Manager.
@@ -48,6 +112,29 @@ class FCTManager:
         self.config_path = Path(config_path)
         self.country_mapping = self._load_country_mapping()
 
+        # Case-folded country index so lookups are case-insensitive (e.g. "Cote d'Ivoire")
+        self._country_index = {
+            name.casefold(): fct for name, fct in self.country_mapping.get("country_to_fct", {}).items()
+        }
+
+        # LRU cache of parsed FCT retrievals; the corpus version and the retriever's
+        # index version are part of the key, so results fetched before an
+        # invalidation or a FAISS reload/rebuild are never served afterwards
+        self._query_cache: "OrderedDict[Tuple[str, str, int, int, int], List[Dict[str, Any]]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self._corpus_version = 0
+
+    def invalidate_query_cache(self) -> None:
+        """
+        Drop cached FCT retrievals.
+
+        Reloading or rebuilding the FAISS index already bypasses stale entries;
+        call this when the FCT corpus changes some other way.
+        """
+        with self._query_cache_lock:
+            self._corpus_version += 1
+            self._query_cache.clear()
+
     def _load_country_mapping(self) -> Dict[str, Any]:
         """
         Load country-to-FCT mapping from JSON config.
@@ -56,8 +143,9 @@ class FCTManager:
             Dict with country_to_fct, regional_mapping, default_fct
         """
         try:
-            with open(self.config_path, 'r') as f:
-                mapping = json.load(f)
+            with open(self.config_path, 'rb') as f:
+                raw = f.read()
+            mapping = orjson.loads(raw) if orjson is not None else json.loads(raw)
             logger.info(f"Loaded FCT mapping for {len(mapping.get('country_to_fct', {}))} countries")
             return mapping
         except Exception as e:
@@ -77,10 +165,8 @@ class FCTManager:
         if not country:
             return self.country_mapping.get("default_fct")
 
-        country_normalized = country.strip().title()
-
         # Direct lookup
-        fct_path = self.country_mapping.get("country_to_fct", {}).get(country_normalized)
+        fct_path = self._country_index.get(country.strip().casefold())
 
         if fct_path:
             return fct_path
@@ -109,8 +195,10 @@ class FCTManager:
         1. Identify country → FCT file
         2. For each nutrient in requirements:
            - Query FCT/vector store for foods high in that nutrient
+             (all nutrients concurrently)
            - Sort by nutrient density (per 100g)
-           - Apply diagnosis restrictions (PKU, CKD, allergies, etc.)
+           - Apply diagnosis restrictions (PKU, CKD, allergies, etc.),
+             fetching more candidates only if restrictions leave fewer than k
            - Return top k foods with portion sizes
 
         Args:
@@ -139,27 +227,82 @@ class FCTManager:
 
         logger.info(f"Using FCT: {fct_path} for country: {country}")
 
+        # Only nutrients with a numeric target can be converted to portions
+        requirements = [
+            (nutrient, req_data)
+            for nutrient, req_data in therapeutic_requirements.items()
+            if isinstance(req_data, dict) and req_data.get("value") is not None
+        ]
+        if not requirements:
+            return {}
+
+        # Retrieval is I/O-bound (vector store + BM25), so query all nutrients concurrently
+        with ThreadPoolExecutor(max_workers=min(_MAX_RETRIEVAL_WORKERS, len(requirements))) as executor:
+            futures = {
+                nutrient: executor.submit(
+                    self._get_allowed_foods_for_nutrient,
+                    nutrient=nutrient,
+                    fct_path=fct_path,
+                    diagnosis=diagnosis,
+                    allergies=allergies,
+                    k=k
+                )
+                for nutrient, _ in requirements
+            }
+
         food_sources = {}
 
-        # For each nutrient, find top food sources
-        for nutrient, req_data in therapeutic_requirements.items():
-            if not isinstance(req_data, dict):
-                continue
+        # Portion math is cheap - keep it serial and in request order
+        for nutrient, req_data in requirements:
+            # Calculate serving sizes needed to meet target
+            food_sources[nutrient] = self._calculate_portion_sizes(
+                foods=futures[nutrient].result()[:k],
+                nutrient=nutrient,
+                target_value=req_data["value"],
+                target_unit=req_data.get("unit")
+            )
 
-            target_value = req_data.get("value")
-            unit = req_data.get("unit")
+        return food_sources
 
-            if target_value is None:
-                continue
+    def _get_allowed_foods_for_nutrient(
+        self,
+        nutrient: str,
+        fct_path: str,
+        diagnosis: Optional[str],
+        allergies: Optional[List[str]],
+        k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve foods high in a nutrient and apply diagnosis/allergy restrictions.
 
-            # Query FCT/vector store for foods high in this nutrient
-            foods = self._query_fct_for_nutrient(
-                nutrient=nutrient,
-                fct_path=fct_path,
-                k=k * 2  # Get extra to allow for filtering
-            )
+        Fetches only k candidates first and tops up with a 2*k retrieval when
+        fewer than k allowed foods came back, so profiles whose first fetch
+        already yields k foods (the common case) never pay for the extra candidates.
+
+        Args:
+            nutrient: Nutrient name
+            fct_path: FCT file path
+            diagnosis: Diagnosis for food restrictions
+            allergies: List of allergens to exclude
+            k: Number of allowed foods wanted
 
-            # Apply diagnosis-specific restrictions
+        Returns:
+            Filtered list of food dicts (may be shorter than k)
+        """
+        foods = self._query_fct_for_nutrient(nutrient=nutrient, fct_path=fct_path, k=k)
+
+        # Apply diagnosis-specific restrictions
+        foods_filtered = self._apply_food_restrictions(
+            foods=foods,
+            diagnosis=diagnosis,
+            allergies=allergies,
+            nutrient=nutrient
+        )
+
+        # Top up whenever we are short: restrictions may have removed candidates,
+        # and some retrieved documents may not have parsed into foods at all
+        if len(foods_filtered) < k:
+            foods = self._query_fct_for_nutrient(nutrient=nutrient, fct_path=fct_path, k=k * 2)
             foods_filtered = self._apply_food_restrictions(
                 foods=foods,
                 diagnosis=diagnosis,
@@ -167,20 +310,7 @@ class FCTManager:
                 nutrient=nutrient
             )
 
-            # Calculate serving sizes needed to meet target
-            foods_with_portions = []
-            for food in foods_filtered[:k]:
-                portion_info = self._calculate_portion_size(
-                    food=food,
-                    nutrient=nutrient,
-                    target_value=target_value,
-                    target_unit=unit
-                )
-                foods_with_portions.append(portion_info)
-
-            food_sources[nutrient] = foods_with_portions
-
-        return food_sources
+        return foods_filtered
 
     def _query_fct_for_nutrient(
         self,
@@ -192,6 +322,8 @@ class FCTManager:
         Query FCT/vector store for foods high in a nutrient.
 
         Uses hybrid retrieval to find foods from the FCT document.
+        Results are memoized per (nutrient, fct_path, k) until the retriever's
+        index changes or invalidate_query_cache() is called.
 
         Args:
             nutrient: Nutrient name
@@ -201,7 +333,14 @@ class FCTManager:
         Returns:
             List of food dicts with nutrient content
         """
-        from app.components.hybrid_retriever import filtered_retrieval
+        from app.components.hybrid_retriever import filtered_retrieval, index_version
+
+        with self._query_cache_lock:
+            cache_key = (nutrient, fct_path, k, self._corpus_version, index_version())
+            cached = self._query_cache.get(cache_key)
+            if cached is not None:
+                self._query_cache.move_to_end(cache_key)
+                return list(cached)
 
         # Build query for high-nutrient foods
         query = f"Foods high in {nutrient} content per 100g"
@@ -224,7 +363,15 @@ class FCTManager:
             # Parse documents to extract food data
             foods = self._parse_fct_documents(documents, nutrient)
 
-            return foods
+            # Don't cache empty results - the retriever may simply not be loaded yet
+            if foods:
+                with self._query_cache_lock:
+                    self._query_cache[cache_key] = foods
+                    self._query_cache.move_to_end(cache_key)
+                    if len(self._query_cache) > _QUERY_CACHE_SIZE:
+                        self._query_cache.popitem(last=False)
+
+            return list(foods)
 
         except Exception as e:
             logger.error(f"FCT query failed for {nutrient}: {e}")
@@ -258,7 +405,6 @@ class FCTManager:
             # If metadata doesn't have structured data, parse from text
             if not nutrient_content:
                 # Try to extract from page_content (simplified regex)
-                import re
                 text = doc.page_content if hasattr(doc, "page_content") else str(doc)
 
                 # Look for patterns like "Protein: 21g per 100g"
@@ -279,10 +425,18 @@ class FCTManager:
                     "source": "FCT"
                 })
 
-        # Sort by nutrient content (descending)
-        foods.sort(key=lambda x: x.get("content", {}).get("value", 0), reverse=True)
+        if len(foods) < 2:
+            return foods
+
+        # Sort by nutrient content (descending); stable argsort keeps retrieval order for ties
+        values = np.fromiter(
+            (food["content"].get("value", 0) or 0 for food in foods),
+            dtype=np.float64,
+            count=len(foods)
+        )
+        order = np.argsort(-values, kind="stable")
 
-        return foods
+        return [foods[i] for i in order.tolist()]
 
     def _apply_food_restrictions(
         self,
@@ -306,84 +460,94 @@ class FCTManager:
         if not diagnosis and not allergies:
             return foods
 
+        # Classify the diagnosis once per batch, not once per food
+        category = None
+        if diagnosis:
+            matched = {m.lastgroup for m in _DIAGNOSIS_CATEGORY_RE.finditer(diagnosis)}
+            category = next((c for c in _DIAGNOSIS_CATEGORY_PRIORITY if c in matched), None)
+
+        # CKD: Limit high-K, high-P foods
+        if category == "ckd" and nutrient.lower() in ("potassium", "phosphorus"):
+            # For K and P, we want LOW sources, not high
+            logger.debug(f"CKD: Preferring lower {nutrient} foods")
+            # Could reverse sort or apply threshold here
+
+        # Ketogenic: High fat, low CHO - for keto, prefer LOW carb foods (not yet applied)
+
+        allergens_lower = tuple(allergen.lower() for allergen in (allergies or ()))
+
         filtered = []
 
         for food in foods:
             food_name = food.get("food", "").lower()
 
             # Skip if allergenic
-            if allergies:
-                if any(allergen.lower() in food_name for allergen in allergies):
-                    logger.debug(f"Excluding {food['food']} due to allergy")
-                    continue
-
-            # Diagnosis-specific restrictions
-            if diagnosis:
-                diagnosis_lower = diagnosis.lower()
-
-                # PKU: Exclude high-protein foods (esp. meat, dairy, legumes)
-                if "pku" in diagnosis_lower or "phenylketonuria" in diagnosis_lower:
-                    high_phe_foods = ["meat", "chicken", "beef", "pork", "fish", "dairy", "milk",
-                                     "cheese", "beans", "lentils", "peas", "soy", "egg"]
-                    if any(food_item in food_name for food_item in high_phe_foods):
-                        logger.debug(f"Excluding {food['food']} for PKU (high Phe)")
-                        continue
-
-                # CKD: Limit high-K, high-P foods
-                elif "ckd" in diagnosis_lower or "kidney" in diagnosis_lower:
-                    if nutrient.lower() in ["potassium", "phosphorus"]:
-                        # For K and P, we want LOW sources, not high
-                        logger.debug(f"CKD: Preferring lower {nutrient} foods")
-                        # Could reverse sort or apply threshold here
-
-                # Ketogenic: High fat, low CHO
-                elif "ketogenic" in diagnosis_lower or "epilepsy" in diagnosis_lower:
-                    if nutrient.lower() == "carbohydrate":
-                        # For keto, prefer LOW carb foods
-                        pass
+            if any(allergen in food_name for allergen in allergens_lower):
+                logger.debug(f"Excluding {food['food']} due to allergy")
+                continue
+
+            # PKU: Exclude high-protein foods (esp. meat, dairy, legumes)
+            if category == "pku" and any(food_item in food_name for food_item in _HIGH_PHE_FOODS):
+                logger.debug(f"Excluding {food['food']} for PKU (high Phe)")
+                continue
 
             filtered.append(food)
 
         return filtered
 
-    def _calculate_portion_size(
+    def _calculate_portion_sizes(
         self,
-        food: Dict[str, Any],
+        foods: List[Dict[str, Any]],
         nutrient: str,
         target_value: float,
         target_unit: str
-    ) -> Dict[str, Any]:
+    ) -> List[Dict[str, Any]]:
         """
-        Calculate portion size needed to meet target nutrient value.
+        Calculate portion sizes needed to meet target nutrient value.
+
+        The division is done once over all candidate foods with NumPy
+        instead of per food in a Python loop.
 
         Args:
-            food: Food dict with nutrient content per 100g
+            foods: Food dicts with nutrient content per 100g
             nutrient: Nutrient name
             target_value: Target amount needed
             target_unit: Target unit
 
         Returns:
-            Dict with food, amount_per_100g, serving_needed
+            List of dicts with food, amount_per_100g, serving_needed, grams
         """
-        content = food.get("content", {})
-        content_per_100g = content.get("value", 0)
-        content_unit = content.get("unit", target_unit)
+        if not foods:
+            return []
+
+        contents = [food.get("content", {}) for food in foods]
+        values = np.fromiter(
+            (content.get("value", 0) or 0 for content in contents),
+            dtype=np.float64,
+            count=len(contents)
+        )
 
         # Simple portion calculation (assumes same units)
-        if content_per_100g > 0:
-            grams_needed = (target_value / content_per_100g) * 100
-            # Convert to user-friendly serving
-            serving_str = self._format_serving_size(food.get("food"), grams_needed)
-        else:
-            grams_needed = 0
-            serving_str = "Unknown"
-
-        return {
-            "food": food.get("food"),
-            "amount_per_100g": f"{content_per_100g}{content_unit}",
-            "serving_needed": serving_str,
-            "grams": grams_needed
-        }
+        grams = np.zeros_like(values)
+        np.divide(float(target_value) * 100.0, values, out=grams, where=values > 0)
+
+        portions = []
+        for food, content, content_per_100g, grams_needed in zip(foods, contents, values.tolist(), grams.tolist()):
+            if content_per_100g > 0:
+                # Convert to user-friendly serving
+                serving_str = self._format_serving_size(food.get("food"), grams_needed)
+            else:
+                grams_needed = 0
+                serving_str = "Unknown"
+
+            portions.append({
+                "food": food.get("food"),
+                "amount_per_100g": f"{content.get('value', 0)}{content.get('unit', target_unit)}",
+                "serving_needed": serving_str,
+                "grams": grams_needed
+            })
+
+        return portions
 
     def _format_serving_size(self, food_name: str, grams: float) -> str:
         """
@@ -397,16 +561,10 @@ class FCTManager:
             Formatted serving string
         """
         # Simplified conversion (could be enhanced with actual serving data)
-        if grams < 30:
-            return f"{int(grams)}g (small portion)"
-        elif grams < 100:
-            return f"{int(grams)}g (1/2 cup approx)"
-        elif grams < 200:
-            return f"{int(grams)}g (1 cup approx)"
-        elif grams < 400:
-            return f"{int(grams)}g ({grams/200:.1f} cups approx)"
-        else:
-            return f"{int(grams)}g (large portion)"
+        label = _SERVING_LABELS[bisect.bisect_right(_SERVING_BREAKS, grams)]
+        if label is None:
+            label = f"{grams/200:.1f} cups approx"
+        return f"{int(grams)}g ({label})"
 
     def _get_generic_food_sources(
         self,
@@ -422,34 +580,17 @@ class FCTManager:
         """
         logger.info("Using generic food sources (FCT not available)")
 
-        generic_foods = {
-            "protein": ["Beans", "Chicken breast", "Fish", "Eggs", "Lentils"],
-            "carbohydrate": ["Rice", "Ugali", "Sweet potato", "Cassava", "Bread"],
-            "fat": ["Avocado", "Nuts", "Olive oil", "Groundnuts", "Seeds"],
-            "fiber": ["Sukuma wiki (kale)", "Oranges", "Carrots", "Whole grains", "Beans"],
-            "calcium": ["Milk", "Yogurt", "Sardines", "Kale", "Sesame seeds"],
-            "iron": ["Red meat", "Spinach", "Beans", "Fortified cereals", "Liver"],
-            "vitamin_c": ["Oranges", "Mango", "Papaya", "Tomatoes", "Guava"],
-            "vitamin_a": ["Carrots", "Sweet potato", "Mango", "Spinach", "Pumpkin"]
-        }
-
         food_sources = {}
 
         for nutrient in therapeutic_requirements.keys():
-            foods = generic_foods.get(nutrient.lower(), ["Various foods high in " + nutrient])
+            foods = _GENERIC_FOODS.get(nutrient.lower(), ("Various foods high in " + nutrient,))
             food_sources[nutrient] = [{"food": food, "amount_per_100g": "varies", "serving_needed": "varies"} for food in foods[:k]]
 
         return food_sources
 
     def _get_generic_foods_for_nutrient(self, nutrient: str, k: int) -> List[Dict[str, Any]]:
         """Get generic foods for a specific nutrient."""
-        generic_map = {
-            "protein": [("Beans", 21), ("Chicken", 31), ("Fish", 20), ("Eggs", 13), ("Lentils", 9)],
-            "calcium": [("Milk", 120), ("Yogurt", 110), ("Sardines", 380), ("Kale", 150), ("Sesame", 975)],
-            "iron": [("Liver", 6.5), ("Spinach", 2.7), ("Beans", 5.3), ("Red meat", 2.6)],
-        }
-
-        foods_data = generic_map.get(nutrient.lower(), [(f"Food high in {nutrient}", 0)])
+        foods_data = _GENERIC_FOODS_WITH_VALUES.get(nutrient.lower(), ((f"Food high in {nutrient}", 0),))
 
         return [
             {
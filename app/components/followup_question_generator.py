@@ -2,406 +2,572 @@
 import logging
 from app.common.logger import get_logger
 logger = get_logger(__name__)
-from typing import List, Optional, Dict, Any
-
-class FollowUpQuestionGenerator:
-    def __init__(self):
-        # Slot priority order tuned to your requirements (critical first)
-        self.slot_priority = [
-            "diagnosis",      # Critical for therapy mode
-            "age",            # demographics
-            "medications",    # must-have for therapy
-            "country",        # for FCT mapping
-            "biomarkers",     # must-have for therapy (can be multiple)
-            "height_cm",      # requested when necessary (e.g., for BMI/energy)
-            "weight_kg",
-            "allergies",
-            "dietary_patterns",
-        ]
-
-        # Step-by-step slots order for therapy "step by step" flow
-        self.step_by_step_slots = ["age", "medications", "country", "biomarkers"]
-
-    def generate_follow_up_question(self, query_info: dict, profile: dict, lab_results: list, clarifications: dict) -> Optional[dict]:
-        """
-        Generate ONE follow-up question per turn, prioritizing critical slots.
-        If query_info indicates a gatekeeper downgrade, return the educational fallback prompt.
-
-        CRITICAL FIX: For therapy intent, if critical requirements (meds/biomarkers) are rejected,
-        return None to trigger gatekeeper enforcement immediately.
-        """
-        # If gatekeeper downgraded from therapy -> recommendation, present single educational fallback prompt
-        if query_info.get("downgrade_reason"):
-            # The classifier already provided fallback_options and educational_text
-            edu_text = query_info.get("educational_text") or ""
-            fallback_options = query_info.get("fallback_options") or []
-            # Build prompt text preferring concise UX
-            options_text = " / ".join([f"{opt['id']}: {opt['text']}" for opt in fallback_options])
-            prompt = edu_text + "\n\nOptions: " + options_text
-            return {
-                "question": prompt,
-                "slot": "fallback_choice",
-                "composer_placeholder": "Reply 'upload', 'step by step', or 'overview'"
-            }
-
-        # Otherwise follow normal missing-slot flow
-        intent = query_info.get("label", "general")
-
-        # CRITICAL FIX (APPROACH 3): For therapy intent, check if critical requirements are rejected
-        # If medications OR biomarkers are rejected, don't ask for optional slots - let gatekeeper handle
-        if intent == "therapy":
-            meds_rejected = self._is_slot_rejected(profile, "medications")
-            biomarkers_rejected = self._is_slot_rejected(profile, "biomarkers")
-
-            # If EITHER critical requirement is rejected, stop asking questions
-            # This allows the gatekeeper in _handle_therapy to catch it and downgrade
-            if meds_rejected or biomarkers_rejected:
-                # Return None = no more questions = proceed to gatekeeper check
-                return None
-
-        missing_slots = self._get_missing_slots(intent, profile, lab_results)
-        invalid_slots = self._get_invalid_slots(profile)
-
-        # Prioritize invalid slots
-        if invalid_slots:
-            slot = invalid_slots[0]
-            return {
-                "question": self._create_invalid_question(slot),
-                "slot": slot,
-                "composer_placeholder": self._create_invalid_question(slot)
-            }
-
-        # If nothing missing - no follow-up needed
-        if not missing_slots:
+import bisect
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Dict, Any, Tuple
+
+# Numeric slots validated by _analyze_profile: slot -> (converter, min, max)
+_NUMERIC_SLOT_SPEC = {
+    "age": (int, 0, 120),
+    "height_cm": (float, 30, 250),
+    "weight_kg": (float, 2, 400),
+}
+
+# Plain numeric text each converter accepts without raising (checked before converting)
+_PLAIN_NUMBER_RE = {
+    int: re.compile(r"\s*[+-]?\d+\s*"),
+    float: re.compile(r"\s*[+-]?(?:\d+\.?\d*|\.\d+)\s*"),
+}
+# Text without a single digit is never an in-range number, except float's 'nan',
+# which the range check lets through (NaN compares false against both bounds)
+_DIGIT_RE = re.compile(r"\d")
+_NAN_RE = re.compile(r"\s*[+-]?nan\s*", re.IGNORECASE)
+
+# Sentinel telling "key absent" apart from an explicit None value
+_ABSENT = object()
+
+
+@lru_cache(maxsize=64)
+def _compose_downgrade_prompt(edu_text: str, options: Tuple[Tuple[str, str], ...]) -> str:
+    """Build the downgrade fallback prompt; cached since sessions repeat it turn after turn"""
+    # Build prompt text preferring concise UX
+    options_text = " / ".join(f"{opt_id}: {opt_text}" for opt_id, opt_text in options)
+    return edu_text + "\n\nOptions: " + options_text
+
+
+class _ConditionIndex:
+    """
+    Substring index over supported therapy condition keys.
+
+    match() returns the first key (in dict order) that either occurs inside the
+    diagnosis or contains it, scanning the diagnosis once instead of testing
+    every key in a Python loop.
+    """
+
+    __slots__ = ("_keys", "_order", "_shingles", "_key_pattern", "_key_blob", "_key_starts", "supported_list")
+
+    def __init__(self, conditions: Mapping[str, str]):
+        self._keys = tuple(conditions)
+        self._order = {key: i for i, key in enumerate(self._keys)}
+        # Every 2-character substring of any key; a diagnosis sharing none of them
+        # can neither contain a key nor be contained in one
+        self._shingles = frozenset(key[i:i + 2] for key in self._keys for i in range(len(key) - 1))
+        # Zero-width lookahead reports every (overlapping) key occurrence;
+        # alternatives are in dict order so the earliest key wins at each position
+        self._key_pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in self._keys) + "))")
+        # All keys joined by NUL, so one str.find answers "diagnosis in key" for every key
+        self._key_blob = "\0".join(self._keys)
+        self._key_starts = []
+        offset = 0
+        for key in self._keys:
+            self._key_starts.append(offset)
+            offset += len(key) + 1
+        # Computed once per index; sorted so the error message is stable across runs
+        self.supported_list = ", ".join(sorted(set(conditions.values())))
+
+    def match(self, diagnosis_lower: str) -> Optional[str]:
+        # Cheap reject for junk input (needs at least one 2-gram to be decisive)
+        if len(diagnosis_lower) >= 2 and not any(
+            diagnosis_lower[i:i + 2] in self._shingles for i in range(len(diagnosis_lower) - 1)
+        ):
             return None
 
-        # If the user explicitly indicated "step by step" in clarifications, follow that order
-        if clarifications and clarifications.get("mode") == "step_by_step":
-            for slot in self.step_by_step_slots:
-                if slot in missing_slots:
-                    q = self._create_question_for_slot(slot)
-                    return {"question": q, "slot": slot, "composer_placeholder": q}
-
-        # Default: choose by slot_priority
-        # CRITICAL FIX: For therapy intent, prioritize biomarkers BEFORE country
-        priority_list = self.slot_priority.copy()
-        if intent == "therapy":
-            # Reorder: biomarkers must come before country for therapy
-            if "biomarkers" in priority_list and "country" in priority_list:
-                priority_list.remove("biomarkers")
-                country_idx = priority_list.index("country")
-                # Insert biomarkers right before country
-                priority_list.insert(country_idx, "biomarkers")
-
-        for slot in priority_list:
-            if slot in missing_slots:
-                q = self._create_question_for_slot(slot)
-                return {"question": q, "slot": slot, "composer_placeholder": q}
-
-        # Fallback to first missing slot
-        slot = missing_slots[0]
-        q = self._create_question_for_slot(slot)
-        return {"question": q, "slot": slot, "composer_placeholder": q}
-
-    def generate_fallback_choice_prompt(self, fallback_options: List[Dict[str, str]]) -> dict:
-        """
-        Generate a single user prompt showing the three fallback choices.
-        This can be used independently by the orchestrator if desired.
-        """
-        options_text = "\n".join([f"{opt['id']}: {opt['text']}" for opt in fallback_options])
-        prompt = (
-            "I can only provide an overview because a full therapy plan needs both medication and biomarker data.\n\n"
-            "Please choose one of the options below:\n" + options_text +
-            "\n\nReply with 'upload', 'step by step', or 'overview'."
-        )
-        return {"question": prompt, "slot": "fallback_choice", "composer_placeholder": "upload / step by step / overview"}
+        best = None
+        for m in self._key_pattern.finditer(diagnosis_lower):
+            order = self._order[m.group(1)]
+            if best is None or order < best:
+                best = order
 
-    def _is_slot_rejected(self, profile: dict, slot_name: str) -> bool:
-        """Check if a slot was explicitly rejected by user"""
-        return (
-            profile.get(f"_rejected_{slot_name}") or
-            profile.get(slot_name) == "user_declined"
-        )
+        # diagnosis is a substring of a key (first occurrence = earliest key)
+        if "\0" not in diagnosis_lower:
+            pos = self._key_blob.find(diagnosis_lower)
+            if pos != -1:
+                order = bisect.bisect_right(self._key_starts, pos) - 1
+                if best is None or order < best:
+                    best = order
 
-    def _is_slot_actually_filled(self, profile: dict, slot_name: str) -> bool:
-        """Helper: Check if a slot is actually filled with valid data"""
-        value = profile.get(slot_name)
+        return None if best is None else self._keys[best]
 
-        # Check if None or empty string
-        if value is None or value == "":
-            return False
 
-        # Check if empty list
-        if isinstance(value, list) and len(value) == 0:
-            return False
+_supported_conditions: Optional[Mapping[str, str]] = None
+_condition_index: Optional[_ConditionIndex] = None
 
-        # Check if marked as declined (not valid data)
-        if value == "user_declined":
-            return False
-
-        # Otherwise it's filled with actual data
-        return True
-
-    def _get_missing_slots(self, intent: str, profile: dict, lab_results: list) -> List[str]:
-        """Determine which slots are missing for this intent"""
-        missing = []
-
-        # Profile may be None
-        profile = profile or {}
-
-        # CRITICAL FIX: Only add to missing if NOT rejected AND NOT filled
-        # Weight/height best-effort detection: accept 'weight' or 'weight_kg'; 'height' or 'height_cm'
-        if not self._is_slot_rejected(profile, "weight_kg") and not self._is_slot_actually_filled(profile, "weight_kg") and not self._is_slot_actually_filled(profile, "weight"):
-            missing.append("weight_kg")
-        if not self._is_slot_rejected(profile, "height_cm") and not self._is_slot_actually_filled(profile, "height_cm") and not self._is_slot_actually_filled(profile, "height"):
-            missing.append("height_cm")
-        if not self._is_slot_rejected(profile, "diagnosis") and not self._is_slot_actually_filled(profile, "diagnosis"):
-            missing.append("diagnosis")
-        if not self._is_slot_rejected(profile, "age") and not self._is_slot_actually_filled(profile, "age"):
-            missing.append("age")
-
-        # For therapy/recommendation, medications and allergies are important
-        if intent in ["therapy", "recommendation"]:
-            if not self._is_slot_rejected(profile, "medications") and not self._is_slot_actually_filled(profile, "medications"):
-                missing.append("medications")
-            # Allergies still important for safety
-            if not self._is_slot_rejected(profile, "allergies") and not self._is_slot_actually_filled(profile, "allergies"):
-                missing.append("allergies")
-
-        # Country mapping for FCT usage
-        if not profile.get("country"):
-            missing.append("country")
-
-        # Biomarkers: optional for recommendation, required for therapy (but gatekeeper already enforced)
-        if intent == "therapy":
-            # in therapy mode we assume gatekeeper validated having both meds and biomarkers
-            if not profile.get("biomarkers") and not lab_results:
-                missing.append("biomarkers")
-
-        # Comparison intent: need two foods
-        if intent == "comparison":
-            if not profile.get("food_a") or not profile.get("food_b"):
-                missing.extend(["food_a", "food_b"])
-
-        # Remove duplicates while preserving order
-        seen = set()
-        final_missing = []
-        for s in missing:
-            if s not in seen:
-                seen.add(s)
-                final_missing.append(s)
-
-        return final_missing
-
-    def _get_invalid_slots(self, profile: dict) -> List[str]:
-        """Return list of invalid slots (e.g., bad age)"""
-        invalid = []
-        if not profile:
-            return invalid
-
-        if "age" in profile:
-            try:
-                age_val = int(profile["age"])
-                if age_val < 0 or age_val > 120:
-                    invalid.append("age")
-            except Exception:
-                invalid.append("age")
-
-        if "height_cm" in profile:
-            try:
-                height_val = float(profile["height_cm"])
-                if height_val < 30 or height_val > 250:
-                    invalid.append("height_cm")
-            except Exception:
-                invalid.append("height_cm")
-
-        if "weight_kg" in profile:
-            try:
-                weight_val = float(profile["weight_kg"])
-                if weight_val < 2 or weight_val > 400:
-                    invalid.append("weight_kg")
-            except Exception:
-                invalid.append("weight_kg")
-
-        return invalid
-
-    def _create_invalid_question(self, slot: str) -> str:
-        if slot == "age":
-            return "What is the patient's age in years? (0-120)"
-        elif slot == "height_cm":
-            return "What is the patient's height in centimeters? (e.g., 85)"
-        elif slot == "weight_kg":
-            return "What is the patient's weight in kilograms? (e.g., 12.5)"
-        elif slot == "country":
-            return "Which country's Food Composition Table should I use? (e.g., Nigeria, Kenya, Canada)"
-        elif slot == "medications":
-            return "Please list current medications (include dose/frequency if possible), or say 'none'."
-        elif slot == "allergies":
-            return "Please list any known food allergies (or say 'none')."
-        elif slot == "biomarkers":
-            return "Please provide recent lab results (e.g., creatinine 0.6 mg/dL, HbA1c 7.2%). You can upload a lab PDF or type values."
-        return f"Clarify {slot}."
-
-    def _create_question_for_slot(self, slot: str) -> str:
-        """Return a single clear question for the requested slot"""
-        if slot == "weight_kg":
-            return "What is the patient's current weight in kilograms?"
-        elif slot == "height_cm":
-            return "What is the patient's current height in centimeters?"
-        elif slot == "diagnosis":
-            return "What is the diagnosis or medical condition?"
-        elif slot == "medications":
-            return "Are any medications being taken? If yes, please list them (or say 'none')."
-        elif slot == "allergies":
-            return "Any food allergies? List them or say 'none'."
-        elif slot == "country":
-            return "Which country's Food Composition Table should I use? (e.g., Nigeria, Kenya)"
-        elif slot == "biomarkers":
-            return "Please provide recent lab values (e.g., creatinine 0.6 mg/dL; HbA1c 7.2%). You can upload a file."
-        elif slot == "food_a" or slot == "food_b":
-            return "Please name the food to compare."
-        elif slot == "age":
-            return "What is the patient's age in years?"
-        return f"Please provide {slot.replace('_',' ')}."
-
-    # ============================================================================
-    # NEW METHODS FOR THERAPY FLOW
-    # ============================================================================
-
-    def validate_diagnosis_for_therapy(self, diagnosis: Optional[str]) -> Dict[str, Any]:
-        """
-        Validate if diagnosis is supported for therapy flow.
-
-        Uses SUPPORTED_THERAPY_CONDITIONS from query_classifier.
-
-        Args:
-            diagnosis: Diagnosis to validate
-
-        Returns:
-            Dict with keys:
-            - valid: bool (True if in supported therapy list)
-            - diagnosis_normalized: str (canonical name if valid)
-            - message: str (explanation if not valid)
-        """
-        if not diagnosis:
-            return {
-                "valid": False,
-                "diagnosis_normalized": None,
-                "message": "No diagnosis provided"
-            }
 
+def _get_supported_conditions() -> Mapping[str, str]:
+    """Resolve SUPPORTED_THERAPY_CONDITIONS once instead of importing on every call"""
+    global _supported_conditions
+    if _supported_conditions is None:
         # Import here to avoid circular dependency
         from app.components.query_classifier import SUPPORTED_THERAPY_CONDITIONS
-
-        diagnosis_lower = diagnosis.lower().strip()
-
-        # Check if in supported list
-        if diagnosis_lower in SUPPORTED_THERAPY_CONDITIONS:
-            return {
-                "valid": True,
-                "diagnosis_normalized": SUPPORTED_THERAPY_CONDITIONS[diagnosis_lower],
-                "message": f"Diagnosis '{diagnosis}' is supported for therapy planning"
-            }
-
-        # Partial match
-        for key, canonical in SUPPORTED_THERAPY_CONDITIONS.items():
-            if key in diagnosis_lower or diagnosis_lower in key:
-                return {
-                    "valid": True,
-                    "diagnosis_normalized": canonical,
-                    "message": f"Diagnosis '{diagnosis}' mapped to '{canonical}' for therapy planning"
-                }
-
-        # Not in supported list
+        _supported_conditions = SUPPORTED_THERAPY_CONDITIONS
+    return _supported_conditions
+
+
+def _get_condition_index() -> _ConditionIndex:
+    """Build the condition index on first use and reuse it afterwards"""
+    global _condition_index
+    if _condition_index is None:
+        _condition_index = _ConditionIndex(_get_supported_conditions())
+    return _condition_index
+
+
+# Slot priority order tuned to your requirements (critical first)
+SLOT_PRIORITY = (
+    "diagnosis",      # Critical for therapy mode
+    "age",            # demographics
+    "medications",    # must-have for therapy
+    "country",        # for FCT mapping
+    "biomarkers",     # must-have for therapy (can be multiple)
+    "height_cm",      # requested when necessary (e.g., for BMI/energy)
+    "weight_kg",
+    "allergies",
+    "dietary_patterns",
+)
+
+# Step-by-step slots order for therapy "step by step" flow
+STEP_BY_STEP_SLOTS = ("age", "medications", "country", "biomarkers")
+
+# Per-intent priority order
+# CRITICAL FIX: For therapy intent, biomarkers must come BEFORE country
+_PRIORITY_BY_INTENT = {
+    "therapy": (
+        "diagnosis", "age", "medications", "biomarkers", "country",
+        "height_cm", "weight_kg", "allergies", "dietary_patterns",
+    ),
+    "_default": SLOT_PRIORITY,
+}
+
+# Slots each intent needs before answering, in the order they are reported missing
+_REQUIRED_SLOTS = {
+    # therapy/recommendation: medications and allergies (safety) are important;
+    # biomarkers are required for therapy (gatekeeper already enforced)
+    "therapy": ("weight_kg", "height_cm", "diagnosis", "age", "medications", "allergies", "country", "biomarkers"),
+    "recommendation": ("weight_kg", "height_cm", "diagnosis", "age", "medications", "allergies", "country"),
+    # comparison: need two foods
+    "comparison": ("weight_kg", "height_cm", "diagnosis", "age", "country", "food_a", "food_b"),
+    # country mapping for FCT usage
+    "_base": ("weight_kg", "height_cm", "diagnosis", "age", "country"),
+}
+
+# Slots that count as given whenever the profile value is truthy: rejection
+# markers don't apply to them and any truthy value (even "user_declined") fills them
+_TRUTHY_FILLED_SLOTS = frozenset({"country", "biomarkers"})
+
+# Best-effort alternate keys: accept 'weight' for 'weight_kg', 'height' for 'height_cm'
+_SLOT_ALIASES = {"weight_kg": "weight", "height_cm": "height"}
+
+# Profile keys marking an explicit rejection, built once instead of formatted per check
+_REJECTED_KEYS = {
+    slot: "_rejected_" + slot
+    for slot in ("weight_kg", "height_cm", "diagnosis", "age", "medications", "allergies",
+                 "country", "biomarkers", "food_a", "food_b", "dietary_patterns", "weight", "height")
+}
+
+# Re-ask prompts for slots whose current value failed validation
+_INVALID_QUESTION_BY_SLOT = {
+    "age": "What is the patient's age in years? (0-120)",
+    "height_cm": "What is the patient's height in centimeters? (e.g., 85)",
+    "weight_kg": "What is the patient's weight in kilograms? (e.g., 12.5)",
+    "country": "Which country's Food Composition Table should I use? (e.g., Nigeria, Kenya, Canada)",
+    "medications": "Please list current medications (include dose/frequency if possible), or say 'none'.",
+    "allergies": "Please list any known food allergies (or say 'none').",
+    "biomarkers": "Please provide recent lab results (e.g., creatinine 0.6 mg/dL, HbA1c 7.2%). You can upload a lab PDF or type values.",
+}
+
+# First-time prompts for missing slots
+_QUESTION_BY_SLOT = {
+    "weight_kg": "What is the patient's current weight in kilograms?",
+    "height_cm": "What is the patient's current height in centimeters?",
+    "diagnosis": "What is the diagnosis or medical condition?",
+    "medications": "Are any medications being taken? If yes, please list them (or say 'none').",
+    "allergies": "Any food allergies? List them or say 'none'.",
+    "country": "Which country's Food Composition Table should I use? (e.g., Nigeria, Kenya)",
+    "biomarkers": "Please provide recent lab values (e.g., creatinine 0.6 mg/dL; HbA1c 7.2%). You can upload a file.",
+    "food_a": "Please name the food to compare.",
+    "food_b": "Please name the food to compare.",
+    "age": "What is the patient's age in years?",
+}
+
+# 3-option nudge: only the missing-data phrase varies between calls
+_NUDGE_TEMPLATE = (
+    "To create a personalized therapeutic meal plan, I need {missing}. "
+    "How would you like to proceed?\n\n"
+    "🅰️ **Upload medical records** - I'll extract the information automatically\n"
+    "🅱️ **Step-by-step questions** - I'll ask for each piece of information\n"
+    "🅲️ **General dietary info only** - Skip personalized therapy planning\n\n"
+    "Please reply with A, B, or C."
+)
+
+_NUDGE_OPTIONS = (
+    MappingProxyType({
+        "id": "upload",
+        "label": "🅰️ Upload medical records",
+        "text": "Upload",
+        "action": "upload_file"
+    }),
+    MappingProxyType({
+        "id": "step_by_step",
+        "label": "🅱️ Step-by-step questions",
+        "text": "Step by step",
+        "action": "guided_qa"
+    }),
+    MappingProxyType({
+        "id": "general_info",
+        "label": "🅲️ General dietary info only",
+        "text": "General info",
+        "action": "downgrade_to_recommendation"
+    }),
+)
+
+# Static parts of the fallback choice prompt; only the option lines vary
+_FALLBACK_PREAMBLE = (
+    "I can only provide an overview because a full therapy plan needs both medication and biomarker data.\n\n"
+    "Please choose one of the options below:\n"
+)
+_FALLBACK_SUFFIX = "\n\nReply with 'upload', 'step by step', or 'overview'."
+
+
+def generate_follow_up_question(query_info: dict, profile: dict, lab_results: list, clarifications: dict) -> Optional[dict]:
+    """
+    Generate ONE follow-up question per turn, prioritizing critical slots.
+    If query_info indicates a gatekeeper downgrade, return the educational fallback prompt.
+
+    CRITICAL FIX: For therapy intent, if critical requirements (meds/biomarkers) are rejected,
+    return None to trigger gatekeeper enforcement immediately.
+    """
+    # If gatekeeper downgraded from therapy -> recommendation, present single educational fallback prompt
+    if query_info.get("downgrade_reason"):
+        # The classifier already provided fallback_options and educational_text
+        edu_text = query_info.get("educational_text") or ""
+        fallback_options = query_info.get("fallback_options") or []
+        options_key = tuple((opt["id"], opt["text"]) for opt in fallback_options)
         return {
-            "valid": False,
-            "diagnosis_normalized": None,
-            "message": f"Diagnosis '{diagnosis}' is not in the supported therapy list. Supported conditions: {', '.join(set(SUPPORTED_THERAPY_CONDITIONS.values()))}"
+            "question": _compose_downgrade_prompt(edu_text, options_key),
+            "slot": "fallback_choice",
+            "composer_placeholder": "Reply 'upload', 'step by step', or 'overview'"
         }
 
-    def generate_3_option_nudge(
-        self,
-        missing_critical_data: List[str]
-    ) -> Dict[str, Any]:
-        """
-        Generate 3-option nudge when therapy requires data but it's missing.
-
-        Options:
-        A. Upload medical records (extract meds + biomarkers)
-        B. Step-by-step Q&A (guided slot filling)
-        C. General info only (downgrade to recommendation)
-
-        Args:
-            missing_critical_data: List of missing slots (e.g., ["medications", "biomarkers"])
-
-        Returns:
-            Dict with question, options list, slot name
-        """
-        missing_str = " and ".join(missing_critical_data)
-
-        question = (
-            f"To create a personalized therapeutic meal plan, I need {missing_str}. "
-            f"How would you like to proceed?\n\n"
-            f"🅰️ **Upload medical records** - I'll extract the information automatically\n"
-            f"🅱️ **Step-by-step questions** - I'll ask for each piece of information\n"
-            f"🅲️ **General dietary info only** - Skip personalized therapy planning\n\n"
-            f"Please reply with A, B, or C."
-        )
+    # Otherwise follow normal missing-slot flow
+    intent = query_info.get("label", "general")
 
-        options = [
-            {
-                "id": "upload",
-                "label": "🅰️ Upload medical records",
-                "text": "Upload",
-                "action": "upload_file"
-            },
-            {
-                "id": "step_by_step",
-                "label": "🅱️ Step-by-step questions",
-                "text": "Step by step",
-                "action": "guided_qa"
-            },
-            {
-                "id": "general_info",
-                "label": "🅲️ General dietary info only",
-                "text": "General info",
-                "action": "downgrade_to_recommendation"
-            }
-        ]
+    # CRITICAL FIX (APPROACH 3): For therapy intent, check if critical requirements are rejected
+    # If medications OR biomarkers are rejected, don't ask for optional slots - let gatekeeper handle
+    if intent == "therapy":
+        meds_rejected = _is_slot_rejected(profile, "medications")
+        biomarkers_rejected = _is_slot_rejected(profile, "biomarkers")
 
+        # If EITHER critical requirement is rejected, stop asking questions
+        # This allows the gatekeeper in _handle_therapy to catch it and downgrade
+        if meds_rejected or biomarkers_rejected:
+            # Return None = no more questions = proceed to gatekeeper check
+            return None
+
+    missing_slots, invalid_slots = _analyze_profile(intent, profile, lab_results)
+
+    # Prioritize invalid slots
+    if invalid_slots:
+        slot = invalid_slots[0]
         return {
-            "question": question,
-            "slot": "nudge_choice",
-            "options": options,
-            "missing_data": missing_critical_data,
-            "composer_placeholder": "Reply 'A', 'B', or 'C'"
+            "question": _create_invalid_question(slot),
+            "slot": slot,
+            "composer_placeholder": _create_invalid_question(slot)
         }
 
-    def should_trigger_nudge(
-        self,
-        intent: str,
-        profile: Dict[str, Any]
-    ) -> bool:
-        """
-        Determine if 3-option nudge should be triggered.
-
-        Trigger when:
-        - Intent is therapy
-        - Missing medications OR biomarkers
-
-        Args:
-            intent: Query intent
-            profile: User profile with slots
-
-        Returns:
-            True if nudge should be triggered
-        """
-        if intent != "therapy":
+    # If nothing missing - no follow-up needed
+    if not missing_slots:
+        return None
+
+    missing_set = set(missing_slots)
+
+    # If the user explicitly indicated "step by step" in clarifications, follow that order
+    if clarifications and clarifications.get("mode") == "step_by_step":
+        for slot in STEP_BY_STEP_SLOTS:
+            if slot in missing_set:
+                q = _create_question_for_slot(slot)
+                return {"question": q, "slot": slot, "composer_placeholder": q}
+
+    # Default: choose by slot_priority (therapy has biomarkers before country)
+    priority_list = _PRIORITY_BY_INTENT.get(intent, _PRIORITY_BY_INTENT["_default"])
+
+    for slot in priority_list:
+        if slot in missing_set:
+            q = _create_question_for_slot(slot)
+            return {"question": q, "slot": slot, "composer_placeholder": q}
+
+    # Fallback to first missing slot
+    slot = missing_slots[0]
+    q = _create_question_for_slot(slot)
+    return {"question": q, "slot": slot, "composer_placeholder": q}
+
+
+def generate_fallback_choice_prompt(fallback_options: List[Dict[str, str]]) -> dict:
+    """
+    Generate a single user prompt showing the three fallback choices.
+    This can be used independently by the orchestrator if desired.
+    """
+    prompt = (
+        _FALLBACK_PREAMBLE +
+        "\n".join(f"{opt['id']}: {opt['text']}" for opt in fallback_options) +
+        _FALLBACK_SUFFIX
+    )
+    return {"question": prompt, "slot": "fallback_choice", "composer_placeholder": "upload / step by step / overview"}
+
+
+def _is_slot_rejected(profile: dict, slot_name: str) -> bool:
+    """Check if a slot was explicitly rejected by user"""
+    rejected_key = _REJECTED_KEYS.get(slot_name) or "_rejected_" + slot_name
+    return (
+        profile.get(rejected_key) or
+        profile.get(slot_name) == "user_declined"
+    )
+
+
+def _is_slot_actually_filled(profile: dict, slot_name: str) -> bool:
+    """Helper: Check if a slot is actually filled with valid data"""
+    return _is_value_filled(profile.get(slot_name))
+
+
+def _is_value_filled(value: Any) -> bool:
+    """Helper: Check if a slot value is actual data (not empty or declined)"""
+    # None, empty string, empty list, or declined marker are not valid data
+    if value is None or value == "" or value == "user_declined":
+        return False
+    return not (isinstance(value, list) and len(value) == 0)
+
+
+def _is_number_in_range(value: Any, convert: type, low: float, high: float) -> bool:
+    """
+    True unless value fails to convert with `convert` or falls outside
+    [low, high]. NaN is not outside the range, so a float NaN passes.
+    """
+    if isinstance(value, str):
+        # Common inputs are decided without raising: plain numbers convert
+        # cleanly, and digit-free text ("abc", "unknown") is rejected outright
+        if _PLAIN_NUMBER_RE[convert].fullmatch(value):
+            number = convert(value)
+            return not (number < low or number > high)
+        if not _DIGIT_RE.search(value) and not (convert is float and _NAN_RE.fullmatch(value)):
             return False
+    # Rare string forms ("1e2", "1_000", "nan") and every non-string (numpy
+    # scalars, Decimal, None, lists) take the exact conversion path
+    try:
+        number = convert(value)
+        return not (number < low or number > high)
+    except (TypeError, ValueError, OverflowError):
+        return False
+
+
+def _analyze_profile(intent: str, profile: dict, lab_results: list) -> Tuple[List[str], List[str]]:
+    """
+    Return (missing, invalid) slots for this intent in a single pass,
+    reading each required profile key once.
+    """
+    # Profile may be None
+    profile = profile or {}
+    missing = []
+    invalid_found = set()
+
+    # Every required-slot tuple includes the numeric slots, so they are validated here too
+    for slot in _REQUIRED_SLOTS.get(intent, _REQUIRED_SLOTS["_base"]):
+        value = profile.get(slot, _ABSENT)
+
+        # Invalid: a numeric slot that is present but not a number in range
+        spec = _NUMERIC_SLOT_SPEC.get(slot)
+        if spec is not None and value is not _ABSENT:
+            if not _is_number_in_range(value, *spec):
+                invalid_found.add(slot)
+
+        if value is _ABSENT:
+            value = None
+        if slot in _TRUTHY_FILLED_SLOTS:
+            if value:
+                continue
+        else:
+            # CRITICAL FIX: Only add to missing if NOT rejected AND NOT filled
+            if value == "user_declined" or profile.get(_REJECTED_KEYS[slot]):
+                continue
+            if _is_value_filled(value):
+                continue
+            alias = _SLOT_ALIASES.get(slot)
+            if alias and _is_value_filled(profile.get(alias)):
+                continue
+        # Uploaded lab results stand in for typed biomarkers
+        if slot == "biomarkers" and lab_results:
+            continue
+        missing.append(slot)
+
+    # Report invalid slots in validation order (age, height, weight)
+    invalid = [slot for slot in _NUMERIC_SLOT_SPEC if slot in invalid_found] if invalid_found else []
+    return missing, invalid
+
+
+def _get_missing_slots(intent: str, profile: dict, lab_results: list) -> List[str]:
+    """Determine which slots are missing for this intent"""
+    return _analyze_profile(intent, profile, lab_results)[0]
+
+
+def _get_invalid_slots(profile: dict) -> List[str]:
+    """Return list of invalid slots (e.g., bad age)"""
+    return _analyze_profile("_base", profile, [])[1]
+
+
+@lru_cache(maxsize=64)
+def _create_invalid_question(slot: str) -> str:
+    return _INVALID_QUESTION_BY_SLOT.get(slot) or f"Clarify {slot}."
+
+
+@lru_cache(maxsize=64)
+def _create_question_for_slot(slot: str) -> str:
+    """Return a single clear question for the requested slot"""
+    return _QUESTION_BY_SLOT.get(slot) or f"Please provide {slot.replace('_',' ')}."
+
+
+# ============================================================================
+# NEW FUNCTIONS FOR THERAPY FLOW
+# ============================================================================
+
+def validate_diagnosis_for_therapy(diagnosis: Optional[str]) -> Dict[str, Any]:
+    """
+    Validate if diagnosis is supported for therapy flow.
+
+    Uses SUPPORTED_THERAPY_CONDITIONS from query_classifier.
+
+    Args:
+        diagnosis: Diagnosis to validate
+
+    Returns:
+        Dict with keys:
+        - valid: bool (True if in supported therapy list)
+        - diagnosis_normalized: str (canonical name if valid)
+        - message: str (explanation if not valid)
+    """
+    if not diagnosis:
+        return {
+            "valid": False,
+            "diagnosis_normalized": None,
+            "message": "No diagnosis provided"
+        }
+
+    valid, normalized, message = _validate_diagnosis(diagnosis)
+    return {
+        "valid": valid,
+        "diagnosis_normalized": normalized,
+        "message": message
+    }
+
+
+@lru_cache(maxsize=64)
+def _validate_diagnosis(diagnosis: str) -> Tuple[bool, Optional[str], str]:
+    """Cached core of validate_diagnosis_for_therapy: (valid, diagnosis_normalized, message)"""
+    SUPPORTED_THERAPY_CONDITIONS = _get_supported_conditions()
 
-        # Check if critical slots are missing
-        has_meds = self._is_slot_actually_filled(profile, "medications")
-        has_biomarkers = self._is_slot_actually_filled(profile, "biomarkers")
+    diagnosis_lower = diagnosis.lower().strip()
 
-        # Trigger nudge if either is missing
-        return not (has_meds and has_biomarkers)
+    # Check if in supported list
+    if diagnosis_lower in SUPPORTED_THERAPY_CONDITIONS:
+        return (
+            True,
+            SUPPORTED_THERAPY_CONDITIONS[diagnosis_lower],
+            f"Diagnosis '{diagnosis}' is supported for therapy planning"
+        )
+
+    # Partial match
+    index = _get_condition_index()
+    key = index.match(diagnosis_lower)
+    if key is not None:
+        canonical = SUPPORTED_THERAPY_CONDITIONS[key]
+        return (
+            True,
+            canonical,
+            f"Diagnosis '{diagnosis}' mapped to '{canonical}' for therapy planning"
+        )
+
+    # Not in supported list
+    return (
+        False,
+        None,
+        f"Diagnosis '{diagnosis}' is not in the supported therapy list. Supported conditions: {index.supported_list}"
+    )
+
+
+def generate_3_option_nudge(
+    missing_critical_data: List[str]
+) -> Dict[str, Any]:
+    """
+    Generate 3-option nudge when therapy requires data but it's missing.
+
+    Options:
+    A. Upload medical records (extract meds + biomarkers)
+    B. Step-by-step Q&A (guided slot filling)
+    C. General info only (downgrade to recommendation)
+
+    Args:
+        missing_critical_data: List of missing slots (e.g., ["medications", "biomarkers"])
+
+    Returns:
+        Dict with question, options list, slot name
+    """
+    return {
+        "question": _NUDGE_TEMPLATE.format(missing=" and ".join(missing_critical_data)),
+        "slot": "nudge_choice",
+        # plain dict copies: the payload is JSON-serialized and callers may edit it
+        "options": [dict(option) for option in _NUDGE_OPTIONS],
+        "missing_data": missing_critical_data,
+        "composer_placeholder": "Reply 'A', 'B', or 'C'"
+    }
+
+
+def should_trigger_nudge(
+    intent: str,
+    profile: Dict[str, Any]
+) -> bool:
+    """
+    Determine if 3-option nudge should be triggered.
+
+    Trigger when:
+    - Intent is therapy
+    - Missing medications OR biomarkers
+
+    Args:
+        intent: Query intent
+        profile: User profile with slots
+
+    Returns:
+        True if nudge should be triggered
+    """
+    # Trigger nudge if either critical slot is missing; biomarkers are the
+    # more commonly missing one, so testing them first short-circuits sooner
+    return intent == "therapy" and not (
+        _is_slot_actually_filled(profile, "biomarkers") and
+        _is_slot_actually_filled(profile, "medications")
+    )
+
+
+class FollowUpQuestionGenerator:
+    """
+    Backward-compatible wrapper around the module-level functions.
+
+    Stateless; each method is a staticmethod alias, so calls skip bound-method
+    creation and go straight to the function.
+    """
+    __slots__ = ()
+
+    SLOT_PRIORITY = SLOT_PRIORITY
+    STEP_BY_STEP_SLOTS = STEP_BY_STEP_SLOTS
+
+    generate_follow_up_question = staticmethod(generate_follow_up_question)
+    generate_fallback_choice_prompt = staticmethod(generate_fallback_choice_prompt)
+    validate_diagnosis_for_therapy = staticmethod(validate_diagnosis_for_therapy)
+    generate_3_option_nudge = staticmethod(generate_3_option_nudge)
+    should_trigger_nudge = staticmethod(should_trigger_nudge)
+
+    _is_slot_rejected = staticmethod(_is_slot_rejected)
+    _is_slot_actually_filled = staticmethod(_is_slot_actually_filled)
+    _is_value_filled = staticmethod(_is_value_filled)
+    _analyze_profile = staticmethod(_analyze_profile)
+    _get_missing_slots = staticmethod(_get_missing_slots)
+    _get_invalid_slots = staticmethod(_get_invalid_slots)
+    _create_invalid_question = staticmethod(_create_invalid_question)
+    _create_question_for_slot = staticmethod(_create_question_for_slot)
@@ -1,12 +1,21 @@
 # app/components/hybrid_retriever.py
+import json
 import logging
 import threading
+import time
 import os
 import pickle
-from typing import Dict, Any, List, Optional, Union, Tuple
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Any, FrozenSet, Iterator, List, NamedTuple, Optional, Union, Tuple
 from pathlib import Path
+import numpy as np
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
 from app.common.logger import get_logger
 from app.common.custom_exception import CustomException
 from app.components.embeddings import get_embedding_model
@@ -20,6 +29,55 @@ except Exception as e:
     BM25Okapi = None
     logger.warning("rank_bm25 not available; BM25 fallback disabled. Install 'rank_bm25' for sparse retrieval.")
 
+@lru_cache(maxsize=4096)
+def _tokenize_query(query: str) -> Tuple[str, ...]:
+    """Lowercase/whitespace tokenization (matches the BM25 corpus tokenizer), cached per query"""
+    return tuple(query.lower().split())
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first, ties broken by lower index
+    (same order as a stable descending sort) without sorting every document.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.intp)
+    if k < n:
+        # Partial selection finds the k-th best score; keep every doc tied with it
+        # so the stable sort below picks ties exactly as a full sort would
+        kth_best = scores[np.argpartition(-scores, k - 1)[:k]].min()
+        candidates = np.flatnonzero(scores >= kth_best)
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+
+class _BM25Index(NamedTuple):
+    """
+    Immutable BM25 index, published with a single attribute assignment so a
+    background build never exposes half-updated structures to readers.
+    Postings for vocab column c are [term_ptr[c], term_ptr[c + 1]).
+    """
+    docs: List[Document]
+    vocab: Dict[str, int]
+    term_ptr: np.ndarray
+    post_docs: np.ndarray
+    post_weights: np.ndarray
+
+# Reciprocal-rank fusion damping constant (standard value from the RRF paper)
+_RRF_K = 60
+
+# Rebuild embedding: texts per embed_documents call, and concurrent calls
+_EMBED_SHARD_SIZE = 512
+_MAX_EMBED_WORKERS = min(4, os.cpu_count() or 1)
+
+# Vectors a filtered LangChain FAISS search scans before filtering (its fetch_k default)
+_FAISS_FETCH_K = 20
+
+# FAISS search results are reused for identical (query, filter, k) searches
+# within this window; concurrent identical searches share one FAISS call
+_SEARCH_CACHE_SIZE = 1024
+_SEARCH_CACHE_TTL = 30.0  # seconds
+
 # ---------------------------
 # Retriever singleton manager
 # ---------------------------
@@ -34,12 +92,19 @@ class RetrieverManager:
                 if cls._instance is None:
                     cls._instance = super().__new__(cls)
                     cls._instance._retriever = None
-                    cls._instance._retriever_lock = threading.RLock()
+                    # guards publication in set_retriever and the autoload claim;
+                    # reads are lock-free (a single attribute load is atomic)
+                    cls._instance._retriever_lock = threading.Lock()
+                    # filtered_retrieval tries the default FAISS index at most once per process
+                    cls._instance._autoload_attempted = False
+                    # bumped whenever the searchable index changes; part of the search cache key
+                    cls._instance._index_version = 0
+                    # (index version, metadata key -> value -> sorted FAISS positions)
+                    cls._instance._filter_postings = None
                     # bm25 structures
-                    cls._instance._bm25 = None
-                    cls._instance._bm25_corpus = []
-                    cls._instance._bm25_tokenized = []
-                    cls._instance._bm25_docs = []
+                    cls._instance._bm25 = None  # Optional[_BM25Index]
+                    # serializes BM25 builds (background seeding vs. first query)
+                    cls._instance._bm25_build_lock = threading.Lock()
                     cls._instance._embedding_model = None
         return cls._instance
 
@@ -47,17 +112,158 @@ class RetrieverManager:
     # FAISS setter/getter
     # -------------------------
     def set_retriever(self, vector_store: FAISS):
-        with self._retriever_lock:
+        # The BM25 index was built from the previous store's documents: drop it
+        # (after any in-flight build) so the next one is built for this store
+        with self._bm25_build_lock, self._retriever_lock:
             self._retriever = vector_store
+            self._index_version += 1
+            self._bm25 = None
             logger.info("Hybrid retriever initialized with FAISS store")
 
     def get_retriever(self) -> Optional[FAISS]:
-        with self._retriever_lock:
-            return self._retriever
+        # Lock-free: _retriever is only rebound (atomically) under the lock in set_retriever
+        return self._retriever
 
     def is_available(self) -> bool:
+        return self._retriever is not None
+
+    def claim_autoload(self) -> bool:
+        """Return True exactly once per process, for the caller that should try the default index"""
+        if self._autoload_attempted:
+            return False
         with self._retriever_lock:
-            return self._retriever is not None
+            if self._autoload_attempted:
+                return False
+            self._autoload_attempted = True
+            return True
+
+    def use_inner_product(self) -> bool:
+        """
+        Swap a flat L2 index over unit-norm embeddings for IndexFlatIP: same
+        ranking (|a-b|^2 = 2 - 2*a.b for unit vectors) from a plain dot product.
+        Returns True if the index was converted.
+        """
+        import faiss
+
+        with self._retriever_lock:
+            vs = self._retriever
+            if vs is None:
+                return False
+            old_index = vs.index
+            ntotal = old_index.ntotal
+            if ntotal == 0 or old_index.metric_type != faiss.METRIC_L2 or not isinstance(old_index, faiss.IndexFlat):
+                return False
+            vectors = np.ascontiguousarray(old_index.reconstruct_n(0, ntotal), dtype=np.float32)
+            norms = np.linalg.norm(vectors[:min(ntotal, 1000)], axis=1)
+            if not np.allclose(norms, 1.0, atol=1e-3):
+                logger.info("Embeddings are not unit-norm; keeping the L2 index")
+                return False
+
+            new_index = faiss.IndexFlatIP(old_index.d)
+            new_index.add(vectors)
+            vs.index = new_index
+            vs.distance_strategy = DistanceStrategy.MAX_INNER_PRODUCT
+            self._index_version += 1
+            logger.info("FAISS index switched to inner product over %d vectors", ntotal)
+            return True
+
+    def rebuild_index_as(self, kind: str = "hnsw", nlist: int = 256, m: int = 32, nprobe: int = 16) -> bool:
+        """
+        Replace the loaded store's brute-force FAISS index with an approximate one:
+        kind="hnsw" builds HNSW{m}, kind="ivf" builds IVF{nlist},Flat searched with nprobe lists,
+        kind="sq8" stores 8-bit scalar-quantized vectors (4x less memory traffic per scan),
+        kind="pq" builds OPQ{m},IVF{nlist},PQ{m} (m sub-quantizers, reduced to a divisor of d).
+        Vectors are re-added in their original order, so FAISS positions (and the
+        store's index_to_docstore_id mapping) are unchanged. Returns True on success.
+        """
+        import faiss
+
+        with self._retriever_lock:
+            vs = self._retriever
+            if vs is None:
+                logger.warning("rebuild_index_as: no retriever loaded")
+                return False
+            old_index = vs.index
+            ntotal, dim = old_index.ntotal, old_index.d
+            if ntotal == 0:
+                return False
+
+            kind = kind.lower()
+            if kind == "hnsw":
+                description = f"HNSW{m}"
+            elif kind == "ivf":
+                # IVF training needs at least one vector per list
+                nlist = max(1, min(nlist, ntotal))
+                description = f"IVF{nlist},Flat"
+            elif kind == "sq8":
+                description = "SQ8"
+            elif kind == "pq":
+                # 8-bit PQ codebooks need at least 256 training vectors
+                if ntotal < 256:
+                    raise ValueError(f"PQ needs at least 256 vectors, index has {ntotal}")
+                m = max(d for d in range(1, min(m, dim) + 1) if dim % d == 0)
+                nlist = max(1, min(nlist, ntotal // 39))
+                description = f"OPQ{m},IVF{nlist},PQ{m}"
+            else:
+                raise ValueError(f"Unsupported FAISS index kind: {kind}")
+
+            vectors = np.ascontiguousarray(old_index.reconstruct_n(0, ntotal), dtype=np.float32)
+            new_index = faiss.index_factory(dim, description, old_index.metric_type)
+            if not new_index.is_trained:
+                new_index.train(vectors)
+            new_index.add(vectors)
+            if kind in ("ivf", "pq"):
+                faiss.extract_index_ivf(new_index).nprobe = min(nprobe, nlist)
+
+            # Searches already running keep the old index; new ones see the new one
+            vs.index = new_index
+            self._index_version += 1
+            logger.info("FAISS index rebuilt as %s over %d vectors", description, ntotal)
+            return True
+
+    def filter_positions(self, meta_filter: Dict[str, Any]) -> Optional[np.ndarray]:
+        """
+        FAISS positions of the documents matching a normalized metadata filter
+        (LangChain semantics: scalar value -> equality, list value -> membership),
+        from postings built once per index version. None when the filter can't be
+        answered from the postings (unhashable values, non-positional ids).
+        """
+        if not meta_filter:
+            return None
+        postings = self._get_filter_postings()
+        if postings is None:
+            return None
+        matched: Optional[np.ndarray] = None
+        for key, value in meta_filter.items():
+            by_value = postings.get(key)
+            if by_value is None:
+                return None
+            values = value if isinstance(value, list) else (value,)
+            try:
+                hits = [by_value[v] for v in values if v in by_value]
+            except TypeError:
+                return None
+            if not hits:
+                return np.zeros(0, dtype=np.int64)
+            positions = hits[0] if len(hits) == 1 else np.unique(np.concatenate(hits))
+            matched = positions if matched is None else np.intersect1d(matched, positions, assume_unique=True)
+            if not len(matched):
+                break
+        return matched
+
+    def _get_filter_postings(self) -> Optional[Dict[str, Dict[Any, np.ndarray]]]:
+        version = self._index_version
+        cached = self._filter_postings
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._retriever_lock:
+            cached = self._filter_postings
+            if cached is not None and cached[0] == self._index_version:
+                return cached[1]
+            vs = self._retriever
+            postings = _build_filter_postings(vs) if vs is not None else None
+            self._filter_postings = (self._index_version, postings)
+            return postings
 
     # -------------------------
     # BM25 helpers
@@ -72,33 +278,87 @@ class RetrieverManager:
             self._bm25 = None
             return
 
-        corpus = []
+        tokenized = []
         doc_objs = []
         for d in docs:
             text = getattr(d, "page_content", None) or d.metadata.get("text") or d.metadata.get("content") or ""
             title = d.metadata.get("title") or d.metadata.get("food") or ""
-            # store combined title+text to improve keyword hits
-            combined = (title + " " + text).strip()
-            if combined:
-                corpus.append(combined)
+            # combined title+text improves keyword hits
+            # Basic tokenization - whitespace & lowercase. Customize for better tokenization if needed.
+            tokens = (title + " " + text).lower().split()
+            if tokens:
+                tokenized.append(tokens)
                 doc_objs.append(d)
 
-        # Basic tokenization - whitespace & lowercase. Customize for better tokenization if needed.
-        tokenized = [c.lower().split() for c in corpus]
-        self._bm25_corpus = corpus
-        self._bm25_tokenized = tokenized
-        self._bm25_docs = doc_objs
-        self._bm25 = BM25Okapi(tokenized)
+        # Only the postings arrays (and the Documents) outlive this call; the
+        # combined strings, token lists and BM25Okapi object are dropped here
+        self._bm25 = self._build_bm25_index(doc_objs, BM25Okapi(tokenized))
         logger.info(f"BM25 index built with {len(tokenized)} docs")
 
+    @staticmethod
+    def _build_bm25_index(docs: List[Document], bm25) -> _BM25Index:
+        """
+        Precompute per-term postings (doc ids + full BM25 term weights) from a
+        fitted BM25Okapi so a query is scored by touching only the documents
+        that contain its terms, instead of BM25Okapi.get_scores walking every
+        document for every query token in Python.
+        """
+        vocab: Dict[str, int] = {}
+        cols: List[int] = []
+        rows: List[int] = []
+        tfs: List[int] = []
+        for doc_idx, freqs in enumerate(bm25.doc_freqs):
+            for term, tf in freqs.items():
+                col = vocab.get(term)
+                if col is None:
+                    col = vocab[term] = len(vocab)
+                cols.append(col)
+                rows.append(doc_idx)
+                tfs.append(tf)
+
+        col_arr = np.asarray(cols, dtype=np.int64)
+        order = np.argsort(col_arr, kind="stable")
+        post_docs = np.asarray(rows, dtype=np.int32)[order]
+        tf_arr = np.asarray(tfs, dtype=np.float64)[order]
+
+        # Same expression (and operation order) as BM25Okapi.get_scores, so scores match exactly
+        idf = np.array([bm25.idf[term] for term in vocab], dtype=np.float64)
+        doc_len = np.asarray(bm25.doc_len, dtype=np.float64)[post_docs]
+        k1, b = bm25.k1, bm25.b
+        weights = idf[col_arr[order]] * (tf_arr * (k1 + 1) /
+                                         (tf_arr + k1 * (1 - b + b * doc_len / bm25.avgdl)))
+
+        term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(col_arr, minlength=len(vocab)), out=term_ptr[1:])
+
+        return _BM25Index(docs, vocab, term_ptr, post_docs, weights)
+
+    @staticmethod
+    def _bm25_scores(index: _BM25Index, tokens: Tuple[str, ...]) -> np.ndarray:
+        """BM25 score of every indexed document for the query tokens"""
+        n_docs = len(index.docs)
+        spans = []
+        for tok in tokens:
+            col = index.vocab.get(tok)
+            # out-of-vocabulary tokens add nothing
+            if col is not None:
+                spans.append(slice(index.term_ptr[col], index.term_ptr[col + 1]))
+        if not spans:
+            return np.zeros(n_docs, dtype=np.float64)
+
+        # One bincount reduction over all query-term postings; per-doc sums are
+        # accumulated in query-token order, same as adding term by term
+        docs = np.concatenate([index.post_docs[sp] for sp in spans])
+        weights = np.concatenate([index.post_weights[sp] for sp in spans])
+        return np.bincount(docs, weights=weights, minlength=n_docs)
+
     def bm25_search(self, query: str, k: int = 5) -> List[Document]:
         """Return top-k Document objects from BM25 ranking"""
-        if BM25Okapi is None or self._bm25 is None:
+        index = self._bm25
+        if BM25Okapi is None or index is None:
             return []
-        tokens = query.lower().split()
-        scores = self._bm25.get_scores(tokens)
-        top_n = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:k]
-        return [self._bm25_docs[i] for i in top_n]
+        scores = self._bm25_scores(index, _tokenize_query(query))
+        return [index.docs[i] for i in _top_k_indices(scores, k)]
 
     # -------------------------
     # Embedding model helper (used for rebuild)
@@ -115,43 +375,69 @@ _retriever_manager = RetrieverManager()
 # ---------------------------
 # Metadata normalization (unchanged, but kept here)
 # ---------------------------
+# Filter keys passed through when truthy / when not None
+_FILTER_TRUTHY_KEYS = ("source", "disease", "condition_tags", "age_relevance", "therapy_area", "doc_type")
+_FILTER_NOT_NONE_KEYS = ("category", "table_country", "food", "chapter_number", "chapter_title")
+
 def _normalize_metadata_filter(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalize a caller filter dict into the FAISS metadata filter.
+    Hashable filters (the common case - the same few dicts recur per session)
+    are memoized; the returned dict is shared, so treat it as read-only.
+    """
     if not isinstance(filters, dict):
         return {}
-
+    # List values (condition_tags, exclude_allergens) are keyed as tuples and
+    # restored to lists in the cached result, so they hit the cache too
+    list_keys = tuple(sorted(key for key, value in filters.items() if isinstance(value, list)))
+    try:
+        items = tuple(sorted(
+            (key, tuple(value) if isinstance(value, list) else value) for key, value in filters.items()
+        ))
+        return _normalize_metadata_filter_cached(items, list_keys)
+    except TypeError:
+        # unhashable values (e.g. nested dicts) or unorderable keys
+        return _build_metadata_filter(filters)
+
+@lru_cache(maxsize=512)
+def _normalize_metadata_filter_cached(items: Tuple[Tuple[str, Any], ...],
+                                      list_keys: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    filters = dict(items)
+    for key in list_keys:
+        filters[key] = list(filters[key])
+    return _build_metadata_filter(filters)
+
+def _build_metadata_filter(filters: Dict[str, Any]) -> Dict[str, Any]:
     meta: Dict[str, Any] = {}
 
-    if filters.get("country"):
-        country = filters["country"].lower().strip()
-        meta["country"] = country
-
-    if filters.get("source"):
-        meta["source"] = filters["source"]
-
-    if filters.get("disease"):
-        meta["disease"] = filters["disease"]
-
-    if filters.get("condition_tags"):
-        meta["condition_tags"] = filters["condition_tags"]
-
-    if filters.get("age_relevance"):
-        meta["age_relevance"] = filters["age_relevance"]
+    # Each key is read once; output key order matches the filter schema order
+    country = filters.get("country")
+    if country:
+        meta["country"] = country.lower().strip()
 
-    if filters.get("therapy_area"):
-        meta["therapy_area"] = filters["therapy_area"]
+    for key in _FILTER_TRUTHY_KEYS:
+        value = filters.get(key)
+        if value:
+            meta[key] = value
 
-    if filters.get("doc_type"):
-        meta["doc_type"] = filters["doc_type"]
-
-    for key in ("category", "table_country", "food", "chapter_number", "chapter_title"):
-        if filters.get(key) is not None:
-            meta[key] = filters[key]
-
-    if filters.get("exclude_allergens"):
-        meta["exclude_allergens"] = filters["exclude_allergens"]
+    for key in _FILTER_NOT_NONE_KEYS:
+        value = filters.get(key)
+        if value is not None:
+            meta[key] = value
 
+    # exclude_allergens is not a metadata field (as a FAISS filter it matched
+    # nothing); it is applied to the results by _search_excluding_allergens
     return meta
 
+def _allergen_exclusions(filters: Any) -> FrozenSet[str]:
+    """Lowercased allergens a caller filter asks to exclude"""
+    excluded = filters.get("exclude_allergens") if isinstance(filters, dict) else None
+    if not excluded:
+        return frozenset()
+    if isinstance(excluded, str):
+        excluded = (excluded,)
+    return frozenset(str(a).lower() for a in excluded)
+
 # ---------------------------
 # FAISS load with self-healing rebuild
 # ---------------------------
@@ -164,26 +450,16 @@ def load_faiss_index(index_dir: Union[str, Path], cache_dir: Union[str, Path] =
     index_dir = Path(index_dir)
     cache_dir = Path(cache_dir)
 
-    # Common LangChain FAISS pattern: the vector store object is stored via FAISS.load_local(...)
+    # Common LangChain FAISS pattern: save_local(...) writes index.faiss + index.pkl
     try:
-        # Attempt flexible loading: user may store index as files in index_dir
         if index_dir.exists():
-            # try to load via classmethod if available
             try:
-                vs = FAISS.load_local(str(index_dir))
+                vs = _load_faiss_native(index_dir)
                 logger.info("FAISS index loaded successfully from %s", index_dir)
+                init_retriever(vs)
                 return vs
-            except Exception:
-                # try older pattern: pickle
-                try:
-                    pkl_path = index_dir / "index.pkl"
-                    if pkl_path.exists():
-                        with open(pkl_path, "rb") as fh:
-                            vs = pickle.load(fh)
-                            logger.info("FAISS vector store loaded from pickle: %s", pkl_path)
-                            return vs
-                except Exception as e2:
-                    logger.warning("Failed to load FAISS via pickle: %s", e2)
+            except Exception as e_native:
+                logger.warning("Failed to load FAISS index files: %s", e_native)
 
         raise FileNotFoundError("FAISS index not found or failed to load.")
 
@@ -194,11 +470,118 @@ def load_faiss_index(index_dir: Union[str, Path], cache_dir: Union[str, Path] =
         try:
             vs = _rebuild_faiss_from_cache(cache_dir, index_dir)
             logger.info("FAISS rebuilt successfully from cache.")
+            init_retriever(vs)
             return vs
         except Exception as rebuild_err:
             logger.error("Rebuild from cache failed: %s", rebuild_err)
             raise CustomException("Failed to load or rebuild FAISS index", rebuild_err)
 
+# ---------------------------
+# Cache chunk loaders (dispatched by file suffix)
+# ---------------------------
+def _load_pickle_chunk(path: Path) -> Any:
+    with open(path, "rb") as fh:
+        return pickle.load(fh)
+
+def _load_npz_chunk(path: Path) -> Any:
+    # Columnar archives (texts / metadatas / embeddings) keep the embedding
+    # matrix as a float32 array instead of exploding it into Python floats
+    with np.load(str(path), allow_pickle=True) as npz:
+        if "texts" in npz.files:
+            return {
+                "texts": npz["texts"].tolist(),
+                "metadatas": npz["metadatas"].tolist() if "metadatas" in npz.files else None,
+                "embeddings": npz["embeddings"].astype(np.float32, copy=False) if "embeddings" in npz.files else None,
+            }
+        return npz[npz.files[0]].tolist() if npz.files else []
+
+def _load_json_chunk(path: Path) -> Any:
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+_CHUNK_LOADERS = {
+    ".pkl": _load_pickle_chunk,
+    ".pickle": _load_pickle_chunk,
+    ".npz": _load_npz_chunk,
+    ".json": _load_json_chunk,
+}
+
+def _chunk_columns(data: Any, source: Path) -> Tuple[List[str], List[Dict[str, Any]], Any]:
+    """
+    Split a loaded cache chunk into (texts, metadatas, embeddings).
+    embeddings is a float32 matrix for columnar chunks, a list of vectors for
+    record chunks (possibly shorter than texts), or None.
+    """
+    default_meta = {"source_file": str(source)}
+
+    # Columnar shape: {"texts": [...], "metadatas": [...], "embeddings": (N, D)}
+    if isinstance(data, dict) and "texts" in data:
+        raw_texts = data["texts"]
+        raw_metas = data.get("metadatas") or [None] * len(raw_texts)
+        embeddings = data.get("embeddings")
+        keep = [i for i, t in enumerate(raw_texts) if t]
+        texts = [str(raw_texts[i]) for i in keep]
+        metadatas = [raw_metas[i] or default_meta for i in keep]
+        if embeddings is not None and len(keep) != len(raw_texts):
+            embeddings = embeddings[keep]
+        return texts, metadatas, embeddings
+
+    # Accept multiple shapes
+    if isinstance(data, dict) and data.get("items"):
+        data = data["items"]
+
+    texts = []
+    metadatas = []
+    embeddings = []
+    for rec in data:
+        # rec may be a dict-like row
+        text = rec.get("text") or rec.get("page_content") or rec.get("content") or rec.get("title") or ""
+        meta = rec.get("metadata") or rec.get("meta") or default_meta
+        emb = rec.get("embedding")
+        if text:
+            texts.append(text)
+            metadatas.append(meta)
+            if emb is not None and len(emb):
+                embeddings.append(emb)
+    return texts, metadatas, embeddings
+
+# What a missing, truncated or corrupt chunk file raises (JSONDecodeError and
+# UnicodeDecodeError are ValueErrors; stale pickles raise Attribute/ImportError)
+_CHUNK_READ_ERRORS = (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError, ImportError)
+
+def _embed_texts(embedder, texts: List[str]) -> np.ndarray:
+    """
+    Embed texts as a float32 matrix. Large inputs are split into shards and
+    embedded on a small thread pool (the model's native code releases the GIL),
+    with results concatenated in input order.
+    """
+    if len(texts) <= _EMBED_SHARD_SIZE:
+        return np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+    shards = [texts[i:i + _EMBED_SHARD_SIZE] for i in range(0, len(texts), _EMBED_SHARD_SIZE)]
+    with ThreadPoolExecutor(max_workers=min(_MAX_EMBED_WORKERS, len(shards))) as executor:
+        parts = list(executor.map(embedder.embed_documents, shards))
+    return np.concatenate([np.asarray(p, dtype=np.float32) for p in parts], axis=0)
+
+def _load_faiss_native(index_dir: Path) -> FAISS:
+    """
+    Load a LangChain save_local() directory without FAISS.load_local:
+    index.faiss is read with faiss.read_index and index.pkl holds the docstore.
+    """
+    import faiss
+
+    index = faiss.read_index(str(index_dir / "index.faiss"))
+
+    # Trusted local file written by our own save_local
+    with open(index_dir / "index.pkl", "rb") as fh:
+        docstore, index_to_docstore_id = pickle.load(fh)
+
+    return FAISS(
+        embedding_function=_retriever_manager.get_embedding_model(),
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
 def _rebuild_faiss_from_cache(cache_dir: Union[str, Path], persist_dir: Union[str, Path]) -> FAISS:
     """
     Rebuild FAISS vector store from cached embedding chunks.
@@ -213,105 +596,408 @@ def _rebuild_faiss_from_cache(cache_dir: Union[str, Path], persist_dir: Union[st
         raise FileNotFoundError(f"Cache directory does not exist: {cache_dir}")
 
     # Collect all chunk files
-    chunk_files = sorted([p for p in cache_dir.iterdir() if p.suffix in (".pkl", ".pickle", ".npz", ".json")])
+    chunk_files = sorted([p for p in cache_dir.iterdir() if p.suffix in _CHUNK_LOADERS])
     if not chunk_files:
         raise FileNotFoundError(f"No embedding chunk files found in {cache_dir}")
 
-    all_texts = []
-    all_metadatas = []
-    all_embeddings = []
-    have_embeddings = False
-
-    for f in chunk_files:
-        try:
-            if f.suffix in (".pkl", ".pickle"):
-                with open(f, "rb") as fh:
-                    data = pickle.load(fh)
-            elif f.suffix == ".npz":
-                import numpy as np
-                arr = np.load(str(f), allow_pickle=True)
-                data = arr.tolist()
-            else:
-                # try json
-                import json
-                with open(f, "r", encoding="utf-8") as fh:
-                    data = json.load(fh)
-        except Exception as e:
-            logger.warning("Failed to read cache chunk %s: %s", f, e)
-            continue
-
-        # Accept multiple shapes
-        if isinstance(data, dict) and data.get("items"):
-            data = data["items"]
-
-        for rec in data:
-            # rec may be a dict-like row
-            text = rec.get("text") or rec.get("page_content") or rec.get("content") or rec.get("title") or ""
-            meta = rec.get("metadata") or rec.get("meta") or {"source_file": str(f)}
-            emb = rec.get("embedding") or None
-            if text:
-                all_texts.append(text)
-                all_metadatas.append(meta)
-                if emb is not None:
-                    have_embeddings = True
-                    all_embeddings.append(emb)
-
-    if not all_texts:
-        raise ValueError("No textual records discovered in cache chunks.")
-
-    # If embeddings present in cache, use them, otherwise compute embeddings from texts
     embedding_model = _retriever_manager.get_embedding_model()
+    embedder = embedding_model if embedding_model is not None else get_embedding_model()
+
+    # Stream chunk by chunk: each file's records are embedded (unless cached
+    # embeddings are present) and added to the index, then released, so peak
+    # memory is one chunk rather than the whole corpus
+    vs: Optional[FAISS] = None
+    total = 0
     try:
-        if have_embeddings and len(all_embeddings) == len(all_texts):
-            # Build FAISS using from_embeddings if available
+        for f in chunk_files:
             try:
-                vs = FAISS.from_embeddings(embeddings=all_embeddings, metadatas=all_metadatas)
-                # attempt to persist
-                persist_dir.mkdir(parents=True, exist_ok=True)
-                vs.save_local(str(persist_dir))
-                _retriever_manager.set_retriever(vs)
-                return vs
-            except Exception:
-                # fallback: compute embeddings instead
-                logger.warning("FAISS.from_embeddings not supported or failed; will compute embeddings anew.")
-        # Compute embeddings using embedding model
-        logger.info("Computing embeddings for %d cached documents (this may take some time)...", len(all_texts))
-        embedder = embedding_model if embedding_model is not None else get_embedding_model()
-        # Some embedding wrappers expect a list of texts and return list of vectors
-        embeddings_vectors = embedder.embed_documents(all_texts)
-        # Build FAISS from texts+embeddings
-        vs = FAISS.from_texts(all_texts, embedder, metadatas=all_metadatas)
-        persist_dir.mkdir(parents=True, exist_ok=True)
-        try:
-            vs.save_local(str(persist_dir))
-        except Exception as e_save:
-            logger.warning("Failed to save rebuilt FAISS locally: %s", e_save)
+                data = _CHUNK_LOADERS[f.suffix](f)
+            except _CHUNK_READ_ERRORS as e:
+                logger.warning("Failed to read cache chunk %s: %s", f, e)
+                continue
+
+            texts, metadatas, embeddings = _chunk_columns(data, f)
+            del data
+            if not texts:
+                continue
+
+            if isinstance(embeddings, np.ndarray) and embeddings.ndim == 2 and len(embeddings) == len(texts):
+                # Columnar .npz chunk: already a float32 (N, D) matrix
+                vectors = embeddings
+            elif embeddings is not None and len(embeddings) == len(texts):
+                # Cached embeddings: one contiguous float32 block, no re-embedding
+                vectors = np.asarray(embeddings, dtype=np.float32)
+            else:
+                # Compute embeddings using embedding model
+                logger.info("Computing embeddings for %d cached documents from %s...", len(texts), f.name)
+                vectors = _embed_texts(embedder, texts)
 
-        _retriever_manager.set_retriever(vs)
-        return vs
+            text_embeddings = list(zip(texts, vectors))
+            if vs is None:
+                vs = FAISS.from_embeddings(text_embeddings, embedder, metadatas=metadatas)
+            else:
+                vs.add_embeddings(text_embeddings, metadatas=metadatas)
+            total += len(texts)
+            del texts, metadatas, embeddings, vectors, text_embeddings
     except Exception as e:
         logger.exception("Rebuild failed: %s", e)
         raise
 
+    if vs is None:
+        raise ValueError("No textual records discovered in cache chunks.")
+    logger.info("FAISS rebuilt from %d cached documents", total)
+
+    persist_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        vs.save_local(str(persist_dir))
+    except Exception as e_save:
+        logger.warning("Failed to save rebuilt FAISS locally: %s", e_save)
+
+    return vs
+
 # ---------------------------
 # Internal helper to run FAISS similarity search with metadata
 # ---------------------------
-def _apply_filter_search_faiss(query: str, filters: Dict[str, Any], k: int = 5) -> List[Document]:
-    current_retriever = _retriever_manager.get_retriever()
+def _apply_filter_search_faiss(query: str, filters: Dict[str, Any], k: int = 5) -> List[Tuple[Document, float]]:
+    """FAISS search returning (Document, similarity) pairs, similarity in (0, 1]"""
+    return _search_excluding_allergens(query, _normalize_metadata_filter(filters), _allergen_exclusions(filters), k=k)
+
+def _search_excluding_allergens(query: str, meta_filter: Dict[str, Any], exclusions: FrozenSet[str], k: int = 5,
+                                current_retriever: Optional[FAISS] = None,
+                                embedding: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+    """
+    _search_faiss_normalized, then drop documents that mention an excluded
+    allergen. Over-fetches 2k so the post-filter still fills k.
+    """
+    if not exclusions:
+        return _search_faiss_normalized(query, meta_filter, k=k, current_retriever=current_retriever,
+                                        embedding=embedding)
+    scored = _search_faiss_normalized(query, meta_filter, k=k * 2, current_retriever=current_retriever,
+                                      embedding=embedding)
+    return _drop_excluded_allergens(scored, exclusions, k)
+
+def _drop_excluded_allergens(scored: List[Tuple[Document, float]], exclusions: FrozenSet[str],
+                             k: int) -> List[Tuple[Document, float]]:
+    """
+    Drop documents whose food name, title or text mentions an excluded allergen
+    (substring match, like FCTManager._apply_food_restrictions): documents carry no
+    allergen metadata, so the text is the only evidence. Errs on the side of
+    excluding.
+    """
+    kept = []
+    for doc, sim in scored:
+        meta = doc.metadata
+        text = " ".join((str(meta.get("food") or ""), str(meta.get("title") or ""), doc.page_content or "")).lower()
+        if any(allergen in text for allergen in exclusions):
+            continue
+        kept.append((doc, sim))
+        if len(kept) == k:
+            break
+    return kept
+
+def _search_faiss_cascade(query: str, filter_candidates: List[Dict[str, Any]], k: int,
+                          current_retriever: FAISS,
+                          embedding: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+    """
+    Progressive (strict -> relaxed) filtered search: results of the first
+    candidate that matches anything.
+    Filters answerable from the metadata postings run inside FAISS (exact top-k
+    over the whole corpus). Others follow LangChain's semantics - scan the
+    fetch_k nearest vectors and filter them - so one unfiltered fetch_k search
+    serves all of them: each filter is applied to that shared pool in Python.
+    The query is embedded at most once (never, given a precomputed embedding).
+    """
+    pool: Optional[List[Tuple[Document, float]]] = None
+    # Candidates that differ only in keys the filter schema drops
+    # (e.g. document_type) normalize to the same filter; evaluate each once
+    tried: List[Tuple[Dict[str, Any], FrozenSet[str]]] = []
+    for f in filter_candidates:
+        meta_filter = _normalize_metadata_filter(f)
+        exclusions = _allergen_exclusions(f)
+        if (meta_filter, exclusions) in tried:
+            continue
+        tried.append((meta_filter, exclusions))
+        if embedding is None:
+            embedding = current_retriever._embed_query(query)
+        if _selector_positions(current_retriever, meta_filter) is not None:
+            try:
+                scored = _search_excluding_allergens(query, meta_filter, exclusions, k=k,
+                                                     current_retriever=current_retriever, embedding=embedding)
+            except Exception:
+                continue
+            if scored:
+                return scored
+            continue
+        if pool is None:
+            pool = _search_faiss_normalized(query, None, k=_FAISS_FETCH_K, current_retriever=current_retriever,
+                                            embedding=embedding)
+        try:
+            matches = current_retriever._create_filter_func(meta_filter)
+            scored = [(doc, sim) for doc, sim in pool if matches(doc.metadata)]
+        except Exception:
+            continue
+        if exclusions:
+            scored = _drop_excluded_allergens(scored[:k * 2], exclusions, k)
+        else:
+            scored = scored[:k]
+        if scored:
+            return scored
+    return []
+
+def _search_faiss_normalized(query: str, meta_filter: Optional[Dict[str, Any]], k: int = 5,
+                             current_retriever: Optional[FAISS] = None,
+                             embedding: Optional[List[float]] = None) -> List[Tuple[Document, float]]:
+    """
+    _apply_filter_search_faiss for a filter already passed through _normalize_metadata_filter
+    (None searches unfiltered). Pass a precomputed query embedding to skip re-embedding the query.
+    """
+    if current_retriever is None:
+        current_retriever = _retriever_manager.get_retriever()
     if not current_retriever:
         logger.error("Retriever not initialized")
         raise CustomException("Retriever not initialized", None)
 
     try:
-        meta_filter = _normalize_metadata_filter(filters)
-        results = current_retriever.similarity_search(query, k=k, filter=meta_filter)
-        logger.debug(f"FAISS Filter {filters} -> {len(results)} results")
-        return results
+        filter_key = None if meta_filter is None else tuple(sorted(
+            (key, tuple(value) if isinstance(value, list) else value) for key, value in meta_filter.items()
+        ))
+        cache_key = (query, filter_key, k, _retriever_manager._index_version)
+        hash(cache_key)
+    except TypeError:
+        # unhashable filter values: search uncached
+        return _run_faiss_search(current_retriever, query, meta_filter, k, embedding)
+
+    now = time.monotonic()
+    with _search_cache_lock:
+        cached = _search_cache.get(cache_key)
+        if cached is not None and cached[0] > now:
+            _search_cache.move_to_end(cache_key)
+            return list(cached[1])
+        future = _search_inflight.get(cache_key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _search_inflight[cache_key] = future
+
+    if not owner:
+        # an identical search is already running: wait for its result (or error)
+        return list(future.result())
+
+    try:
+        result = tuple(_run_faiss_search(current_retriever, query, meta_filter, k, embedding))
+    except BaseException as e:
+        with _search_cache_lock:
+            _search_inflight.pop(cache_key, None)
+        future.set_exception(e)
+        raise
+
+    with _search_cache_lock:
+        _search_inflight.pop(cache_key, None)
+        _search_cache[cache_key] = (time.monotonic() + _SEARCH_CACHE_TTL, result)
+        _search_cache.move_to_end(cache_key)
+        if len(_search_cache) > _SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    future.set_result(result)
+    return list(result)
+
+# Shared by all request threads; every access holds _search_cache_lock
+_search_cache: "OrderedDict[tuple, Tuple[float, Tuple[Tuple[Document, float], ...]]]" = OrderedDict()
+_search_inflight: Dict[tuple, Future] = {}
+_search_cache_lock = threading.Lock()
+
+def _build_filter_postings(vs: FAISS) -> Optional[Dict[str, Dict[Any, np.ndarray]]]:
+    """Metadata postings over FAISS positions for every filter schema key, or None"""
+    id_map = getattr(vs, "index_to_docstore_id", None)
+    stored = getattr(getattr(vs, "docstore", None), "_dict", None)
+    ntotal = vs.index.ntotal
+    # positions double as FAISS ids only for plain (non-IDMap) indexes
+    if not isinstance(id_map, dict) or not isinstance(stored, dict) or len(id_map) != ntotal \
+            or (ntotal and max(id_map) != ntotal - 1):
+        return None
+    keys = ("country",) + _FILTER_TRUTHY_KEYS + _FILTER_NOT_NONE_KEYS
+    lists: Dict[str, Dict[Any, List[int]]] = {key: {} for key in keys}
+    for position, doc_id in id_map.items():
+        doc = stored.get(doc_id)
+        metadata = getattr(doc, "metadata", None) or {}
+        for key in keys:
+            if key not in metadata:
+                continue
+            try:
+                lists[key].setdefault(metadata[key], []).append(position)
+            except TypeError:
+                # unhashable metadata (e.g. a list) never equals a hashable filter value
+                continue
+    logger.debug("Built metadata filter postings over %d FAISS vectors", ntotal)
+    return {
+        key: {value: np.array(sorted(positions), dtype=np.int64) for value, positions in by_value.items()}
+        for key, by_value in lists.items()
+    }
+
+def _selector_positions(current_retriever: FAISS, meta_filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """Positions for an in-FAISS filtered search, or None to use LangChain's fetch-and-filter path"""
+    if not meta_filter or current_retriever is not _retriever_manager.get_retriever():
+        return None
+    return _retriever_manager.filter_positions(meta_filter)
+
+def _selector_search_params(faiss: Any, index: Any, selector: Any, keepalive: List[Any]) -> Any:
+    """SearchParameters carrying the selector, typed for the index (nested for pre-transforms)"""
+    if isinstance(index, faiss.IndexPreTransform):
+        # OPQ etc.: the selector goes to the wrapped index; keep the inner params alive
+        inner = _selector_search_params(faiss, faiss.downcast_index(index.index), selector, keepalive)
+        keepalive.append(inner)
+        params = faiss.SearchParametersPreTransform()
+        params.index_params = inner
+        return params
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def _search_with_selector(current_retriever: FAISS, query: str, positions: np.ndarray, k: int,
+                          embedding: Optional[List[float]]) -> List[Tuple[Document, float]]:
+    """Exact top-k among the given FAISS positions; the filter runs inside FAISS via an IDSelectorBitmap"""
+    import faiss
+
+    if not len(positions):
+        return []
+    index = current_retriever.index
+    vector = np.array([embedding if embedding is not None else current_retriever._embed_query(query)],
+                      dtype=np.float32)
+    if current_retriever._normalize_L2:
+        faiss.normalize_L2(vector)
+
+    mask = np.zeros(index.ntotal, dtype=bool)
+    mask[positions] = True
+    bitmap = np.packbits(mask, bitorder="little")  # must outlive the search
+    selector = faiss.IDSelectorBitmap(index.ntotal, faiss.swig_ptr(bitmap))
+    keepalive: List[Any] = []
+    params = _selector_search_params(faiss, index, selector, keepalive)
+    distances, labels = index.search(vector, min(k, len(positions)), params=params)
+
+    docstore = current_retriever.docstore
+    id_map = current_retriever.index_to_docstore_id
+    return [
+        (docstore.search(id_map[label]), float(dist))
+        for dist, label in zip(distances[0], labels[0])
+        if label != -1
+    ]
+
+def _run_faiss_search(current_retriever: FAISS, query: str, meta_filter: Optional[Dict[str, Any]], k: int,
+                      embedding: Optional[List[float]]) -> List[Tuple[Document, float]]:
+    try:
+        positions = _selector_positions(current_retriever, meta_filter)
+        if positions is not None:
+            scored = _search_with_selector(current_retriever, query, positions, k, embedding)
+        elif embedding is None:
+            scored = current_retriever.similarity_search_with_score(query, k=k, filter=meta_filter)
+        else:
+            scored = current_retriever.similarity_search_with_score_by_vector(embedding, k, filter=meta_filter)
+        logger.debug("FAISS Filter %s -> %d results", meta_filter, len(scored))
+        # L2 distance -> similarity: 1.0 for an exact match, decaying toward 0
+        if current_retriever.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+            # unit vectors: squared L2 distance = 2 - 2 * inner product, same scale as the L2 index
+            return [(doc, 1.0 / (3.0 - 2.0 * float(ip))) for doc, ip in scored]
+        return [(doc, 1.0 / (1.0 + float(dist))) for doc, dist in scored]
     except Exception as e:
         logger.error("FAISS similarity search failed: %s", e)
         # Signal caller to allow BM25 fallback
         raise
 
+# ---------------------------
+# BM25 seeding
+# ---------------------------
+def _iter_cache_docs(cache_dir: Union[str, Path], max_files: int = 10, per_file: int = 20) -> Iterator[Document]:
+    """Yield Documents from the first few cached embedding chunks (text + metadata only)"""
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return
+    for f in sorted(cache_dir.iterdir())[:max_files]:
+        loader = _CHUNK_LOADERS.get(f.suffix)
+        if loader is None:
+            continue
+        try:
+            recs = loader(f)
+        except _CHUNK_READ_ERRORS:
+            continue
+        texts, metadatas, _ = _chunk_columns(recs or [], f)
+        for text, meta in zip(texts[:per_file], metadatas[:per_file]):
+            yield Document(page_content=text, metadata=meta)
+
+def _collect_bm25_seed_docs(seed_query: str, sample_k: int) -> List[Document]:
+    """Sample documents to index for BM25: the FAISS docstore, else cached embedding chunks"""
+    vs = _retriever_manager.get_retriever()
+    if vs is not None:
+        # LangChain's InMemoryDocstore keeps every Document in a dict; reading it
+        # directly avoids embedding the seed query and a k-NN search
+        stored = getattr(getattr(vs, "docstore", None), "_dict", None)
+        if isinstance(stored, dict) and stored:
+            return list(islice(stored.values(), sample_k))
+        try:
+            sample_docs = vs.similarity_search(seed_query, k=sample_k)
+        except Exception:
+            sample_docs = vs.similarity_search(" ", k=sample_k)
+        if sample_docs:
+            return sample_docs
+    # if still empty, try a small number of cached docs from Cache/embedding_chunks/
+    return list(islice(_iter_cache_docs(Path("Cache/embedding_chunks")), sample_k))
+
+def _ensure_bm25_index(seed_query: str = " ", sample_k: int = 200) -> None:
+    """
+    Make sure a BM25 index exists, seeding it from a document sample (the FAISS
+    docstore when loaded). Concurrent callers wait for an in-flight build
+    instead of repeating it.
+    """
+    if BM25Okapi is None or _retriever_manager._bm25 is not None:
+        return
+    with _retriever_manager._bm25_build_lock:
+        if _retriever_manager._bm25 is not None:
+            return
+        try:
+            sample_docs = _collect_bm25_seed_docs(seed_query, sample_k)
+            if sample_docs:
+                _retriever_manager.build_bm25_from_docs(sample_docs)
+        except Exception as e_build:
+            logger.debug("BM25 seeding failed: %s", e_build)
+
+def _seed_bm25_background() -> None:
+    """Build the BM25 index off the request path, right after the retriever is set"""
+    _ensure_bm25_index(seed_query=" ", sample_k=2000)
+
+def _doc_id_key(d: Document) -> str:
+    """Dedupe key from id-like metadata or a content snippet"""
+    # LangChain Documents always carry a metadata dict; fetch it once
+    meta = d.metadata
+    # id-like metadata first, then a content snippet (str() is a no-op for the snippet)
+    return str(meta.get("id") or meta.get("food") or meta.get("title") or
+               (d.page_content or meta.get("text", ""))[:200])
+
+def _fuse_rankings(faiss_results: List[Document], bm25_results: List[Document], k: int) -> List[Document]:
+    """
+    Reciprocal-rank fusion: each document scores sum(1 / (_RRF_K + rank)) over
+    the rankings it appears in, so documents both retrievers agree on rise to
+    the top. Ties keep first-seen order (FAISS before BM25); with BM25 empty
+    this is simply the deduplicated FAISS order.
+    """
+    fused: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in (faiss_results, bm25_results):
+        ranked_keys = set()
+        for rank, d in enumerate(ranking or [], 1):
+            kkey = _doc_id_key(d)
+            # a duplicate within one ranking only counts at its best rank
+            if kkey in ranked_keys:
+                continue
+            ranked_keys.add(kkey)
+            if kkey not in docs:
+                docs[kkey] = d
+                fused[kkey] = 0.0
+            fused[kkey] += 1.0 / (_RRF_K + rank)
+
+    # stable sort keeps first-seen order among equal fused scores
+    top = sorted(fused, key=fused.__getitem__, reverse=True)[:max(k, 1)]
+    return [docs[kkey] for kkey in top]
+
 # ---------------------------
 # Public hybrid filtered_retrieval (tiered hybrid)
 # ---------------------------
@@ -334,134 +1020,133 @@ def filtered_retrieval(query: str,
         faiss_score_threshold: heuristic threshold (0-1). If mean top score < threshold, consider FAISS weak.
     """
     # First attempt FAISS if available
-    faiss_results: List[Document] = []
-    bm25_results: List[Document] = []
+    faiss_scored: List[Tuple[Document, float]] = []
+
+    vs = _retriever_or_autoload()
+    # Run FAISS progressive filters (a single dict is a one-candidate cascade)
+    if vs is not None:
+        try:
+            faiss_scored = _search_faiss_cascade(query, _filter_cascade(filter_candidates), k, vs)
+        except Exception as e:
+            logger.debug("FAISS search error (will consider BM25): %s", e)
+            faiss_scored = []
+    return _merge_with_bm25(query, faiss_scored, k, use_bm25_fallback, faiss_score_threshold)
+
+def filtered_retrieval_batch(queries: List[str],
+                             filter_candidates: Union[Dict[str, Any], List[Dict[str, Any]]],
+                             k: int = 5,
+                             use_bm25_fallback: bool = True,
+                             faiss_score_threshold: float = 0.55) -> List[List[Document]]:
+    """
+    filtered_retrieval for several queries sharing the same filters, e.g. probing
+    candidate words against the FCT. All queries are embedded in one batched
+    model call; results are returned in query order.
+    """
+    if not queries:
+        return []
+    vs = _retriever_or_autoload()
+    embeddings: List[Optional[List[float]]] = [None] * len(queries)
+    if vs is not None:
+        try:
+            embeddings = _embed_queries(vs, queries)
+        except Exception as e:
+            logger.debug("Batched query embedding failed (embedding per query): %s", e)
+
+    candidates = _filter_cascade(filter_candidates)
+    results = []
+    for query, embedding in zip(queries, embeddings):
+        faiss_scored: List[Tuple[Document, float]] = []
+        if vs is not None:
+            try:
+                faiss_scored = _search_faiss_cascade(query, candidates, k, vs, embedding=embedding)
+            except Exception as e:
+                logger.debug("FAISS search error (will consider BM25): %s", e)
+        results.append(_merge_with_bm25(query, faiss_scored, k, use_bm25_fallback, faiss_score_threshold))
+    return results
 
-    # Ensure retriever available - attempt to auto-load from expected path if currently missing
-    if not _retriever_manager.is_available():
+def _retriever_or_autoload() -> Optional[FAISS]:
+    """
+    The current retriever. If none is set, attempt to auto-load it from the expected
+    path (only once per process; later calls skip the path checks and rebuild attempts).
+    """
+    vs = _retriever_manager.get_retriever()
+    if vs is None and _retriever_manager.claim_autoload():
         # try common locations (Vector_store/db_faiss/)
         try:
             logger.info("Retriever unavailable — attempting to load default FAISS index from Vector_store/db_faiss/")
             _ = load_faiss_index(Path("Vector_store/db_faiss/"))
         except Exception as e:
             logger.warning("Auto-load FAISS failed: %s", e)
+        vs = _retriever_manager.get_retriever()
+    return vs
+
+def _filter_cascade(filter_candidates: Union[Dict[str, Any], List[Dict[str, Any]], None]) -> List[Dict[str, Any]]:
+    return [filter_candidates] if isinstance(filter_candidates, dict) else list(filter_candidates or [{}])
+
+def _embed_queries(vs: FAISS, queries: List[str]) -> List[List[float]]:
+    """Query embeddings as FAISS._embed_query would compute them, in one model call where possible"""
+    embedder = vs.embedding_function
+    # HuggingFaceEmbeddings embeds queries as documents unless given query-specific encode kwargs
+    if isinstance(embedder, Embeddings) and not getattr(embedder, "query_encode_kwargs", None):
+        return embedder.embed_documents(queries)
+    return [vs._embed_query(q) for q in queries]
+
+def _merge_with_bm25(query: str, faiss_scored: List[Tuple[Document, float]], k: int,
+                     use_bm25_fallback: bool, faiss_score_threshold: float) -> List[Document]:
+    """Steps 2-3 of filtered_retrieval: BM25 fallback when FAISS is weak or short, then fusion"""
+    bm25_results: List[Document] = []
+    faiss_results = [d for d, _ in faiss_scored]
 
-    # Run FAISS progressive filters
-    if _retriever_manager.is_available():
-        try:
-            if isinstance(filter_candidates, dict):
-                faiss_results = _apply_filter_search_faiss(query, filter_candidates, k=k)
-            elif isinstance(filter_candidates, list):
-                for f in filter_candidates:
-                    try:
-                        faiss_results = _apply_filter_search_faiss(query, f, k=k)
-                        if faiss_results:
-                            break
-                    except Exception:
-                        continue
-            else:
-                faiss_results = _apply_filter_search_faiss(query, {}, k=k)
-        except Exception as e:
-            logger.debug("FAISS search error (will consider BM25): %s", e)
-            faiss_results = []
-
-    # Heuristic: consider FAISS weak if empty or low mean similarity if available metadata provides score.
-    faiss_is_weak = False
-    if not faiss_results:
-        faiss_is_weak = True
-    else:
-        # Try to estimate confidence: for LangChain FAISS documents there may not be direct similarity scores.
-        # We'll use a basic heuristic: if results returned but appear non-specific, still allow BM25 to run when asked.
-        # (You can later add cross-encoder rerank or expose scores from FAISS retrieval code.)
-        pass
+    # Consider FAISS weak if empty or its mean similarity is below the threshold
+    faiss_is_weak = (
+        not faiss_scored or
+        sum(sim for _, sim in faiss_scored) / len(faiss_scored) < faiss_score_threshold
+    )
+    # BM25 also tops up when FAISS found fewer than k distinct documents
+    faiss_short = len({_doc_id_key(d) for d in faiss_results}) < k
 
-    # If FAISS weak and BM25 allowed, run BM25 fallback
-    if (faiss_is_weak or use_bm25_fallback) and BM25Okapi is not None:
+    # Run BM25 when FAISS found nothing, or (if allowed) when FAISS is weak or short;
+    # a confident, full FAISS result would never reach the BM25 docs in the merge
+    if (not faiss_results or (use_bm25_fallback and (faiss_is_weak or faiss_short))) and BM25Okapi is not None:
         try:
-            # If BM25 index not built, attempt to build it using a sample from FAISS index (or cached sample)
-            if _retriever_manager._bm25 is None:
-                # Attempt to seed BM25 from FAISS store (top 200 docs)
-                try:
-                    # retrieve unfiltered bulk: few common texts - this relies on vector store supporting .similarity_search with empty filter
-                    sample_docs = []
-                    if _retriever_manager.is_available():
-                        try:
-                            sample_docs = _retriever_manager.get_retriever().similarity_search(query, k=200)
-                        except Exception:
-                            sample_docs = _retriever_manager.get_retriever().similarity_search(" ", k=200)
-                    # if still empty, try to load cached chunks
-                    if not sample_docs:
-                        # try to read a small number of cached docs from Cache/embedding_chunks/
-                        cache_dir = Path("Cache/embedding_chunks")
-                        if cache_dir.exists():
-                            # re-use loader from rebuild to extract textual records
-                            sample_docs = []
-                            for f in sorted(cache_dir.iterdir())[:10]:
-                                try:
-                                    import pickle, json
-                                    if f.suffix in (".pkl", ".pickle"):
-                                        recs = pickle.load(open(f, "rb"))
-                                    elif f.suffix == ".json":
-                                        recs = json.load(open(f, "r", encoding="utf-8"))
-                                    else:
-                                        recs = []
-                                except Exception:
-                                    recs = []
-                                for rec in (recs or [])[:20]:
-                                    text = rec.get("text") or rec.get("page_content") or rec.get("content") or ""
-                                    meta = rec.get("metadata") or {}
-                                    if text:
-                                        # wrap minimal Document-like object
-                                        d = Document(page_content=text, metadata=meta)
-                                        sample_docs.append(d)
-                                if len(sample_docs) >= 200:
-                                    break
-                    if sample_docs:
-                        _retriever_manager.build_bm25_from_docs(sample_docs)
-                except Exception as e_build:
-                    logger.debug("BM25 seeding failed: %s", e_build)
-
+            # If BM25 index not built (and background seeding hasn't finished), build it now
+            _ensure_bm25_index(seed_query=query)
             bm25_results = _retriever_manager.bm25_search(query, k=k)
         except Exception as e:
             logger.warning("BM25 fallback failed: %s", e)
             bm25_results = []
 
-    # Merge results: prefer FAISS order, then BM25, deduplicate by metadata text/title
-    merged: List[Document] = []
-    seen = set()
-
-    def doc_id_key(d: Document) -> str:
-        # build dedupe key from id-like metadata or content snippet
-        mid = getattr(d, "metadata", {}).get("id") or getattr(d, "metadata", {}).get("food") or getattr(d, "metadata", {}).get("title")
-        if mid:
-            return str(mid)
-        # fallback content snippet
-        cont = getattr(d, "page_content", "") or getattr(d, "metadata", {}).get("text", "")
-        return cont[:200]
-
-    for d in (faiss_results or []):
-        kkey = doc_id_key(d)
-        if kkey not in seen:
-            merged.append(d)
-            seen.add(kkey)
-            if len(merged) >= k:
-                return merged
-
-    for d in (bm25_results or []):
-        kkey = doc_id_key(d)
-        if kkey not in seen:
-            merged.append(d)
-            seen.add(kkey)
-            if len(merged) >= k:
-                return merged
-
-    return merged
+    # Merge results: reciprocal-rank fusion of FAISS and BM25, deduplicated by metadata text/title
+    return _fuse_rankings(faiss_results, bm25_results, k)
 
 # ---------------------------
 # Convenience: initialize retriever externally
 # ---------------------------
 def init_retriever(vector_store: FAISS):
     _retriever_manager.set_retriever(vector_store)
+    # Cosine search as a dot product over the normalized embeddings: RETRIEVER_USE_IP=1
+    if os.getenv("RETRIEVER_USE_IP", "0") == "1":
+        try:
+            _retriever_manager.use_inner_product()
+        except Exception as e:
+            logger.warning("Could not switch FAISS index to inner product: %s", e)
+    # Optional approximate / quantized index for large corpora: FAISS_INDEX_KIND=hnsw|ivf|sq8|pq
+    index_kind = os.getenv("FAISS_INDEX_KIND", "").strip()
+    if index_kind:
+        try:
+            _retriever_manager.rebuild_index_as(index_kind)
+        except Exception as e:
+            logger.warning("Could not rebuild FAISS index as %s: %s", index_kind, e)
+    # Requests search concurrently, one query each: per-search OpenMP threads only
+    # oversubscribe the cores, so default FAISS to single-threaded searches
+    try:
+        import faiss
+        faiss.omp_set_num_threads(int(os.getenv("FAISS_OMP_THREADS", "1")))
+    except Exception as e:
+        logger.debug("Could not set FAISS OpenMP threads: %s", e)
+    # Seed BM25 eagerly so the first user query doesn't pay for the build
+    if BM25Okapi is not None and _retriever_manager._bm25 is None:
+        threading.Thread(target=_seed_bm25_background, name="bm25-seed", daemon=True).start()
 
 # ---------------------------
 # Convenience property for direct access
@@ -470,6 +1155,10 @@ def init_retriever(vector_store: FAISS):
 def retriever() -> Optional[FAISS]:
     return _retriever_manager.get_retriever()
 
+def index_version() -> int:
+    """Counter bumped whenever the searchable index changes (set, reloaded or rebuilt)"""
+    return _retriever_manager._index_version
+
 
 # ============================================================================
 # NEW: DOCUMENT PRIORITY ROUTING FOR THERAPY FLOW
@@ -516,7 +1205,7 @@ def filtered_retrieval_by_priority(
     # Get prioritized document types for this step
     priority_doc_types = priority_map.get(step, priority_map.get("primary", []))
 
-    logger.info(f"Retrieval for {intent}/{step}: prioritizing {priority_doc_types}")
+    logger.info("Retrieval for %s/%s: prioritizing %s", intent, step, priority_doc_types)
 
     # Build progressive filters - try each document type in priority order
     filter_candidates = []
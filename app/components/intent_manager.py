@@ -10,6 +10,7 @@ Intent Manager
 
 import logging
 import re
+from types import MappingProxyType
 from typing import Dict, Any, List, Optional
 
 from app.components.query_classifier import NutritionQueryClassifier
@@ -17,8 +18,10 @@ from app.components.query_classifier import NutritionQueryClassifier
 logger = logging.getLogger(__name__)
 
 
-# Short mappings accepted from UI (gradio inputs may be short)
-_SHORT_OPTION_MAP = {
+# Short mappings accepted from UI (gradio inputs may be short). Keys are in the
+# form _normalize_short_option looks up: lowercased, punctuation other than "-"
+# dropped and "_" turned into a space (so "1." or "step_by_step" need no entry)
+_SHORT_OPTION_MAP = MappingProxyType({
     "1": "upload",
     "2": "step_by_step",
     "3": "general_info_first",
@@ -31,19 +34,103 @@ _SHORT_OPTION_MAP = {
     "step by step": "step_by_step",
     "step-by-step": "step_by_step",
     "stepbystep": "step_by_step",
-    "step_by_step": "step_by_step",
-    "stepbystep": "step_by_step",
-    "stepbystep.": "step_by_step",
     "general": "general_info_first",
     "overview": "general_info_first",
     "general info": "general_info_first",
     "general info first": "general_info_first",
-    "general_info_first": "general_info_first",
-    "1.": "upload",
-    "2.": "step_by_step",
-    "3.": "general_info_first",
+})
+
+# Intent an onboarding option reply continues with. The options are only offered
+# after therapy was downgraded, and each one resumes the recommendation flow:
+# it gathers labs or slots (therapy is re-checked once they are present) or
+# answers with general guidelines
+_OPTION_INTENTS = MappingProxyType({
+    "upload": "recommendation",
+    "step_by_step": "recommendation",
+    "general_info_first": "recommendation",
+})
+
+# Cleaned replies that answer a pending onboarding prompt without running the
+# classifier: the option numbers and unambiguous phrases only. Single words
+# ("lab", "general", "step", "upload") also occur in real questions, so they
+# still go through the classifier
+_OPTION_REPLY_SHORTCUTS = frozenset({
+    "1", "2", "3",
+    "upload lab",
+    "step by step", "step-by-step", "stepbystep",
+    "general info", "general info first",
+})
+
+# Punctuation stripped from replies: anything but word characters, whitespace
+# and "-". ASCII replies use the equivalent translate table ("_" -> space).
+_PUNCT_RE = re.compile(r'[^\w\s\-]')
+_ASCII_PUNCT_TABLE = {
+    **{c: None for c in range(128) if _PUNCT_RE.match(chr(c))},
+    ord('_'): ' ',
 }
 
+def _clean_option_reply(text: str) -> str:
+    """Lowercase, strip punctuation (except "-") and turn "_" into a space"""
+    t = text.strip().lower()
+    if t.isascii():
+        # drop punctuation and turn "_" into a space in one pass
+        return t.translate(_ASCII_PUNCT_TABLE)
+    return _PUNCT_RE.sub('', t).replace('_', ' ')
+
+# Keyword fallback for replies not in _SHORT_OPTION_MAP. Each branch is an
+# anchored lookahead over the whole reply, so upload keywords win over "step",
+# which wins over general/overview, wherever they appear in the text
+_OPTION_KEYWORD_RE = re.compile(
+    r"(?=.*?(?P<upload>upload|lab|photo|pdf))"
+    r"|(?=.*?(?P<step_by_step>step))"
+    r"|(?=.*?(?P<general_info_first>overview|general))",
+    re.DOTALL,
+)
+
+# Diagnosis keyword buckets for _diagnosis_key_for_biomarkers, in precedence
+# order (anchored lookaheads: the first bucket with a keyword anywhere wins)
+_DIAGNOSIS_BUCKET_RE = re.compile(
+    r"(?=.*?(?P<kidney>ckd|kidney|renal))"
+    r"|(?=.*?(?P<diabetes>diabetes|t1d|type 1))"
+    r"|(?=.*?(?P<epilepsy>epilepsy))"
+    r"|(?=.*?(?P<cystic_fibrosis>cystic|cf))"
+    r"|(?=.*?(?P<preterm>preterm|neonate))"
+    r"|(?=.*?(?P<metabolic>pku|phenylketonuria|msud|galactose))"
+    r"|(?=.*?(?P<allergy>allergy))"
+    r"|(?=.*?(?P<gastro>ibd|crohn|gastro))",
+    re.DOTALL,
+)
+
+_BIOMARKERS_BY_BUCKET = {
+    "kidney": ("creatinine", "eGFR", "potassium", "phosphorus", "albumin"),
+    "diabetes": ("HbA1c", "fasting glucose", "c-peptide (if available)"),
+    "epilepsy": ("vitamin D", "folate", "vitamin B12", "drug levels (if on AEDs)"),
+    "cystic_fibrosis": ("Vitamins A/D/E/K", "albumin", "prealbumin"),
+    "preterm": ("albumin", "calcium", "phosphate", "ALP", "weight gain"),
+    "metabolic": ("specific amino acids (phenylalanine, leucine)", "amino acid profile"),
+    "allergy": ("IgE (if available)", "eosinophils (if available)"),
+    "gastro": ("albumin", "CRP", "iron indices"),
+}
+
+_DEFAULT_BIOMARKERS = ("creatinine", "eGFR", "HbA1c", "albumin")
+
+# Three-option onboarding (nudge) message shown when therapy is downgraded
+_ONBOARDING_TEMPLATE = (
+    "How would you like to proceed?\n\n"
+    "📋 Option 1: Upload Lab Results (Fastest)\n"
+    "   Upload a PDF or photo of recent lab report. I'll extract biomarker values automatically.\n"
+    "   → Click [Upload Lab Results] button below ↓\n\n"
+    "✍ Option 2: Answer Step-by-Step ({missing_count} questions)    "
+    "I'll ask one question at a time (age, medications, labs, etc.)    Takes a few seconds.    → Type \"step by step\"\n\n"
+    "📚 Option 3: General {diagnosis_title} Information First\n"
+    "   Get general diet guidelines for {diagnosis_name} while you gather clinical data, then come back for personalized therapy.\n"
+    "   → Type \"general info first\"\n\n"
+    "*Examples of biomarkers I typically need:* {biomarker_examples}\n\n"
+    "Which option works best for you?\n\n"
+    "---\n"
+    "⚠ For educational purposes only. Not medical advice. Consult a healthcare provider."
+)
+
 
 class IntentManager:
     """
@@ -59,21 +146,14 @@ class IntentManager:
         """Normalize user replies like 'step', 'general', 'upload' to canonical option keys."""
         if not text:
             return None
-        t = text.strip().lower()
-        t = re.sub(r'[^\w\s\-]', '', t)  # drop punctuation
-        t = t.replace('_', ' ')
+        t = _clean_option_reply(text)
         # try direct map
         mapped = _SHORT_OPTION_MAP.get(t)
         if mapped:
             return mapped
-        # try word-based heuristics
-        if "upload" in t or "lab" in t or "photo" in t or "pdf" in t:
-            return "upload"
-        if "step" in t:
-            return "step_by_step"
-        if "overview" in t or "general" in t:
-            return "general_info_first"
-        return None
+        # try word-based heuristics (single pass; group name is the option key)
+        m = _OPTION_KEYWORD_RE.match(t)
+        return m.lastgroup if m else None
 
     def _diagnosis_key_for_biomarkers(self, diagnosis: Optional[str]) -> List[str]:
         """
@@ -81,29 +161,15 @@ class IntentManager:
         This mirrors / references the chat_orchestrator's _get_diagnosis_specific_biomarkers logic.
         """
         if not diagnosis:
-            return ["creatinine", "eGFR", "HbA1c", "albumin"]
-
-        d = diagnosis.lower()
-        if "ckd" in d or "kidney" in d or "renal" in d:
-            return ["creatinine", "eGFR", "potassium", "phosphorus", "albumin"]
-        if "diabetes" in d or "t1d" in d or "type 1" in d:
-            return ["HbA1c", "fasting glucose", "c-peptide (if available)"]
-        if "epilepsy" in d:
-            return ["vitamin D", "folate", "vitamin B12", "drug levels (if on AEDs)"]
-        if "cystic" in d or "cf" in d:
-            return ["Vitamins A/D/E/K", "albumin", "prealbumin"]
-        if "preterm" in d or "neonate" in d:
-            return ["albumin", "calcium", "phosphate", "ALP", "weight gain"]
-        if "pku" in d or "phenylketonuria" in d or "msud" in d or "galactose" in d:
-            return ["specific amino acids (phenylalanine, leucine)", "amino acid profile"]
-        if "food allergy" in d or "allergy" in d:
-            return ["IgE (if available)", "eosinophils (if available)"]
-        if "ibd" in d or "crohn" in d or "gastro" in d:
-            return ["albumin", "CRP", "iron indices"]
+            return list(_DEFAULT_BIOMARKERS)
+
+        m = _DIAGNOSIS_BUCKET_RE.match(diagnosis.lower())
+        if m:
+            return list(_BIOMARKERS_BY_BUCKET[m.lastgroup])
         # default
-        return ["creatinine", "eGFR", "HbA1c", "albumin"]
+        return list(_DEFAULT_BIOMARKERS)
 
-    def classify_and_enforce(self, query: str) -> Dict[str, Any]:
+    def classify_and_enforce(self, query: str, options_offered: bool = False) -> Dict[str, Any]:
         """
         Main entry point.
         Returns a dictionary with:
@@ -111,8 +177,38 @@ class IntentManager:
             - diagnosis, medications, biomarkers, biomarkers_detailed
             - downgraded (bool), downgrade_reason (str)
             - onboarding_message (if downgraded from therapy to recommendation)
+        When options_offered (the onboarding message was the previous turn),
+        exact option replies short-circuit with the intent the option resumes
+        (_OPTION_INTENTS) and the canonical choice in "option".
         """
-        logger.debug(f"Classifying query: {query[:200]}")
+        # Onboarding replies ("2", "step by step") are not queries: answer them
+        # without running the classifier, but only while the prompt is pending;
+        # otherwise "2" may answer an age or quantity question
+        option = None
+        if options_offered and query:
+            reply = _clean_option_reply(query)
+            if reply in _OPTION_REPLY_SHORTCUTS:
+                option = _SHORT_OPTION_MAP[reply]
+        if option:
+            logger.debug("Option reply %r -> %s", query, option)
+            label = _OPTION_INTENTS[option]
+            return {
+                "original_label": label,
+                "final_label": label,
+                "confidence": 1.0,
+                "option": option,
+                "diagnosis": None,
+                "medications": [],
+                "biomarkers": [],
+                "biomarkers_detailed": {},
+                "downgraded": False,
+                "downgrade_reason": None,
+                "onboarding_message": None,
+                # no classifier ran; consumers still get a classifier-shaped dict
+                "raw_classifier": {"label": label, "confidence": 1.0, "option": option},
+            }
+
+        logger.debug("Classifying query: %.200s", query)
         base = self.classifier.classify(query)
 
         original_label = base.get("label", "general")
@@ -131,18 +227,18 @@ class IntentManager:
         try:
             forced = self.classifier.enforce_gatekeeper(query, original_label, confidence)
             if forced != original_label:
-                logger.info(f"Gatekeeper changed label from {original_label} -> {forced}")
+                logger.info("Gatekeeper changed label from %s -> %s", original_label, forced)
                 final_label = forced
                 downgraded = True
                 downgrade_reason = f"gatekeeper_forced_{forced}"
         except Exception as e:
-            logger.debug(f"enforce_gatekeeper unavailable or failed: {e}")
+            logger.debug("enforce_gatekeeper unavailable or failed: %s", e)
 
         # Therapy gatekeeper enforcement (CRITICAL)
         if final_label == "therapy":
             has_meds = len(meds) > 0
             has_biomarkers = len(biomarkers) > 0 or bool(biomarkers_detailed)
-            logger.debug(f"therapy check: has_meds={has_meds}, has_biomarkers={has_biomarkers}")
+            logger.debug("therapy check: has_meds=%s, has_biomarkers=%s", has_meds, has_biomarkers)
             if not (has_meds and has_biomarkers):
                 # Downgrade to recommendation (non-negotiable)
                 logger.warning("Therapy requested but missing medications or biomarkers — downgrading to 'recommendation'")
@@ -162,7 +258,7 @@ class IntentManager:
                 onboarding_message = self._build_onboarding_message(diagnosis_name, required_bms_text, len(missing))
 
                 # Log for debugging
-                logger.info(f"Downgraded therapy -> recommendation. Missing: {missing}")
+                logger.info("Downgraded therapy -> recommendation. Missing: %s", missing)
 
         # Low-confidence overrides (already partly handled by classifier)
         if not downgraded and final_label == "therapy" and confidence < 0.78:
@@ -195,22 +291,12 @@ class IntentManager:
         Matches the user's requested format (markdown-like).
         """
         # Note: len(missing_items) used earlier by UI; we keep message generic
-        message = (
-            f"How would you like to proceed?\n\n"
-            f"📋 Option 1: Upload Lab Results (Fastest)\n"
-            f"   Upload a PDF or photo of recent lab report. I'll extract biomarker values automatically.\n"
-            f"   → Click [Upload Lab Results] button below ↓\n\n"
-            f"✍ Option 2: Answer Step-by-Step ({missing_count} questions)    "
-            f"I'll ask one question at a time (age, medications, labs, etc.)    Takes a few seconds.    → Type \"step by step\"\n\n"
-            f"📚 Option 3: General {diagnosis or 'Diet'} Information First\n"
-            f"   Get general diet guidelines for {diagnosis or 'this condition'} while you gather clinical data, then come back for personalized therapy.\n"
-            f"   → Type \"general info first\"\n\n"
-            f"*Examples of biomarkers I typically need:* {biomarker_examples}\n\n"
-            f"Which option works best for you?\n\n"
-            f"---\n"
-            f"⚠ For educational purposes only. Not medical advice. Consult a healthcare provider."
-        )
-        return message
+        return _ONBOARDING_TEMPLATE.format_map({
+            "missing_count": missing_count,
+            "diagnosis_title": diagnosis or "Diet",
+            "diagnosis_name": diagnosis or "this condition",
+            "biomarker_examples": biomarker_examples,
+        })
 
     def normalize_user_option_reply(self, user_reply: str) -> Optional[str]:
         """
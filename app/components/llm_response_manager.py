@@ -18,16 +18,26 @@ Enhanced with:
 - Session timeout and cleanup
 - Schema-based slot validation (from ambiguity_gate.py + slot_schema.py)
 """
-from typing import Dict, Any, List, Optional, Tuple
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Tuple
+import asyncio
+import copy
+import heapq
 import logging
 import math
+import queue
+import re
 import threading
-from datetime import datetime, timedelta
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from types import MappingProxyType
 from dataclasses import dataclass
+from functools import lru_cache
 
-from app.components.query_classifier import NutritionQueryClassifier
+from app.components.query_classifier import BIOMARKERS, NutritionQueryClassifier
 from app.components.followup_question_generator import FollowUpQuestionGenerator
-from app.components.hybrid_retriever import filtered_retrieval, retriever
+from app.components.hybrid_retriever import filtered_retrieval, filtered_retrieval_batch, retriever
 from app.components.computation_manager import ComputationManager
 from app.components.therapy_generator import TherapyGenerator
 from app.components.fct_manager import FCTManager
@@ -51,8 +61,8 @@ class SlotSpec:
     max: Optional[float] = None
     hint: Optional[str] = None
 
-# Supported therapy conditions (strict list)
-SUPPORTED_THERAPY_CONDITIONS = {
+# Supported therapy conditions (strict list); read-only
+SUPPORTED_THERAPY_CONDITIONS = MappingProxyType({
     "preterm nutrition": "Preterm Nutrition",
     "type 1 diabetes": "Type 1 Diabetes",
     "t1d": "Type 1 Diabetes",
@@ -71,7 +81,260 @@ SUPPORTED_THERAPY_CONDITIONS = {
     "ibd": "GI Disorders",
     "gerd": "GI Disorders",
     "gastroesophageal reflux": "GI Disorders"
-}
+})
+
+# One pass over a diagnosis for every supported condition key. Each branch is an
+# anchored lookahead, so the first key in SUPPORTED_THERAPY_CONDITIONS order that
+# occurs anywhere in the text wins (group gN -> Nth key), exactly like the loop
+# it replaces; a plain alternation would prefer the leftmost key instead
+_THERAPY_CONDITION_KEYS = tuple(SUPPORTED_THERAPY_CONDITIONS)
+_THERAPY_CONDITION_NAMES = tuple(SUPPORTED_THERAPY_CONDITIONS.values())
+_THERAPY_CONDITION_RE = re.compile(
+    "|".join(f"(?=.*?(?P<g{i}>{re.escape(key)}))" for i, key in enumerate(_THERAPY_CONDITION_KEYS)),
+    re.DOTALL,
+)
+
+
+# Worker threads per manager for work overlapped within one turn (classifying
+# a query while its entities are extracted, the two food-row lookups of a
+# comparison); model forward passes and FAISS searches release the GIL
+_TURN_POOL_WORKERS = 8
+
+# Nutrients whose representative food sources a recommendation shows
+_RECOMMENDATION_NUTRIENTS = ("protein", "calcium", "iron", "vitamin_d", "zinc", "folate", "vitamin_c")
+_RECOMMENDATION_SUMMARY = "Provided DRI-based nutrient targets and representative food sources. This is NOT a therapeutic diet."
+
+
+def _food_source_entries(docs) -> List[Dict[str, str]]:
+    """Title/snippet entries for retrieved FCT documents"""
+    entries = []
+    for d in docs or []:
+        title = getattr(d, "metadata", {}).get("food") or getattr(d, "metadata", {}).get("chapter_title") or ""
+        # if no clear food name, push snippet
+        snippet = (d.page_content[:200] if getattr(d, "page_content", None) else "")
+        entries.append({"title": title, "snippet": snippet})
+    return entries
+
+def _recommendation_payload(bmi_info: Dict[str, Any], micronutrients: Dict[str, Any],
+                            food_sources: Dict[str, List[Dict[str, str]]]) -> Dict[str, Any]:
+    """Final recommendation payload, shared by the blocking and streaming handlers"""
+    return {
+        "query_type": "recommendation",
+        "bmi_info": bmi_info,
+        "micronutrient_targets": micronutrients,
+        "food_sources": food_sources,
+        "summary_text": _RECOMMENDATION_SUMMARY,
+    }
+
+# Max query texts kept in each of the classify / extract_entities memo caches
+_NLU_CACHE_SIZE = 1024
+
+# Idle time (seconds) after which a session expires, and the longest the
+# background reaper sleeps between expiry sweeps
+_SESSION_TIMEOUT = 24 * 3600.0
+_SESSION_REAP_INTERVAL = 60.0
+
+# Number of striped session locks
+_SESSION_LOCK_SHARDS = 32
+
+# Concurrent classify calls are coalesced into batches of up to this many
+# queries; a batch waits at most this long (seconds) for more to arrive
+_CLASSIFY_BATCH_SIZE = 16
+_CLASSIFY_BATCH_WAIT = 0.002
+# Longest a request waits (seconds) for its batched classification before
+# falling back to the classifier's safe default result
+_CLASSIFY_RESULT_TIMEOUT = 30.0
+
+
+class _MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into one batch_fn(items) call.
+    A worker thread takes whatever is queued (up to max_batch, waiting up to
+    max_wait for stragglers), so requests arriving while a batch runs share
+    the next one. The worker exits when idle and restarts on the next submit.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch: int, max_wait: float):
+        self._batch_fn = batch_fn
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._worker.start()
+        return future
+
+    def _run(self) -> None:
+        try:
+            self._serve()
+        except BaseException as e:
+            # The worker died: fail everything still queued instead of leaving
+            # callers waiting on futures nobody will resolve
+            with self._lock:
+                self._worker = None
+                pending = []
+                while True:
+                    try:
+                        pending.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            for _, future in pending:
+                future.set_exception(RuntimeError(f"micro-batcher worker failed: {e!r}"))
+            raise
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                batch = [self._queue.get(timeout=1.0)]
+            except queue.Empty:
+                with self._lock:
+                    # a submit after this check starts a new worker
+                    if self._queue.empty():
+                        self._worker = None
+                        return
+                continue
+            deadline = time.monotonic() + self._max_wait
+            while len(batch) < self._max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[Tuple[Any, Future]]) -> None:
+        """Resolve every future in the batch, with a result or with the failure"""
+        try:
+            results = self._batch_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"batch function returned {len(results)} results for {len(batch)} items")
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except BaseException as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+
+
+def _append_unique(existing: List[Any], new: List[Any]) -> List[Any]:
+    """Append the items of new not already in existing (in place, order kept); set-backed, O(n + m)"""
+    seen = set(existing)
+    for item in new:
+        if item not in seen:
+            seen.add(item)
+            existing.append(item)
+    return existing
+
+
+def _merge_dict_slot(slots: Dict[str, Any], key: str, value: Dict[str, Any]) -> None:
+    existing = slots.get(key, {})
+    existing.update(value)
+    slots[key] = existing
+
+
+def _merge_list_slot(slots: Dict[str, Any], key: str, value: List[Any]) -> None:
+    slots[key] = _append_unique(slots.get(key, []), value)
+
+
+# How extracted entities merge into session slots; other keys only fill empty slots
+_SLOT_MERGERS = MappingProxyType({
+    "biomarkers_detailed": _merge_dict_slot,
+    "biomarkers": _merge_list_slot,
+    "medications": _merge_list_slot,
+})
+
+
+def _supported_therapy_condition(diagnosis: str) -> Optional[str]:
+    """Canonical supported condition named in a diagnosis (substring match), else None"""
+    match = _THERAPY_CONDITION_RE.match(diagnosis.lower())
+    if not match:
+        return None
+    return _THERAPY_CONDITION_NAMES[int(match.lastgroup[1:])]
+
+# "compare X and/vs/versus Y" in a lowercased comparison query
+_COMPARE_PAIR_RE = re.compile(r'compare\s+([a-z0-9\s\-]+?)\s+(and|vs|versus)\s+([a-z0-9\s\-]+)')
+
+# Followup slots filled as biomarker values
+_BIOMARKER_SLOTS = frozenset(BIOMARKERS)
+
+# Anthropometry patterns for extract_entities, tried in order on the lowercased query
+_DIGIT_RE = re.compile(r'\d')
+# Age: "7 years old", "7yo", "7 y/o", "7-year-old", "age 7", "7 year old", "7y"
+_AGE_PATTERNS = (
+    re.compile(r'(\d+\.?\d*)\s*(?:years?\s+old|y/?o|year[\s-]old)'),
+    re.compile(r'age\s+(\d+\.?\d*)'),
+    re.compile(r'(\d+\.?\d*)\s*y\b'),
+)
+# Weight: "70kg", "70 kg", "weighs 70 kg", "weight: 70kg"
+_WEIGHT_PATTERNS = (
+    re.compile(r'(\d+\.?\d*)\s*kg\b'),
+    re.compile(r'weight[:\s]+(\d+\.?\d*)\s*(?:kg)?'),
+    re.compile(r'weighs?\s+(\d+\.?\d*)\s*(?:kg)?'),
+)
+# Height: "175cm", "175 cm", "height 175cm", "1.75m", "1.75 m"
+_HEIGHT_PATTERNS = (
+    re.compile(r'(\d+\.?\d*)\s*cm\b'),
+    re.compile(r'(\d+\.\d+)\s*m\b'),  # meters
+    re.compile(r'height[:\s]+(\d+\.?\d*)\s*(?:cm)?'),
+)
+
+@lru_cache(maxsize=1024, typed=True)
+def _bmi_or_wfl_items(age_years: Optional[float], weight_kg: Optional[float], height_cm: Optional[float],
+                      is_preterm: bool) -> Tuple[Tuple[str, Any], ...]:
+    """LLMResponseManager.compute_bmi_or_wfl result as (key, value) pairs, in insertion order"""
+    out = {}
+    if weight_kg is None or (height_cm is None and (age_years is None or age_years >= 2)):
+        out["note"] = "Insufficient anthropometry for BMI/WFL calculation."
+        return tuple(out.items())
+
+    if age_years is not None and age_years < 2:
+        # weight-for-length approximation (kg / m)
+        if height_cm is None or height_cm <= 0:
+            out["note"] = "Height missing or invalid for weight-for-length."
+            return tuple(out.items())
+        length_m = height_cm / 100.0
+        wfl = weight_kg / length_m  # kg per meter - not a percentile but can signal issues
+        out["weight_for_length_value"] = round(wfl, 3)
+        out["interpretation"] = "Weight-for-length computed. Use WHO growth charts to determine percentile."
+        if is_preterm:
+            out["preterm_note"] = "This is a preterm infant — use corrected age and NICU growth charts for interpretation."
+        return tuple(out.items())
+    else:
+        # BMI
+        if height_cm is None or height_cm <= 0:
+            out["note"] = "Height missing or invalid for BMI."
+            return tuple(out.items())
+        height_m = height_cm / 100.0
+        bmi = weight_kg / (height_m * height_m)
+        out["bmi"] = round(bmi, 2)
+
+        # rudimentary classification using CDC adult-like cutoffs adapted for pediatrics (note: true pediatric uses percentile)
+        if age_years is not None and age_years >= 2:
+            # For simplicity provide WHO/CDC hints but warn that percentile is required.
+            if bmi < 14:  # heuristic lower bound
+                cat = "Underweight (heuristic)"
+            elif bmi < 18.5:
+                cat = "Normal weight (heuristic)"
+            elif bmi < 25:
+                cat = "Overweight (heuristic)"
+            else:
+                cat = "Obesity (heuristic)"
+            out["category_hint"] = cat
+            out["note"] = "This is a heuristic category. For pediatric patients use BMI-for-age percentiles (WHO/CDC)."
+        else:
+            out["note"] = "Age not provided; BMI computed but pediatric percentile check requires age."
+        if is_preterm:
+            out["preterm_note"] = "For preterm infants, use corrected age for BMI/growth assessment."
+        return tuple(out.items())
+
 
 class LLMResponseManager:
     def __init__(self, dri_table_path: str = "data/dri_table.csv"):
@@ -87,8 +350,30 @@ class LLMResponseManager:
 
         # Per-session state with thread safety
         self.sessions: Dict[str, Dict[str, Any]] = {}
-        self._session_lock = threading.RLock()  # Thread-safe
-        self._session_timeout = timedelta(hours=24)  # Session expires after 24 hours
+        # Striped locks: a session's reads/writes hold only its shard's lock, so
+        # unrelated users don't wait on each other (single dict get/set/del are atomic)
+        self._session_locks = [threading.RLock() for _ in range(_SESSION_LOCK_SHARDS)]
+        self._session_timeout = _SESSION_TIMEOUT  # Session expires after 24 hours idle (monotonic seconds)
+        # Expiry deadlines swept by a background reaper, earliest first; guarded by
+        # _expiry_lock (always taken after a shard lock, never before)
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._expiry_scheduled: set = set()
+        self._reaper: Optional[threading.Thread] = None
+        self._expiry_lock = threading.Lock()
+
+        # LRU memos of classifier.classify and extract_entities, both pure functions
+        # of the query text (retries and post-followup re-runs repeat it)
+        self._classify_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._entity_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._nlu_cache_lock = threading.Lock()
+        # Classifier forward passes for concurrent sessions run as one padded batch
+        classify_batch = getattr(self.classifier, "classify_batch", None)
+        self._classify_batcher = (
+            _MicroBatcher(classify_batch, _CLASSIFY_BATCH_SIZE, _CLASSIFY_BATCH_WAIT) if classify_batch else None
+        )
+        # Created on first use and released by close()
+        self._turn_pool: Optional[ThreadPoolExecutor] = None
+        self._turn_pool_lock = threading.Lock()
 
         # Default session ID for single-session use (backward compatibility)
         self.default_session_id = "default"
@@ -124,40 +409,87 @@ class LLMResponseManager:
     # -------------------------
     # Session helpers (Thread-safe with timeout)
     # -------------------------
+    def _lock_for(self, session_id: str) -> threading.RLock:
+        """The shard lock guarding session_id"""
+        return self._session_locks[hash(session_id) % _SESSION_LOCK_SHARDS]
+
     def _get_session(self, session_id: str) -> Dict[str, Any]:
         """Get or create session with thread safety and timeout check"""
-        with self._session_lock:  # Thread-safe
-            if session_id not in self.sessions:
+        now = time.monotonic()
+        with self._lock_for(session_id):  # Thread-safe
+            session = self.sessions.get(session_id)
+            if session is None:
                 # Initialize new session
-                self.sessions[session_id] = {
-                    "slots": {},            # age, sex, weight_kg, height_cm, diagnosis, medications, biomarkers, country, allergies, etc.
-                    "lab_results": [],      # parsed labs (if user uploaded)
-                    "last_query_info": None,
-                    "clarifications": {},   # e.g., {"mode":"step_by_step"}
-                    "created_at": datetime.utcnow(),       # Session creation time
-                    "last_accessed": datetime.utcnow(),   # Last access time
-                }
-
-            session = self.sessions[session_id]
-
-            # Check if session expired
-            if datetime.utcnow() - session.get("last_accessed", datetime.utcnow()) > self._session_timeout:
-                logger.info(f"Session {session_id} expired, resetting")
-                self.sessions[session_id] = {
-                    "slots": {},
-                    "lab_results": [],
-                    "last_query_info": None,
-                    "clarifications": {},
-                    "created_at": datetime.utcnow(),
-                    "last_accessed": datetime.utcnow(),
-                }
-                session = self.sessions[session_id]
+                session = self._new_session(session_id, now)
+            # Check if session expired (the reaper may not have swept it yet)
+            elif now - session.get("last_accessed_mono", now) > self._session_timeout:
+                logger.info("Session %s expired, resetting", session_id)
+                session = self._new_session(session_id, now)
 
             # Update last accessed time
-            session["last_accessed"] = datetime.utcnow()
+            session["last_accessed_mono"] = now
 
             return session
 
+    def _new_session(self, session_id: str, now: float) -> Dict[str, Any]:
+        """Store a fresh session and schedule its expiry; caller holds the session's shard lock"""
+        session = self.sessions[session_id] = {
+            "slots": {},            # age, sex, weight_kg, height_cm, diagnosis, medications, biomarkers, country, allergies, etc.
+            "lab_results": [],      # parsed labs (if user uploaded)
+            "last_query_info": None,
+            "last_classified_query": None,  # query text last_query_info belongs to
+            "clarifications": {},   # e.g., {"mode":"step_by_step"}
+            "created_at": datetime.utcnow(),  # Session creation time
+            "last_accessed_mono": now,  # Last access time (time.monotonic(), not wall clock)
+        }
+        with self._expiry_lock:
+            if session_id not in self._expiry_scheduled:
+                self._expiry_scheduled.add(session_id)
+                heapq.heappush(self._expiry_heap, (now + self._session_timeout, session_id))
+                if self._reaper is None:
+                    self._reaper = threading.Thread(target=self._reap_expired_sessions,
+                                                    name="session-reaper", daemon=True)
+                    self._reaper.start()
+        return session
+
+    def _reap_expired_sessions(self) -> None:
+        """
+        Background sweeper: drop sessions idle past the timeout, earliest deadline
+        first. Entries are refreshed lazily (a session accessed since it was
+        scheduled is pushed back with its new deadline), so requests only touch
+        last_accessed_mono. Exits when no sessions are scheduled.
+        """
+        while True:
+            with self._expiry_lock:
+                now = time.monotonic()
+                due = []
+                while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                    due.append(heapq.heappop(self._expiry_heap)[1])
+            for sid in due:
+                with self._lock_for(sid):
+                    session = self.sessions.get(sid)
+                    expire_at = None
+                    if session is not None:
+                        expire_at = session.get("last_accessed_mono", now) + self._session_timeout
+                        if expire_at <= now:
+                            del self.sessions[sid]
+                            expire_at = None
+                            logger.info("Expired session %s removed", sid)
+                    # still under the shard lock, so a concurrent _new_session for sid
+                    # can't miss (or duplicate) its schedule entry
+                    with self._expiry_lock:
+                        if expire_at is None:
+                            self._expiry_scheduled.discard(sid)
+                        else:
+                            heapq.heappush(self._expiry_heap, (expire_at, sid))
+            with self._expiry_lock:
+                if not self._expiry_heap:
+                    self._reaper = None
+                    return
+                delay = min(self._expiry_heap[0][0] - time.monotonic(), _SESSION_REAP_INTERVAL)
+            if delay > 0:
+                time.sleep(delay)
+
     # -------------------------
     # Step 1: classify query
     # -------------------------
@@ -166,11 +498,23 @@ class LLMResponseManager:
         Returns classifier result and stores it in session.
         """
         session = self._get_session(session_id)
-        result = self.classifier.classify(query)
+        result = self._memoized(self._classify_cache, query, self._classify)
         session["last_query_info"] = result
+        session["last_classified_query"] = query
         logger.debug(f"Classified query: {result}")
         return result
 
+    def _classify(self, query: str) -> Dict[str, Any]:
+        """classifier.classify, batched with other sessions' concurrent queries when supported"""
+        if self._classify_batcher is None:
+            return self.classifier.classify(query)
+        try:
+            return self._classify_batcher.submit(query).result(timeout=_CLASSIFY_RESULT_TIMEOUT)
+        except Exception as e:
+            # same safe default classify() returns on a model failure (never cached)
+            logger.error("Batched classification failed: %r", e)
+            return NutritionQueryClassifier._fallback_result(e)
+
     # -------------------------
     # Step 2: extract entities (lightweight helpers using classifier)
     # -------------------------
@@ -180,8 +524,31 @@ class LLMResponseManager:
         Also extracts age, weight, height using regex patterns.
         Returns a small dict of extracted entities.
         """
-        import re
+        return self._memoized(self._entity_cache, query, self._extract_entities)
 
+    def _memoized(self, cache: "OrderedDict[str, Dict[str, Any]]", query: str,
+                  compute: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        compute(query) through an LRU cache keyed on the exact query text.
+        Callers get their own copy (results are merged into session slots);
+        classifier error fallbacks are not cached.
+        """
+        with self._nlu_cache_lock:
+            cached = cache.get(query)
+            if cached is not None:
+                cache.move_to_end(query)
+                return copy.deepcopy(cached)
+
+        result = compute(query)
+        if "error" not in result:
+            with self._nlu_cache_lock:
+                cache[query] = copy.deepcopy(result)
+                cache.move_to_end(query)
+                if len(cache) > _NLU_CACHE_SIZE:
+                    cache.popitem(last=False)
+        return result
+
+    def _extract_entities(self, query: str) -> Dict[str, Any]:
         ent = {
             "diagnosis": self.classifier._extract_diagnosis(query),
             "biomarkers_detailed": self.classifier.extract_biomarkers_with_values(query),
@@ -190,51 +557,44 @@ class LLMResponseManager:
             "country": self.classifier._extract_country(query),
         }
 
+        q_lower = query.lower()
+        # Every anthropometry pattern needs a digit: one scan rules out all nine
+        if _DIGIT_RE.search(q_lower):
+            self._extract_anthropometry(q_lower, ent)
+
+        return ent
+
+    def _extract_anthropometry(self, q_lower: str, ent: Dict[str, Any]) -> None:
+        """Add age / weight_kg / height_cm found in the lowercased query to ent"""
         # CRITICAL FIX: Extract age (missing from original implementation)
-        # Patterns: "7 years old", "7yo", "7 y/o", "7-year-old", "age 7", "7 year old"
-        age_patterns = [
-            r'(\d+\.?\d*)\s*(?:years?\s+old|y/?o|year[\s-]old)',
-            r'age\s+(\d+\.?\d*)',
-            r'(\d+\.?\d*)\s*y\b',  # "7y"
-        ]
-        for pattern in age_patterns:
-            match = re.search(pattern, query.lower())
+        for pattern in _AGE_PATTERNS:
+            match = pattern.search(q_lower)
             if match:
                 try:
                     age = float(match.group(1))
                     if 0 < age <= 18:  # Pediatric range validation
                         ent["age"] = int(age) if age == int(age) else age
-                        logger.debug(f"Extracted age: {ent['age']}")
+                        logger.debug("Extracted age: %s", ent["age"])
                         break
                 except (ValueError, IndexError):
                     pass
 
-        # Extract weight: "70kg", "70 kg", "weighs 70 kg", "weight: 70kg"
-        weight_patterns = [
-            r'(\d+\.?\d*)\s*kg\b',
-            r'weight[:\s]+(\d+\.?\d*)\s*(?:kg)?',
-            r'weighs?\s+(\d+\.?\d*)\s*(?:kg)?',
-        ]
-        for pattern in weight_patterns:
-            match = re.search(pattern, query.lower())
+        # Extract weight
+        for pattern in _WEIGHT_PATTERNS:
+            match = pattern.search(q_lower)
             if match:
                 try:
                     weight = float(match.group(1))
                     if 1 < weight < 200:  # Sanity check
                         ent["weight_kg"] = weight
-                        logger.debug(f"Extracted weight: {weight}kg")
+                        logger.debug("Extracted weight: %skg", weight)
                         break
                 except (ValueError, IndexError):
                     pass
 
-        # Extract height: "175cm", "175 cm", "height 175cm", "1.75m", "1.75 m"
-        height_patterns = [
-            r'(\d+\.?\d*)\s*cm\b',
-            r'(\d+\.\d+)\s*m\b',  # meters
-            r'height[:\s]+(\d+\.?\d*)\s*(?:cm)?',
-        ]
-        for pattern in height_patterns:
-            match = re.search(pattern, query.lower())
+        # Extract height
+        for pattern in _HEIGHT_PATTERNS:
+            match = pattern.search(q_lower)
             if match:
                 try:
                     height = float(match.group(1))
@@ -243,13 +603,11 @@ class LLMResponseManager:
                         height = height * 100
                     if 30 < height < 250:  # Sanity check
                         ent["height_cm"] = height
-                        logger.debug(f"Extracted height: {height}cm")
+                        logger.debug("Extracted height: %scm", height)
                         break
                 except (ValueError, IndexError):
                     pass
 
-        return ent
-
     # -------------------------
     # Utility: BMI / WFL calculation
     # -------------------------
@@ -259,50 +617,8 @@ class LLMResponseManager:
         If age < 2: return weight-for-length (kg per m) and guidance note.
         Preterm: add note that corrected age/growth charts should be used.
         """
-        out = {}
-        if weight_kg is None or (height_cm is None and (age_years is None or age_years >= 2)):
-            out["note"] = "Insufficient anthropometry for BMI/WFL calculation."
-            return out
-
-        if age_years is not None and age_years < 2:
-            # weight-for-length approximation (kg / m)
-            if height_cm is None or height_cm <= 0:
-                out["note"] = "Height missing or invalid for weight-for-length."
-                return out
-            length_m = height_cm / 100.0
-            wfl = weight_kg / length_m  # kg per meter - not a percentile but can signal issues
-            out["weight_for_length_value"] = round(wfl, 3)
-            out["interpretation"] = "Weight-for-length computed. Use WHO growth charts to determine percentile."
-            if is_preterm:
-                out["preterm_note"] = "This is a preterm infant — use corrected age and NICU growth charts for interpretation."
-            return out
-        else:
-            # BMI
-            if height_cm is None or height_cm <= 0:
-                out["note"] = "Height missing or invalid for BMI."
-                return out
-            height_m = height_cm / 100.0
-            bmi = weight_kg / (height_m * height_m)
-            out["bmi"] = round(bmi, 2)
-
-            # rudimentary classification using CDC adult-like cutoffs adapted for pediatrics (note: true pediatric uses percentile)
-            if age_years is not None and age_years >= 2:
-                # For simplicity provide WHO/CDC hints but warn that percentile is required.
-                if bmi < 14:  # heuristic lower bound
-                    cat = "Underweight (heuristic)"
-                elif bmi < 18.5:
-                    cat = "Normal weight (heuristic)"
-                elif bmi < 25:
-                    cat = "Overweight (heuristic)"
-                else:
-                    cat = "Obesity (heuristic)"
-                out["category_hint"] = cat
-                out["note"] = "This is a heuristic category. For pediatric patients use BMI-for-age percentiles (WHO/CDC)."
-            else:
-                out["note"] = "Age not provided; BMI computed but pediatric percentile check requires age."
-            if is_preterm:
-                out["preterm_note"] = "For preterm infants, use corrected age for BMI/growth assessment."
-            return out
+        # The computation is pure over its four inputs; re-runs after each filled slot hit the cache
+        return dict(_bmi_or_wfl_items(age_years, weight_kg, height_cm, is_preterm))
 
     # -------------------------
     # Routing: main entry point
@@ -316,84 +632,98 @@ class LLMResponseManager:
         This allows opportunistic data capture even when awaiting a slot.
         """
         session = self._get_session(session_id)
+        awaiting_slot = session.get("awaiting_slot")
+        # A new query (no followup pending) is classified on a worker thread while
+        # its entities are extracted here; the two passes are independent
+        classify_future = None if awaiting_slot else self._pool().submit(self.classify_query, session_id, user_query)
 
         # APPROACH 1: ALWAYS extract entities first (even in followup mode)
         # This prevents data loss when user volunteers information during followup
-        entities = self.extract_entities(user_query)
-        # Merge entities into session slots if present
-        for k, v in entities.items():
-            if v:
-                if k == "biomarkers_detailed":
-                    # merge dicts
-                    existing = session["slots"].get("biomarkers_detailed", {})
-                    existing.update(v)
-                    session["slots"]["biomarkers_detailed"] = existing
-                elif k == "biomarkers":
-                    existing = session["slots"].get("biomarkers", [])
-                    for b in v:
-                        if b not in existing:
-                            existing.append(b)
-                    session["slots"]["biomarkers"] = existing
-                elif k == "medications":
-                    existing = session["slots"].get("medications", [])
-                    for m in v:
-                        if m not in existing:
-                            existing.append(m)
-                    session["slots"]["medications"] = existing
-                else:
-                    session["slots"].setdefault(k, v)
+        self._merge_entities(session, self.extract_entities(user_query))
 
         # THEN check if we're awaiting a followup response
-        awaiting_slot = session.get("awaiting_slot")
         if awaiting_slot:
-            logger.info(f"Detected followup context - awaiting slot: {awaiting_slot}")
-            # Route to followup handler
-            result = self.handle_followup_response(session_id, user_query, awaiting_slot)
+            return self._handle_awaiting_slot(session_id, session, user_query, awaiting_slot)
+
+        # 1) classify (started above, alongside entity extraction)
+        query_info = classify_future.result()
+        session["last_query_info"] = query_info
+        session["last_raw_query"] = user_query  # CRITICAL: Store for re-run after followup
 
-            # Check if slot was filled or rejected
-            if result["status"] == "slot_filled":
-                # Clear awaiting state
+        # 2) Entity extraction and merging already done above (moved before followup check)
+
+        # 3) route based on label
+        return self._route(session_id, user_query, session, query_info)
+
+    @staticmethod
+    def _merge_entities(session: Dict[str, Any], entities: Dict[str, Any]) -> None:
+        """Merge extracted entities into the session slots"""
+        slots = session["slots"]
+        for k, v in entities.items():
+            if v:
+                merger = _SLOT_MERGERS.get(k)
+                if merger is not None:
+                    merger(slots, k, v)
+                else:
+                    slots.setdefault(k, v)
+
+    def _handle_awaiting_slot(self, session_id: str, session: Dict[str, Any], user_query: str,
+                              awaiting_slot: str) -> Dict[str, Any]:
+        """Take user_query as the answer to the pending followup, then continue the stored query"""
+        logger.info(f"Detected followup context - awaiting slot: {awaiting_slot}")
+        # Route to followup handler
+        result = self.handle_followup_response(session_id, user_query, awaiting_slot)
+
+        # Check if slot was filled or rejected
+        if result["status"] == "slot_filled":
+            # Clear awaiting state
+            session.pop("awaiting_slot", None)
+            # Re-run the pipeline with last query to continue flow
+            last_query = session.get("last_raw_query", "")
+            if last_query:
+                logger.info(f"Slot filled, re-running pipeline with original query: {last_query}")
+                return self._rerun_last_query(session_id, session, last_query)
+            else:
+                return {"status": "slot_filled", "message": f"Updated {awaiting_slot}"}
+        elif result["status"] == "slot_not_filled":
+            # Handle rejection
+            reason = result.get("details", {}).get("reason")
+            if reason == "user_rejected":
+                # User said "no" - mark slot as explicitly rejected
+                logger.info(f"User rejected slot {awaiting_slot}, marking as rejected")
                 session.pop("awaiting_slot", None)
-                # Re-run the pipeline with last query to continue flow
+                # Mark slot as rejected (use special marker to distinguish from missing)
+                session["slots"][f"_rejected_{awaiting_slot}"] = True
+                session["slots"][awaiting_slot] = "user_declined"  # Mark as declined
+
+                # Re-run the pipeline to ask for next slot or continue
                 last_query = session.get("last_raw_query", "")
                 if last_query:
-                    logger.info(f"Slot filled, re-running pipeline with original query: {last_query}")
-                    return self.handle_user_query(session_id, last_query)
-                else:
-                    return {"status": "slot_filled", "message": f"Updated {awaiting_slot}"}
-            elif result["status"] == "slot_not_filled":
-                # Handle rejection
-                reason = result.get("details", {}).get("reason")
-                if reason == "user_rejected":
-                    # User said "no" - mark slot as explicitly rejected
-                    logger.info(f"User rejected slot {awaiting_slot}, marking as rejected")
-                    session.pop("awaiting_slot", None)
-                    # Mark slot as rejected (use special marker to distinguish from missing)
-                    session["slots"][f"_rejected_{awaiting_slot}"] = True
-                    session["slots"][awaiting_slot] = "user_declined"  # Mark as declined
-
-                    # Re-run the pipeline to ask for next slot or continue
-                    last_query = session.get("last_raw_query", "")
-                    if last_query:
-                        logger.info(f"Re-running pipeline after rejection to get next question")
-                        return self.handle_user_query(session_id, last_query)
-                    else:
-                        return {"status": "acknowledged", "message": "Continuing without that information"}
+                    logger.info(f"Re-running pipeline after rejection to get next question")
+                    return self._rerun_last_query(session_id, session, last_query)
                 else:
-                    # Unclear response - ask again with clarification
-                    return {"status": "needs_clarification", "message": f"I didn't understand. {session.get('last_followup_question', 'Please try again.')}"}
+                    return {"status": "acknowledged", "message": "Continuing without that information"}
             else:
-                return result
+                # Unclear response - ask again with clarification
+                return {"status": "needs_clarification", "message": f"I didn't understand. {session.get('last_followup_question', 'Please try again.')}"}
+        else:
+            return result
 
-        # 1) classify
-        query_info = self.classify_query(session_id, user_query)
+    def _rerun_last_query(self, session_id: str, session: Dict[str, Any], last_query: str) -> Dict[str, Any]:
+        """
+        Continue the flow for the stored query after a followup answer. Its entities
+        were merged and its classification stored when it first ran, so only
+        routing is repeated (the handlers pick up the newly filled slots).
+        """
+        query_info = session.get("last_query_info")
+        # classify_query may have run for another query since (e.g. a streaming call)
+        if query_info is None or session.get("last_classified_query") != last_query:
+            query_info = self.classify_query(session_id, last_query)
+        return self._route(session_id, last_query, session, query_info)
+
+    def _route(self, session_id: str, user_query: str, session: Dict[str, Any],
+               query_info: Dict[str, Any]) -> Dict[str, Any]:
         label = query_info.get("label", "general")
-        session["last_query_info"] = query_info
-        session["last_raw_query"] = user_query  # CRITICAL: Store for re-run after followup
-
-        # 2) Entity extraction and merging already done above (moved before followup check)
-
-        # 3) route based on label
         if label == "comparison":
             return self._handle_comparison(session_id, user_query, session, query_info)
         elif label == "recommendation":
@@ -403,6 +733,10 @@ class LLMResponseManager:
         else:
             return self._handle_general(session_id, user_query, session, query_info)
 
+    async def ahandle_user_query(self, session_id: str, user_query: str) -> Dict[str, Any]:
+        """Async variant of handle_user_query for async front-ends (runs in a worker thread)"""
+        return await asyncio.to_thread(self.handle_user_query, session_id, user_query)
+
     # -------------------------
     # Comparison handler
     # -------------------------
@@ -419,28 +753,27 @@ class LLMResponseManager:
         # Try to find named foods by hitting the retriever with short queries for nouns in the query
         # We'll attempt a few likely tokens (words >3 chars)
         tokens = [t for t in q_lower.replace(",", " ").split() if len(t) > 3]
-        # test top tokens for being food by retrieving FCT-like docs
-        for tok in tokens[:8]:
-            try:
-                docs = filtered_retrieval(tok, {"doc_type": "FCT"}, k=3)
-            except Exception:
-                docs = []
-            if docs:
-                # treat tok as a possible food
-                food_candidates.append(tok)
-
         # If explicit "compare X and Y" patterns, try to extract two nouns after compare/ vs
-        import re
-        m = re.search(r'compare\s+([a-z0-9\s\-]+?)\s+(and|vs|versus)\s+([a-z0-9\s\-]+)', q_lower)
+        m = _COMPARE_PAIR_RE.search(q_lower)
         if m:
             food_candidates = [m.group(1).strip(), m.group(3).strip()]
+        elif tokens:
+            # test top tokens for being food by retrieving FCT-like docs (one batched probe)
+            probe_queries = tokens[:8]
+            try:
+                probes = filtered_retrieval_batch(probe_queries, {"doc_type": "FCT"}, k=3)
+            except Exception:
+                probes = []
+            # treat tokens with FCT hits as possible foods
+            food_candidates = [tok for tok, docs in zip(probe_queries, probes) if docs]
 
         # If we have two foods, do nutrient comparison
         if len(food_candidates) >= 2:
             food_a, food_b = food_candidates[0], food_candidates[1]
             # Retrieve more precise FCT rows for each
+            future_b = self._pool().submit(filtered_retrieval, food_b, {"doc_type": "FCT", "food": food_b}, k=10)
             rows_a = filtered_retrieval(food_a, {"doc_type": "FCT", "food": food_a}, k=10)
-            rows_b = filtered_retrieval(food_b, {"doc_type": "FCT", "food": food_b}, k=10)
+            rows_b = future_b.result()
             # If retriever returns Document objects, extract page_content or metadata (depends on vector store schema).
             def rows_to_simple(rows):
                 simple = []
@@ -500,17 +833,91 @@ class LLMResponseManager:
         Provide nutrient targets and food sources (not calculated to target).
         Ask needed follow-ups if missing.
         """
-        # Determine missing slots
-        followup = self.followup_gen.generate_follow_up_question(query_info, session.get("slots"), session.get("lab_results"), session.get("clarifications"))
+        followup = self._recommendation_followup(session, query_info)
         if followup:
-            # CRITICAL: Store awaiting slot in session to detect followup responses
-            session["awaiting_slot"] = followup.get("slot")
-            session["last_followup_question"] = followup.get("question")
-            logger.info(f"Asking followup for slot: {followup.get('slot')}")
-            return {"status": "needs_slot", "followup": followup}
+            return followup
 
         # All required slots present - compute DRI targets
         slots = session["slots"]
+        bmi_info, micronutrients = self._recommendation_targets(slots)
+
+        # For main nutrients, retrieve representative food sources (not a calculated diet)
+        food_sources = {}
+        # one batched retrieval: the nutrient queries are embedded in a single model call
+        source_queries = [f"food sources of {n}" for n in _RECOMMENDATION_NUTRIENTS]
+        try:
+            results = filtered_retrieval_batch(source_queries, {"doc_type": "FCT", "country": slots.get("country")}, k=5)
+        except Exception:
+            results = [[] for _ in _RECOMMENDATION_NUTRIENTS]
+        for n, docs in zip(_RECOMMENDATION_NUTRIENTS, results):
+            food_sources[n] = _food_source_entries(docs)
+
+        return {"status": "ok", "payload": _recommendation_payload(bmi_info, micronutrients, food_sources)}
+
+    async def ahandle_recommendation(self, session_id: str, query: str,
+                                     query_info: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of _handle_recommendation for UI front-ends.
+        The query is taken in as handle_user_query does: its entities are merged
+        into the session, and while a followup is pending it is the answer (the
+        single response handle_user_query would return is yielded). Otherwise
+        yields the DRI targets first, then {"status": "partial", "nutrient",
+        "sources"} as each nutrient's retrieval completes (all run concurrently),
+        then the same final response _handle_recommendation returns.
+        """
+        session = self._get_session(session_id)
+        awaiting_slot = session.get("awaiting_slot")
+        self._merge_entities(session, await asyncio.to_thread(self.extract_entities, query))
+        if awaiting_slot:
+            yield await asyncio.to_thread(self._handle_awaiting_slot, session_id, session, query, awaiting_slot)
+            return
+
+        if query_info is None:
+            query_info = await asyncio.to_thread(self.classify_query, session_id, query)
+        session["last_query_info"] = query_info
+        session["last_raw_query"] = query  # a followup answer re-runs this query
+        followup = self._recommendation_followup(session, query_info)
+        if followup:
+            yield followup
+            return
+
+        slots = session["slots"]
+        bmi_info, micronutrients = await asyncio.to_thread(self._recommendation_targets, slots)
+        yield {"status": "partial", "payload": {"query_type": "recommendation", "bmi_info": bmi_info,
+                                                "micronutrient_targets": micronutrients}}
+
+        source_filter = {"doc_type": "FCT", "country": slots.get("country")}
+
+        async def fetch(nutrient: str) -> Tuple[str, List[Dict[str, str]]]:
+            try:
+                docs = await asyncio.to_thread(filtered_retrieval, f"food sources of {nutrient}", source_filter, k=5)
+            except Exception:
+                docs = []
+            return nutrient, _food_source_entries(docs)
+
+        food_sources = {}
+        for next_done in asyncio.as_completed([fetch(n) for n in _RECOMMENDATION_NUTRIENTS]):
+            n, sources = await next_done
+            food_sources[n] = sources
+            yield {"status": "partial", "nutrient": n, "sources": sources}
+
+        # final payload keeps the fixed nutrient order regardless of completion order
+        food_sources = {n: food_sources[n] for n in _RECOMMENDATION_NUTRIENTS}
+        yield {"status": "ok", "payload": _recommendation_payload(bmi_info, micronutrients, food_sources)}
+
+    def _recommendation_followup(self, session: Dict[str, Any], query_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Ask for the next missing slot (recording it on the session), or None when complete"""
+        followup = self.followup_gen.generate_follow_up_question(query_info, session.get("slots"), session.get("lab_results"), session.get("clarifications"))
+        if not followup:
+            return None
+        # CRITICAL: Store awaiting slot in session to detect followup responses
+        session["awaiting_slot"] = followup.get("slot")
+        session["last_followup_question"] = followup.get("question")
+        logger.info(f"Asking followup for slot: {followup.get('slot')}")
+        return {"status": "needs_slot", "followup": followup}
+
+    def _recommendation_targets(self, slots: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """BMI/WFL info and DRI micronutrient targets for the session's slots"""
         age = float(slots.get("age")) if slots.get("age") is not None else None
         sex = slots.get("sex") or slots.get("gender") or "F"
         # ensure sex format
@@ -520,32 +927,7 @@ class LLMResponseManager:
         bmi_info = self.compute_bmi_or_wfl(age, slots.get("weight_kg"), slots.get("height_cm"), is_preterm=slots.get("is_preterm", False))
         # Get micronutrient targets
         micronutrients = self.computation.get_micronutrient_targets(int(age) if age is not None else 0, sex)
-
-        # For main nutrients, retrieve representative food sources (not a calculated diet)
-        # We'll query retriever for each of the top nutrients (protein, calcium, iron, vitamin_d, zinc)
-        nutrients_to_show = ["protein", "calcium", "iron", "vitamin_d", "zinc", "folate", "vitamin_c"]
-        food_sources = {}
-        for n in nutrients_to_show:
-            q = f"food sources of {n}"
-            try:
-                docs = filtered_retrieval(q, {"doc_type": "FCT", "country": slots.get("country")}, k=5)
-            except Exception:
-                docs = []
-            food_sources[n] = []
-            for d in docs or []:
-                title = getattr(d, "metadata", {}).get("food") or getattr(d, "metadata", {}).get("chapter_title") or ""
-                # if no clear food name, push snippet
-                snippet = (d.page_content[:200] if getattr(d, "page_content", None) else "")
-                food_sources[n].append({"title": title, "snippet": snippet})
-
-        payload = {
-            "query_type": "recommendation",
-            "bmi_info": bmi_info,
-            "micronutrient_targets": micronutrients,
-            "food_sources": food_sources,
-            "summary_text": "Provided DRI-based nutrient targets and representative food sources. This is NOT a therapeutic diet."
-        }
-        return {"status": "ok", "payload": payload}
+        return bmi_info, micronutrients
 
     # -------------------------
     # Therapy handler
@@ -562,12 +944,7 @@ class LLMResponseManager:
         # Extract diagnosis (prefer session slot if already set)
         diagnosis = session["slots"].get("diagnosis") or query_info.get("diagnosis")
         if diagnosis:
-            diag_key = diagnosis.lower()
-            supported = None
-            for k in SUPPORTED_THERAPY_CONDITIONS:
-                if k in diag_key:
-                    supported = SUPPORTED_THERAPY_CONDITIONS[k]
-                    break
+            supported = _supported_therapy_condition(diagnosis)
             if not supported:
                 # Downgrade to recommendation
                 msg = {
@@ -664,12 +1041,9 @@ class LLMResponseManager:
         activity_level = slots.get("activity_level", "moderate")
 
         # Normalize diagnosis to canonical name
-        therapy_area = None
-        for k, v in SUPPORTED_THERAPY_CONDITIONS.items():
-            if k in diagnosis.lower():
-                therapy_area = v
-                diagnosis = v  # Use canonical name
-                break
+        therapy_area = _supported_therapy_condition(diagnosis)
+        if therapy_area:
+            diagnosis = therapy_area  # Use canonical name
 
         logger.info(f"Starting 7-step therapy flow for {diagnosis} (age={age}, sex={sex}, weight={weight}kg, height={height}cm)")
 
@@ -960,8 +1334,6 @@ class LLMResponseManager:
         Use the classifier's extract_from_followup_response to interpret a user response for a known awaiting slot.
         Update session slots and then re-run the main pipeline for the last query (if present).
         """
-        from app.components.query_classifier import BIOMARKERS
-
         session = self._get_session(session_id)
         qc = self.classifier
         extract = qc.extract_from_followup_response(user_response, awaiting_slot)
@@ -971,7 +1343,7 @@ class LLMResponseManager:
             return {"status": "slot_not_filled", "details": extract}
 
         # Update slots
-        if awaiting_slot in BIOMARKERS:
+        if awaiting_slot in _BIOMARKER_SLOTS:
             session["slots"].setdefault("biomarkers_detailed", {})
             session["slots"]["biomarkers_detailed"][awaiting_slot] = {
                 "value": extract["value"],
@@ -982,9 +1354,7 @@ class LLMResponseManager:
         else:
             session["slots"][awaiting_slot] = extract.get("value")
 
-        # After updating, re-run the pipeline against last_query_info if available
-        last_query = session.get("last_query_info")
-        # We don't have the original raw query text reliably; ask caller to re-run handle_user_query if desired.
+        # handle_user_query re-runs the stored query (_rerun_last_query) on slot_filled
         return {"status": "slot_filled", "updated_slot": awaiting_slot, "current_slots": session["slots"]}
 
     # -------------------------
@@ -1062,8 +1432,9 @@ class LLMResponseManager:
         This method provides backward compatibility with ChatOrchestrator.reset_session().
         """
         sid = session_id or self.default_session_id
-        if sid in self.sessions:
-            del self.sessions[sid]
+        with self._lock_for(sid):
+            removed = self.sessions.pop(sid, None) is not None
+        if removed:
             logger.info(f"Session {sid} reset successfully")
         else:
             logger.warning(f"Attempted to reset non-existent session: {sid}")
@@ -1086,21 +1457,41 @@ class LLMResponseManager:
         Call periodically (e.g., from background task or health check).
         Returns number of sessions cleaned up.
         """
-        with self._session_lock:
-            now = datetime.utcnow()
-            expired = [
-                sid for sid, sess in self.sessions.items()
-                if now - sess.get("last_accessed", now) > self._session_timeout
-            ]
-            for sid in expired:
-                del self.sessions[sid]
-                logger.info(f"Cleaned up expired session {sid}")
-            return len(expired)
+        now = time.monotonic()
+        removed = 0
+        # snapshot, then re-check each candidate under its shard lock
+        for sid, sess in list(self.sessions.items()):
+            if now - sess.get("last_accessed_mono", now) <= self._session_timeout:
+                continue
+            with self._lock_for(sid):
+                sess = self.sessions.get(sid)
+                if sess is not None and now - sess.get("last_accessed_mono", now) > self._session_timeout:
+                    del self.sessions[sid]
+                    removed += 1
+                    logger.info(f"Cleaned up expired session {sid}")
+        return removed
 
     def get_session_count(self) -> int:
         """Get total number of active sessions"""
-        with self._session_lock:
-            return len(self.sessions)
+        return len(self.sessions)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        """Thread pool for work overlapped within a turn, created on first use"""
+        pool = self._turn_pool
+        if pool is None:
+            with self._turn_pool_lock:
+                pool = self._turn_pool
+                if pool is None:
+                    pool = self._turn_pool = ThreadPoolExecutor(max_workers=_TURN_POOL_WORKERS,
+                                                                thread_name_prefix="turn")
+        return pool
+
+    def close(self) -> None:
+        """Shut down the worker threads (a later turn starts a new pool)"""
+        with self._turn_pool_lock:
+            pool, self._turn_pool = self._turn_pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
 
     # -------------------------
     # Slot Validation (from ambiguity_gate.py)
@@ -2,6 +2,7 @@ import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import os
 import re
+from types import MappingProxyType
 from app.config.config import DISTILBERT_CLASSIFIER_PATH
 import logging
 from typing import Optional, Dict, Any, List
@@ -9,8 +10,8 @@ from app.common.custom_exception import CustomException
 
 logger = logging.getLogger(__name__)
 
-# Supported therapy conditions (from llm_response_manager.py)
-SUPPORTED_THERAPY_CONDITIONS = {
+# Supported therapy conditions (from llm_response_manager.py); read-only
+SUPPORTED_THERAPY_CONDITIONS = MappingProxyType({
     "preterm nutrition": "Preterm Nutrition",
     "type 1 diabetes": "Type 1 Diabetes",
     "t1d": "Type 1 Diabetes",
@@ -31,7 +32,10 @@ SUPPORTED_THERAPY_CONDITIONS = {
     "inflammatory bowel disease": "GI Disorders",
     "gerd": "GI Disorders",
     "gastroesophageal reflux": "GI Disorders"
-}
+})
+
+# Canonical condition names, for membership checks on normalized diagnoses
+_SUPPORTED_THERAPY_NAMES = frozenset(SUPPORTED_THERAPY_CONDITIONS.values())
 
 # Ensure Windows path compatibility
 MODEL_PATH = os.path.normpath(DISTILBERT_CLASSIFIER_PATH)
@@ -197,66 +201,89 @@ class NutritionQueryClassifier:
 
     def classify(self, query: str) -> dict:
         """Return classification with clinical safety checks"""
+        return self.classify_batch([query])[0]
+
+    def classify_batch(self, queries: List[str]) -> List[dict]:
+        """
+        classify() for several queries with one padded forward pass.
+        Results are in query order; a failure falls back per query.
+        """
+        if not queries:
+            return []
         try:
             # CRITICAL: Apply biomarker tag preprocessing (must match training)
-            preprocessed_query = self.preprocess_with_biomarker_tags(query)
+            preprocessed = [self.preprocess_with_biomarker_tags(q) for q in queries]
 
             # Tokenize input with biomarker tags
             inputs = self.tokenizer(
-                preprocessed_query,
+                preprocessed,
                 return_tensors="pt",
                 truncation=True,
                 padding=True,
                 max_length=512
             )
-            
+
             # Get model predictions
             with torch.no_grad():
-                outputs = self.model(**inputs)
-                pred = torch.argmax(outputs.logits, dim=1).item()
-                confidence = torch.softmax(outputs.logits, dim=1)[0][pred].item()
-            
-            label = self.id2label[pred]
-            
-            # CRITICAL: Safety check for therapy queries
-            if label == "therapy" and confidence < 0.75:
-                logger.warning("⚠️ Low-confidence therapy classification - defaulting to recommendation")
-                label = "recommendation"
-            
-            # Extract biomarkers with detailed values
-            biomarkers_detailed = self.extract_biomarkers_with_values(query)
-            biomarker_names = list(biomarkers_detailed.keys())
-
-            # Rule-based enhancements
-            result = {
-                "label": label,
-                "diagnosis": self._extract_diagnosis(query),  # Extract diagnosis from query
-                "biomarkers": biomarker_names,  # List of names for backward compatibility
-                "biomarkers_detailed": biomarkers_detailed,  # Dict with values/units
-                "medications": self.extract_medications(query),
-                "needs_followup": self._needs_followup(label, query),
-                "is_high_risk": self.detect_high_risk(query),
-                "confidence": confidence,
-                "complexity": self.estimate_complexity(query, label),
-                "country": self._extract_country(query)
-            }
-            return result
+                logits = self.model(**inputs).logits
+                preds = torch.argmax(logits, dim=1)
+                probs = torch.softmax(logits, dim=1)
+                confidences = probs[torch.arange(len(queries)), preds].tolist()
+            preds = preds.tolist()
         except Exception as e:
             logger.error(f"❌ Classification failed: {str(e)}")
-            # Fallback to safe defaults with explicit safety checks
-            return {
-                "label": "general",
-                "diagnosis": None,
-                "biomarkers": [],
-                "biomarkers_detailed": {},
-                "medications": [],
-                "needs_followup": False,
-                "is_high_risk": False,
-                "confidence": 0.0,
-                "complexity": 2,
-                "country": None,
-                "error": str(e)
-            }
+            return [self._fallback_result(e) for _ in queries]
+
+        results = []
+        for query, pred, confidence in zip(queries, preds, confidences):
+            try:
+                results.append(self._build_result(query, self.id2label[pred], confidence))
+            except Exception as e:
+                logger.error(f"❌ Classification failed: {str(e)}")
+                results.append(self._fallback_result(e))
+        return results
+
+    def _build_result(self, query: str, label: str, confidence: float) -> dict:
+        """Classification dict for a model prediction, with the rule-based enhancements"""
+        # CRITICAL: Safety check for therapy queries
+        if label == "therapy" and confidence < 0.75:
+            logger.warning("⚠️ Low-confidence therapy classification - defaulting to recommendation")
+            label = "recommendation"
+
+        # Extract biomarkers with detailed values
+        biomarkers_detailed = self.extract_biomarkers_with_values(query)
+        biomarker_names = list(biomarkers_detailed.keys())
+
+        # Rule-based enhancements
+        return {
+            "label": label,
+            "diagnosis": self._extract_diagnosis(query),  # Extract diagnosis from query
+            "biomarkers": biomarker_names,  # List of names for backward compatibility
+            "biomarkers_detailed": biomarkers_detailed,  # Dict with values/units
+            "medications": self.extract_medications(query),
+            "needs_followup": self._needs_followup(label, query),
+            "is_high_risk": self.detect_high_risk(query),
+            "confidence": confidence,
+            "complexity": self.estimate_complexity(query, label),
+            "country": self._extract_country(query)
+        }
+
+    @staticmethod
+    def _fallback_result(error: Exception) -> dict:
+        # Fallback to safe defaults with explicit safety checks
+        return {
+            "label": "general",
+            "diagnosis": None,
+            "biomarkers": [],
+            "biomarkers_detailed": {},
+            "medications": [],
+            "needs_followup": False,
+            "is_high_risk": False,
+            "confidence": 0.0,
+            "complexity": 2,
+            "country": None,
+            "error": str(error)
+        }
     
     def _needs_followup(self, label: str, query: str) -> bool:
         """Determine if follow-up questions are needed"""
@@ -788,8 +815,9 @@ class NutritionQueryClassifier:
         diagnosis_lower = diagnosis.lower().strip()
 
         # Direct match with supported therapy conditions
-        if diagnosis_lower in SUPPORTED_THERAPY_CONDITIONS:
-            return SUPPORTED_THERAPY_CONDITIONS[diagnosis_lower]
+        canonical = SUPPORTED_THERAPY_CONDITIONS.get(diagnosis_lower)
+        if canonical is not None:
+            return canonical
 
         # Partial match (for longer diagnoses containing keywords)
         for key, canonical in SUPPORTED_THERAPY_CONDITIONS.items():
@@ -813,7 +841,7 @@ class NutritionQueryClassifier:
             return False
 
         normalized = self.normalize_diagnosis(diagnosis)
-        return normalized in SUPPORTED_THERAPY_CONDITIONS.values()
+        return normalized in _SUPPORTED_THERAPY_NAMES
 
     def extract_medications_with_dosage(self, query: str) -> List[Dict[str, Any]]:
         """
@@ -0,0 +1,63 @@
+"""
+Shared test setup.
+
+The model runtime (torch/transformers) and the DRI/LP stack (pandas/pulp) are
+only needed to load the classifier and compute diets, which these tests never
+do. When they are not installed, importable placeholders stand in for them so
+the orchestration modules that import them at module level can be tested.
+
+Also provides the llm_manager fixture: an LLMResponseManager whose components
+are inert and whose classifier is a StubClassifier.
+"""
+import importlib.util
+import sys
+import types
+
+import pytest
+
+from doubles import StubClassifier
+
+
+class _Placeholder:
+    """Any attribute, call or subclassing of a missing runtime yields another placeholder"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _Placeholder()
+
+    def __call__(self, *args, **kwargs):
+        return _Placeholder()
+
+
+def _placeholder_module(name: str) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__getattr__ = lambda attr: _Placeholder
+    return module
+
+
+for _name in ("torch", "transformers", "pandas", "pulp"):
+    if _name not in sys.modules and importlib.util.find_spec(_name) is None:
+        sys.modules[_name] = _placeholder_module(_name)
+
+
+class _InertComponent:
+    """Stand-in for a model- or data-backed component the manager builds in __init__"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def llm_manager(monkeypatch):
+    """LLMResponseManager with inert components and a StubClassifier"""
+    import app.components.llm_response_manager as lrm
+
+    for name in ("NutritionQueryClassifier", "FollowUpQuestionGenerator", "ComputationManager",
+                 "TherapyGenerator", "FCTManager", "MealPlanGenerator"):
+        monkeypatch.setattr(lrm, name, _InertComponent)
+    manager = lrm.LLMResponseManager()
+    manager.classifier = StubClassifier()
+    yield manager
+    manager.close()
@@ -0,0 +1,48 @@
+"""Test doubles shared across test modules"""
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class StubClassifier:
+    """Rule-free classifier double: fixed label, no entities, records what it classified"""
+
+    def __init__(self, label="general"):
+        self.label = label
+        self.classified = []
+
+    def classify(self, query):
+        self.classified.append(query)
+        return {"label": self.label, "confidence": 0.9}
+
+    def _extract_diagnosis(self, query):
+        return None
+
+    def extract_biomarkers_with_values(self, query):
+        return {}
+
+    def extract_biomarkers(self, query):
+        return []
+
+    def extract_medications(self, query):
+        return []
+
+    def _extract_country(self, query):
+        return None
+
+
+class WordHashEmbeddings(Embeddings):
+    """Deterministic bag-of-words vectors, so similar texts land close together"""
+
+    dim = 64
+
+    def _embed(self, text):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vec[sum(map(ord, word)) % self.dim] += 1.0
+        return (vec / (np.linalg.norm(vec) or 1.0)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
@@ -0,0 +1,53 @@
+import pytest
+from langchain_community.vectorstores import FAISS
+
+import app.components.hybrid_retriever as hr
+from doubles import WordHashEmbeddings
+
+FOODS = [
+    ("Peanut butter", "Peanut butter, smooth: protein 25 g per 100 g"),
+    ("Groundnut paste", "Groundnut (peanut) paste: protein 24 g per 100 g"),
+    ("Bambara nuts", "Bambara nuts, dried: protein 19 g per 100 g"),
+    ("Cowpeas", "Cowpeas, dried: protein 23 g per 100 g"),
+    ("Cow milk", "Milk, whole: protein 3.3 g per 100 g"),
+]
+
+
+@pytest.fixture
+def fct_store():
+    manager = hr._retriever_manager
+    saved = manager._retriever
+    store = FAISS.from_texts(
+        [text for _, text in FOODS],
+        WordHashEmbeddings(),
+        metadatas=[{"food": food, "doc_type": "FCT"} for food, _ in FOODS],
+    )
+    manager.set_retriever(store)
+    yield store
+    manager._retriever = saved
+
+
+def _foods(docs):
+    return [d.metadata["food"] for d in docs]
+
+
+def test_excluded_allergen_documents_are_dropped(fct_store):
+    docs = hr.filtered_retrieval("peanut protein per 100 g", {"doc_type": "FCT", "exclude_allergens": ["Peanut"]},
+                                 k=5, use_bm25_fallback=False)
+    assert docs, "non-allergenic foods should still be returned"
+    assert "Peanut butter" not in _foods(docs)
+    # mentioned only in the text, not the food name
+    assert "Groundnut paste" not in _foods(docs)
+
+
+def test_exclusion_applies_on_each_cascade_step(fct_store):
+    cascade = [{"doc_type": "FCT", "food": "Peanut butter", "exclude_allergens": ["peanut"]},
+               {"doc_type": "FCT", "exclude_allergens": ["peanut"]}]
+    docs = hr.filtered_retrieval("peanut butter", cascade, k=3, use_bm25_fallback=False)
+    assert docs
+    assert not any("peanut" in d.page_content.lower() for d in docs)
+
+
+def test_without_exclusions_allergenic_foods_are_kept(fct_store):
+    docs = hr.filtered_retrieval("peanut protein per 100 g", {"doc_type": "FCT"}, k=5, use_bm25_fallback=False)
+    assert "Peanut butter" in _foods(docs)
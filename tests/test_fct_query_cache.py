@@ -0,0 +1,50 @@
+import pytest
+
+import app.components.hybrid_retriever as hr
+from app.components.fct_manager import FCTManager
+
+
+@pytest.fixture
+def fct_and_calls(monkeypatch):
+    """FCTManager whose retrievals are counted and parse into one food each"""
+    calls = []
+
+    def retrieval(query, filter_candidates, k, use_bm25_fallback):
+        calls.append(k)
+        return ["doc"] * k
+
+    monkeypatch.setattr(hr, "filtered_retrieval", retrieval)
+    monkeypatch.setattr(FCTManager, "_parse_fct_documents", lambda self, docs, nutrient: [{"food": "beans"}])
+    monkeypatch.setattr(hr._retriever_manager, "_index_version", hr._retriever_manager._index_version)
+    return FCTManager(), calls
+
+
+def test_repeated_nutrient_query_is_served_from_cache(fct_and_calls):
+    fct, calls = fct_and_calls
+    fct._query_fct_for_nutrient("iron", "kenya.pdf", k=5)
+    fct._query_fct_for_nutrient("iron", "kenya.pdf", k=5)
+    assert calls == [5]
+
+
+def test_cache_misses_after_retriever_index_changes(fct_and_calls):
+    fct, calls = fct_and_calls
+    fct._query_fct_for_nutrient("iron", "kenya.pdf", k=5)
+    hr._retriever_manager._index_version += 1
+    fct._query_fct_for_nutrient("iron", "kenya.pdf", k=5)
+    assert calls == [5, 5]
+
+
+def test_cache_misses_after_explicit_invalidation(fct_and_calls):
+    fct, calls = fct_and_calls
+    fct._query_fct_for_nutrient("iron", "kenya.pdf", k=5)
+    fct.invalidate_query_cache()
+    fct._query_fct_for_nutrient("iron", "kenya.pdf", k=5)
+    assert calls == [5, 5]
+
+
+def test_short_parse_still_tops_up_candidates(fct_and_calls):
+    fct, calls = fct_and_calls
+    # every retrieval parses into a single food, fewer than the k wanted
+    foods = fct._get_allowed_foods_for_nutrient("iron", "kenya.pdf", diagnosis=None, allergies=None, k=5)
+    assert calls == [5, 10]
+    assert foods == [{"food": "beans"}]
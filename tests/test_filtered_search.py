@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+
+import app.components.hybrid_retriever as hr
+from doubles import WordHashEmbeddings
+
+QUERY = "rice porridge"
+# 40 near neighbours of the query from one country, the filtered-for country's
+# documents all ranked behind them
+TEXTS = [f"rice porridge batch {i}" for i in range(40)] + [f"groundnut soup pot {i} rice" for i in range(6)]
+COUNTRIES = ["nigeria"] * 40 + ["kenya"] * 6
+
+
+@pytest.fixture
+def store():
+    manager = hr._retriever_manager
+    saved = manager._retriever
+    vs = FAISS.from_texts(TEXTS, WordHashEmbeddings(), metadatas=[{"country": c} for c in COUNTRIES])
+    manager.set_retriever(vs)
+    yield vs
+    manager._retriever = saved
+
+
+def _exact_top_k(vs, country, k):
+    """Brute-force nearest texts among the documents from country"""
+    query = np.array(vs.embedding_function.embed_query(QUERY))
+    candidates = [t for t, c in zip(TEXTS, COUNTRIES) if c == country]
+    vectors = np.array(vs.embedding_function.embed_documents(candidates))
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return sorted(distances)[:k]
+
+
+def _distances(vs, docs):
+    query = np.array(vs.embedding_function.embed_query(QUERY))
+    return sorted(((np.array(vs.embedding_function.embed_query(d.page_content)) - query) ** 2).sum() for d in docs)
+
+
+def test_filter_outside_the_fetch_window_still_finds_exact_top_k(store):
+    # LangChain filters only the fetch_k nearest vectors, all from the other country
+    assert store.similarity_search_with_score(QUERY, k=3, filter={"country": "kenya"}, fetch_k=hr._FAISS_FETCH_K) == []
+
+    scored = hr._apply_filter_search_faiss(QUERY, {"country": "Kenya"}, k=3)
+
+    docs = [doc for doc, _ in scored]
+    assert all(d.metadata["country"] == "kenya" for d in docs)
+    assert _distances(store, docs) == pytest.approx(_exact_top_k(store, "kenya", 3))
+
+
+def test_filter_positions_union_list_values(store):
+    manager = hr._retriever_manager
+    assert len(manager.filter_positions({"country": "kenya"})) == 6
+    assert len(manager.filter_positions({"country": ["kenya", "nigeria"]})) == 46
+    assert len(manager.filter_positions({"country": "ghana"})) == 0
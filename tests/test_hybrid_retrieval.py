@@ -0,0 +1,170 @@
+import threading
+import time
+import types
+
+import pytest
+from langchain.schema import Document
+
+import app.components.hybrid_retriever as hr
+
+
+def _doc(key, text=None):
+    return Document(page_content=text or f"text of {key}", metadata={"id": key})
+
+
+def _ids(docs):
+    return [d.metadata["id"] for d in docs]
+
+
+def _store(texts, ids):
+    """Minimal stand-in for a LangChain FAISS store: index size, id mapping and docstore"""
+    return types.SimpleNamespace(
+        index=types.SimpleNamespace(ntotal=len(texts)),
+        index_to_docstore_id=dict(enumerate(ids)),
+        docstore=types.SimpleNamespace(_dict={i: Document(page_content=t) for i, t in zip(ids, texts)}),
+    )
+
+
+@pytest.fixture(autouse=True)
+def clean_retriever_state():
+    manager = hr._retriever_manager
+    saved = (manager._retriever, manager._bm25, manager._index_version)
+    yield
+    manager._retriever, manager._bm25, manager._index_version = saved
+
+
+# --- Reciprocal-rank fusion ---
+
+def test_fusion_ranks_documents_both_retrievers_agree_on_first():
+    faiss = [_doc("a"), _doc("b"), _doc("c")]
+    bm25 = [_doc("c"), _doc("d")]
+    # c: 1/63 + 1/61 beats a's single 1/61
+    assert _ids(hr._fuse_rankings(faiss, bm25, k=4)) == ["c", "a", "b", "d"]
+
+
+def test_fusion_ties_keep_faiss_before_bm25():
+    faiss = [_doc("a"), _doc("b")]
+    bm25 = [_doc("x"), _doc("y")]
+    # same ranks in each list -> equal scores; first-seen (FAISS) order wins
+    assert _ids(hr._fuse_rankings(faiss, bm25, k=4)) == ["a", "x", "b", "y"]
+
+
+def test_fusion_counts_duplicates_once_at_best_rank():
+    faiss = [_doc("a"), _doc("b"), _doc("a")]
+    bm25 = [_doc("b")]
+    # b: 1/62 + 1/61 beats a, whose repeat at rank 3 adds nothing
+    assert _ids(hr._fuse_rankings(faiss, bm25, k=5)) == ["b", "a"]
+
+
+def test_fusion_without_bm25_is_deduplicated_faiss_order_truncated_to_k():
+    faiss = [_doc("a"), _doc("b"), _doc("a"), _doc("c")]
+    assert _ids(hr._fuse_rankings(faiss, [], k=2)) == ["a", "b"]
+
+
+def test_dedupe_key_follows_metadata_changes_without_touching_the_document():
+    d = _doc("a")
+    assert hr._doc_id_key(d) == "a"
+    d.metadata["id"] = "b"
+    assert hr._doc_id_key(d) == "b"
+    assert "_retr_id" not in vars(d)
+
+
+# --- BM25 seeding and store swaps ---
+
+def test_bm25_is_seeded_from_the_docstore_without_writing_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = hr._retriever_manager
+    manager.set_retriever(_store(["rice porridge", "bean stew", "maize meal"], ["1", "2", "3"]))
+
+    hr._ensure_bm25_index()
+
+    assert [d.page_content for d in manager.bm25_search("bean", k=1)] == ["bean stew"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_set_retriever_drops_bm25_built_for_previous_store():
+    manager = hr._retriever_manager
+    manager._bm25 = object()
+    manager.set_retriever(_store(["rice"], ["1"]))
+    assert manager._bm25 is None
+
+
+# --- Loading a saved index ---
+
+def test_loaded_index_gets_the_same_post_load_setup_as_init_retriever(tmp_path, monkeypatch):
+    from langchain_community.embeddings import FakeEmbeddings
+    from langchain_community.vectorstores import FAISS
+
+    embeddings = FakeEmbeddings(size=8)
+    FAISS.from_texts(["rice porridge", "bean stew"], embeddings).save_local(str(tmp_path))
+    monkeypatch.setattr(hr._retriever_manager, "_embedding_model", embeddings)
+    initialized = []
+    monkeypatch.setattr(hr, "init_retriever", initialized.append)
+
+    vs = hr.load_faiss_index(tmp_path, cache_dir=tmp_path / "no-cache")
+
+    assert initialized == [vs]
+    assert vs.index.ntotal == 2
+
+
+# --- In-flight search coalescing ---
+
+@pytest.fixture
+def gated_search(monkeypatch):
+    """_run_faiss_search that blocks until released, counting calls"""
+    state = types.SimpleNamespace(calls=0, started=threading.Event(), release=threading.Event(), error=None)
+
+    def run(current_retriever, query, meta_filter, k, embedding):
+        state.calls += 1
+        state.started.set()
+        state.release.wait(timeout=2.0)
+        if state.error is not None:
+            raise state.error
+        return [(_doc("a"), 0.9)]
+
+    monkeypatch.setattr(hr, "_run_faiss_search", run)
+    hr._search_cache.clear()
+    yield state
+    hr._search_cache.clear()
+
+
+def _search_in_thread(results):
+    def target():
+        try:
+            results.append(hr._search_faiss_normalized("iron", {"country": "kenya"}, k=1, current_retriever=object()))
+        except Exception as e:
+            results.append(e)
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def test_identical_concurrent_searches_share_one_faiss_call(gated_search):
+    results = []
+    first = _search_in_thread(results)
+    assert gated_search.started.wait(timeout=2.0)
+    second = _search_in_thread(results)
+    time.sleep(0.05)  # let the second search find the in-flight one
+    gated_search.release.set()
+    first.join(2.0)
+    second.join(2.0)
+
+    assert gated_search.calls == 1
+    assert [_ids([d for d, _ in r]) for r in results] == [["a"], ["a"]]
+    assert hr._search_inflight == {}
+
+
+def test_waiters_receive_the_running_search_error(gated_search):
+    gated_search.error = RuntimeError("index gone")
+    results = []
+    first = _search_in_thread(results)
+    assert gated_search.started.wait(timeout=2.0)
+    second = _search_in_thread(results)
+    time.sleep(0.05)
+    gated_search.release.set()
+    first.join(2.0)
+    second.join(2.0)
+
+    assert gated_search.calls == 1
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    assert hr._search_inflight == {}
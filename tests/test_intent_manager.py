@@ -0,0 +1,56 @@
+import pytest
+
+from app.components.intent_manager import IntentManager
+
+
+class RecordingClassifier:
+    """Classifier double that records the queries it was asked to classify"""
+
+    def __init__(self, label="general"):
+        self.label = label
+        self.queries = []
+
+    def classify(self, query):
+        self.queries.append(query)
+        return {"label": self.label, "confidence": 0.9}
+
+    def enforce_gatekeeper(self, query, label, confidence):
+        return label
+
+
+@pytest.mark.parametrize("reply, option", [
+    ("2", "step_by_step"),
+    ("Step by step!", "step_by_step"),
+    ("general info first", "general_info_first"),
+    ("1.", "upload"),
+])
+def test_option_reply_skips_classifier_while_options_are_offered(reply, option):
+    classifier = RecordingClassifier()
+    result = IntentManager(classifier).classify_and_enforce(reply, options_offered=True)
+
+    assert classifier.queries == []
+    assert result["option"] == option
+    assert result["final_label"] == "recommendation"
+
+
+def test_option_number_without_pending_prompt_is_classified():
+    # "2" answering an age or quantity question is not an onboarding choice
+    classifier = RecordingClassifier(label="recommendation")
+    result = IntentManager(classifier).classify_and_enforce("2")
+
+    assert classifier.queries == ["2"]
+    assert "option" not in result
+
+
+@pytest.mark.parametrize("reply", ["lab", "general", "upload", "step", "overview"])
+def test_single_word_replies_are_classified_even_when_options_are_offered(reply):
+    classifier = RecordingClassifier()
+    IntentManager(classifier).classify_and_enforce(reply, options_offered=True)
+
+    assert classifier.queries == [reply]
+
+
+def test_single_words_still_normalize_as_explicit_option_replies():
+    im = IntentManager(RecordingClassifier())
+    assert im.normalize_user_option_reply("lab") == "upload"
+    assert im.normalize_user_option_reply("overview please") == "general_info_first"
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+import app.components.llm_response_manager as lrm
+from app.components.query_classifier import NutritionQueryClassifier
+
+
+class GatedBatchFn:
+    """Batch function whose first call blocks until released, recording each batch"""
+
+    def __init__(self):
+        self.batches = []
+        self.first_started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        self.first_started.set()
+        self.release.wait(timeout=2.0)
+        return [item.upper() for item in items]
+
+
+def test_items_queued_during_a_batch_share_the_next_one():
+    batch_fn = GatedBatchFn()
+    batcher = lrm._MicroBatcher(batch_fn, max_batch=8, max_wait=0.0)
+
+    first = batcher.submit("a")
+    assert batch_fn.first_started.wait(timeout=2.0)
+    later = [batcher.submit(item) for item in ("b", "c", "d")]
+    batch_fn.release.set()
+
+    assert first.result(timeout=2.0) == "A"
+    assert [f.result(timeout=2.0) for f in later] == ["B", "C", "D"]
+    assert batch_fn.batches == [["a"], ["b", "c", "d"]]
+
+
+def test_batches_are_capped_at_max_batch():
+    batch_fn = GatedBatchFn()
+    batcher = lrm._MicroBatcher(batch_fn, max_batch=2, max_wait=0.0)
+
+    batcher.submit("a")
+    assert batch_fn.first_started.wait(timeout=2.0)
+    later = [batcher.submit(item) for item in ("b", "c", "d")]
+    batch_fn.release.set()
+
+    assert [f.result(timeout=2.0) for f in later] == ["B", "C", "D"]
+    assert [len(b) for b in batch_fn.batches] == [1, 2, 1]
+
+
+@pytest.mark.parametrize("batch_fn, error", [
+    (lambda items: 1 / 0, ZeroDivisionError),
+    (lambda items: items[:-1], RuntimeError),
+])
+def test_a_failed_batch_fails_every_future_in_it(batch_fn, error):
+    batcher = lrm._MicroBatcher(batch_fn, max_batch=8, max_wait=0.05)
+    futures = [batcher.submit(item) for item in ("a", "b")]
+    for future in futures:
+        with pytest.raises(error):
+            future.result(timeout=2.0)
+
+
+def test_classification_falls_back_when_the_batch_does_not_answer_in_time(llm_manager, monkeypatch):
+    monkeypatch.setattr(lrm, "NutritionQueryClassifier", NutritionQueryClassifier)
+    monkeypatch.setattr(lrm, "_CLASSIFY_RESULT_TIMEOUT", 0.05)
+    batch_fn = GatedBatchFn()
+    llm_manager._classify_batcher = lrm._MicroBatcher(batch_fn, max_batch=8, max_wait=0.0)
+
+    result = llm_manager._classify("is rice good for anemia")
+    batch_fn.release.set()
+
+    assert result["label"] == "general"
+    assert result["confidence"] == 0.0
+    assert "error" in result
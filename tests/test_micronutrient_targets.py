@@ -0,0 +1,30 @@
+import app.components.computation_manager as cm
+
+
+class CountingDRI:
+    """DRILoader double: one nutrient goal, counting table reads"""
+
+    def __init__(self, path):
+        self.reads = 0
+
+    def get_all_dri_for_group(self, age, sex):
+        self.reads += 1
+        return {"Iron": {"value": {"type": "eq", "min": 10, "approx_value": 10.0}, "unit": "mg"}}
+
+
+def test_targets_are_built_once_per_age_and_sex_and_returned_as_copies(monkeypatch):
+    monkeypatch.setattr(cm, "DRILoader", CountingDRI)
+    manager = cm.ComputationManager()
+
+    first = manager.get_micronutrient_targets(6, "F")
+    first["Iron"]["display_value"] = "changed"
+    second = manager.get_micronutrient_targets(6, "F")
+    manager.get_micronutrient_targets(6, "M")
+
+    assert second["Iron"]["display_value"] == "10"
+    assert manager.dri.reads == 2
+
+
+def test_construction_does_not_read_the_dri_table(monkeypatch):
+    monkeypatch.setattr(cm, "DRILoader", CountingDRI)
+    assert cm.ComputationManager().dri.reads == 0
@@ -0,0 +1,36 @@
+import pytest
+
+from app.components.followup_question_generator import _get_missing_slots
+
+FILLED = {"weight_kg": 20, "height_cm": 110, "diagnosis": "ckd", "age": 6,
+          "medications": ["enalapril"], "allergies": ["peanut"]}
+
+
+@pytest.mark.parametrize("extra, missing", [
+    ({}, ["country"]),
+    ({"country": ""}, ["country"]),
+    ({"country": []}, ["country"]),
+    # only a truthy value fills country; a rejection marker does not
+    ({"_rejected_country": True}, ["country"]),
+    ({"country": "user_declined"}, []),
+    ({"country": "Kenya"}, []),
+])
+def test_country_is_missing_whenever_its_value_is_falsy(extra, missing):
+    assert _get_missing_slots("recommendation", {**FILLED, **extra}, []) == missing
+
+
+@pytest.mark.parametrize("extra, lab_results, missing", [
+    ({}, [], ["biomarkers"]),
+    ({"_rejected_biomarkers": True}, [], ["biomarkers"]),
+    ({"biomarkers": {}}, [], ["biomarkers"]),
+    ({}, [{"name": "creatinine"}], []),
+    ({"biomarkers": {"creatinine": 0.6}}, [], []),
+])
+def test_therapy_biomarkers_are_filled_by_values_or_lab_results(extra, lab_results, missing):
+    profile = {**FILLED, "country": "Kenya", **extra}
+    assert _get_missing_slots("therapy", profile, lab_results) == missing
+
+
+def test_rejected_slots_other_than_country_are_not_asked_again():
+    profile = {**FILLED, "country": "Kenya", "allergies": None, "_rejected_allergies": True, "age": "user_declined"}
+    assert _get_missing_slots("recommendation", profile, []) == []
@@ -0,0 +1,22 @@
+import math
+
+import pytest
+
+from app.components.followup_question_generator import _get_invalid_slots
+
+
+@pytest.mark.parametrize("profile, invalid", [
+    ({"age": "7", "height_cm": "120.5", "weight_kg": 22}, []),
+    ({"age": "200", "height_cm": "10", "weight_kg": "0"}, ["age", "height_cm", "weight_kg"]),
+    ({"age": "seven", "height_cm": "tall", "weight_kg": None}, ["age", "height_cm", "weight_kg"]),
+    ({"age": "1e1", "height_cm": "1_20", "weight_kg": "inf"}, ["age", "weight_kg"]),
+])
+def test_numeric_slots_are_validated_against_their_ranges(profile, invalid):
+    assert _get_invalid_slots(profile) == invalid
+
+
+def test_nan_keeps_the_original_validation_outcome():
+    # int(nan) raises, so a NaN age is invalid; a NaN float is never outside
+    # its range, so NaN heights and weights pass, as they always have
+    assert _get_invalid_slots({"age": math.nan, "height_cm": math.nan, "weight_kg": " NaN "}) == ["age"]
+    assert _get_invalid_slots({"age": "nan"}) == ["age"]
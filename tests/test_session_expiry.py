@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+import app.components.llm_response_manager as lrm
+
+
+@pytest.fixture
+def manager(llm_manager, monkeypatch):
+    """llm_manager with a short session timeout and reaper interval"""
+    monkeypatch.setattr(lrm, "_SESSION_REAP_INTERVAL", 0.05)
+    llm_manager._session_timeout = 0.3
+    return llm_manager
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_reaper_expires_idle_session_but_keeps_one_accessed_again(manager):
+    manager._get_session("idle")
+    manager._get_session("active")
+    # keep "active" busy past the idle session's deadline
+    for _ in range(8):
+        time.sleep(0.1)
+        manager._get_session("active")
+    assert "idle" not in manager.sessions
+    assert "active" in manager.sessions
+
+    # once it goes idle too, the reaper removes it and exits
+    assert _wait_for(lambda: "active" not in manager.sessions)
+    assert _wait_for(lambda: manager._reaper is None)
+
+
+def test_session_data_survives_access_before_timeout(manager):
+    manager._get_session("s")["slots"]["age"] = 7
+    time.sleep(0.15)
+    assert manager._get_session("s")["slots"] == {"age": 7}
+
+
+def test_expired_session_is_reset_on_access_before_the_reaper_runs(manager):
+    manager._get_session("s")["slots"]["age"] = 7
+    manager.sessions["s"]["last_accessed_mono"] -= 1.0
+    assert manager._get_session("s")["slots"] == {}
+
+
+def test_cleanup_expired_sessions_removes_only_idle_ones(manager):
+    manager._get_session("idle")
+    manager._get_session("active")
+    manager.sessions["idle"]["last_accessed_mono"] -= 1.0
+    assert manager.cleanup_expired_sessions() == 1
+    assert list(manager.sessions) == ["active"]
+
+
+def _ids_on_distinct_shards(manager):
+    first = "session-0"
+    for i in range(1, 1000):
+        other = f"session-{i}"
+        if manager._lock_for(other) is not manager._lock_for(first):
+            return first, other
+    raise AssertionError("every id mapped to one shard")
+
+
+def test_session_lock_is_stable_per_id(manager):
+    assert manager._lock_for("s") is manager._lock_for("s")
+    assert len(manager._session_locks) == lrm._SESSION_LOCK_SHARDS
+
+
+def test_busy_session_does_not_block_one_on_another_shard(manager):
+    busy, other = _ids_on_distinct_shards(manager)
+    held, done = threading.Event(), threading.Event()
+
+    def hold():
+        with manager._lock_for(busy):
+            held.set()
+            done.wait(timeout=2.0)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    assert held.wait(timeout=2.0)
+    try:
+        # with one global session lock this would wait for the holder
+        finished = threading.Event()
+        threading.Thread(target=lambda: (manager._get_session(other), finished.set())).start()
+        assert finished.wait(timeout=1.0)
+    finally:
+        done.set()
+        holder.join(2.0)
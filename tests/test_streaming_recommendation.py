@@ -0,0 +1,61 @@
+import asyncio
+import types
+
+import pytest
+from langchain.schema import Document
+
+import app.components.llm_response_manager as lrm
+
+SLOTS = {"age": 6, "sex": "F", "weight_kg": 20, "height_cm": 115, "country": "Kenya"}
+
+
+def _sources(query):
+    return [Document(page_content=f"{query}: beans, 100 g", metadata={"food": query.split()[-1]})]
+
+
+@pytest.fixture
+def recommending_manager(llm_manager, monkeypatch):
+    """Manager whose profile is complete, so a recommendation needs no followup"""
+    monkeypatch.setattr(lrm, "filtered_retrieval", lambda query, filters, k: _sources(query))
+    monkeypatch.setattr(lrm, "filtered_retrieval_batch", lambda queries, filters, k: [_sources(q) for q in queries])
+    llm_manager.followup_gen = types.SimpleNamespace(generate_follow_up_question=lambda *args: None)
+    llm_manager.computation = types.SimpleNamespace(get_micronutrient_targets=lambda age, sex: {"iron_mg": 10})
+    return llm_manager
+
+
+def _stream(manager, session_id, query, query_info=None):
+    async def collect():
+        return [r async for r in manager.ahandle_recommendation(session_id, query, query_info)]
+    return asyncio.run(collect())
+
+
+def test_streamed_final_response_equals_the_blocking_one(recommending_manager):
+    info = {"label": "recommendation"}
+    for sid in ("sync", "async"):
+        recommending_manager._get_session(sid)["slots"].update(SLOTS)
+
+    blocking = recommending_manager._handle_recommendation(
+        "sync", "what should she eat", recommending_manager._get_session("sync"), info)
+    streamed = _stream(recommending_manager, "async", "what should she eat", info)
+
+    assert streamed[-1] == blocking
+    assert sorted(r["nutrient"] for r in streamed if "nutrient" in r) == sorted(lrm._RECOMMENDATION_NUTRIENTS)
+
+
+def test_streamed_query_merges_entities_and_is_stored_for_rerun(recommending_manager, monkeypatch):
+    monkeypatch.setattr(recommending_manager, "extract_entities", lambda query: {"diagnosis": "anemia"})
+
+    _stream(recommending_manager, "s", "foods for anemia", {"label": "recommendation"})
+
+    session = recommending_manager._get_session("s")
+    assert session["slots"]["diagnosis"] == "anemia"
+    assert session["last_raw_query"] == "foods for anemia"
+
+
+def test_streamed_reply_to_a_pending_followup_is_handled_as_the_answer(recommending_manager):
+    session = recommending_manager._get_session("s")
+    session["awaiting_slot"] = "age"
+    recommending_manager.handle_followup_response = lambda sid, query, slot: {"status": "needs_clarification"}
+
+    assert _stream(recommending_manager, "s", "7") == [{"status": "needs_clarification"}]
+    assert recommending_manager.classifier.classified == []
@@ -0,0 +1,48 @@
+import threading
+
+from doubles import StubClassifier
+
+
+class HandshakeClassifier(StubClassifier):
+    """Entity extraction waits (briefly) for classification to have started"""
+
+    def __init__(self):
+        super().__init__()
+        self.classify_started = threading.Event()
+        self.overlapped = None
+
+    def classify(self, query):
+        self.classify_started.set()
+        return super().classify(query)
+
+    def _extract_diagnosis(self, query):
+        self.overlapped = self.classify_started.wait(timeout=2.0)
+        return None
+
+
+def test_new_query_is_classified_while_entities_are_extracted(llm_manager):
+    llm_manager.classifier = HandshakeClassifier()
+    llm_manager._route = lambda session_id, query, session, query_info: query_info
+
+    result = llm_manager.handle_user_query("s1", "what is iron")
+
+    assert llm_manager.classifier.overlapped is True
+    assert result["label"] == "general"
+    assert llm_manager._get_session("s1")["last_raw_query"] == "what is iron"
+
+
+def test_followup_answer_is_not_classified(llm_manager):
+    session = llm_manager._get_session("s1")
+    session["awaiting_slot"] = "age"
+    llm_manager.handle_followup_response = lambda session_id, query, slot: {"status": "needs_clarification"}
+
+    llm_manager.handle_user_query("s1", "7")
+
+    assert llm_manager.classifier.classified == []
+
+
+def test_close_releases_the_pool_and_a_later_turn_starts_a_new_one(llm_manager):
+    first = llm_manager._pool()
+    llm_manager.close()
+    assert first._shutdown
+    assert llm_manager._pool() is not first